@@ -1,23 +1,42 @@
 """
 Auth — Autenticación JWT para NomadMatch (Prototipo 4)
 Registro, login, perfil y upgrade a premium.
+bcrypt se ejecuta en un pool de procesos propio (password_executor), fuera del
+threadpool de Starlette y del GIL: una ráfaga de logins no bloquea el resto de
+la API, y si el pool está saturado se responde 503 con Retry-After.
 """
 import os
 import json
-import bcrypt
+import math
+from typing import Optional
 from fastapi import APIRouter, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from jose import jwt
 from datetime import datetime, timedelta
 
 from ..models.user import User
-from .deps import get_db, get_current_user, SECRET_KEY, ALGORITHM
+from ..core.config import settings
+from ..core.security import hash_password, check_password
+from ..utils.executor import BoundedExecutor, ExecutorSaturated
+from ..utils.principal_cache import Principal
+from .deps import get_db, get_current_user, principal_cache, SECRET_KEY, ALGORITHM
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 semana
 
+# Pool dedicado para bcrypt (CPU-bound, ~0.3 s por hash con 12 rounds)
+password_executor = BoundedExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_concurrency=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    name="bcrypt",
+    processes=True,
+)
+
 
 # ── Pydantic Models ──────────────────────────────
 class UserCreate(BaseModel):
@@ -43,12 +62,16 @@ class UserOut(BaseModel):
 
 
 # ── Helpers ───────────────────────────────────────
-def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+async def run_password_hashing(fn, *args):
+    """Run a core.security function on password_executor; 503 + Retry-After when it is saturated."""
+    try:
+        return await password_executor.run(fn, *args)
+    except ExecutorSaturated as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many login attempts in progress, retry shortly",
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+        )
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -57,33 +80,57 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+# ── Acceso a BD (bloqueante) ──────────────────────
+
+def _find_user(db: Session, email: str) -> Optional[User]:
+    """User row by email (blocking: run in the threadpool); the connection goes back to the pool."""
+    db_user = db.query(User).filter(User.email == email).first()
+    # No retener la conexión durante el await del hash (db_user queda cargado)
+    db.close()
+    return db_user
+
+
+def _insert_user(db: Session, email: str, hashed: str) -> Optional[User]:
+    """Insert a free user (blocking: run in the threadpool); None if the email is already taken."""
+    new_user = User(email=email, hashed_password=hashed, is_premium=False)
+    db.add(new_user)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otro registro con el mismo email pasó la comprobación durante el await del hash
+        db.rollback()
+        return None
+    db.refresh(new_user)
+    return new_user
+
+
 # ── Endpoints ─────────────────────────────────────
+# register/login son async para esperar al pool de bcrypt; las consultas
+# SQLAlchemy (bloqueantes) van al threadpool con run_in_threadpool
 
 @router.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+async def register(user: UserCreate, db: Session = Depends(get_db)):
+    if await run_in_threadpool(_find_user, db, user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    hashed = await run_password_hashing(hash_password, user.password, settings.BCRYPT_ROUNDS)
+    new_user = await run_in_threadpool(_insert_user, db, user.email, hashed)
+    if new_user is None:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed = get_password_hash(user.password)
-    new_user = User(email=user.email, hashed_password=hashed, is_premium=False)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
     token = create_access_token({"sub": new_user.email, "premium": new_user.is_premium})
     return {"access_token": token, "token_type": "bearer", "is_premium": new_user.is_premium}
 
 
 @router.post("/login", response_model=Token)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(_find_user, db, user.email)
+    if not db_user or not await run_password_hashing(check_password, user.password, db_user.hashed_password):
         raise HTTPException(status_code=400, detail="Invalid email or password")
     token = create_access_token({"sub": db_user.email, "premium": db_user.is_premium})
     return {"access_token": token, "token_type": "bearer", "is_premium": db_user.is_premium}
 
 
 @router.get("/me", response_model=UserOut)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: Principal = Depends(get_current_user)):
     prefs = current_user.preferences if current_user.preferences else "{}"
     return {
         "email": current_user.email,
@@ -95,20 +142,28 @@ async def get_me(current_user: User = Depends(get_current_user)):
 @router.put("/preferences")
 async def update_preferences(
     prefs: PreferencesUpdate,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    current_user.preferences = json.dumps(prefs.preferences)
+    user = db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    user.preferences = json.dumps(prefs.preferences)
     db.commit()
+    principal_cache.invalidate(current_user.email)
     return {"message": "Preferences updated"}
 
 
 @router.post("/upgrade")
 async def upgrade_to_premium(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    current_user.is_premium = True
+    user = db.get(User, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    user.is_premium = True
     db.commit()
+    principal_cache.invalidate(current_user.email)
     token = create_access_token({"sub": current_user.email, "premium": True})
     return {"access_token": token, "token_type": "bearer", "is_premium": True}
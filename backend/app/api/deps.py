@@ -3,17 +3,29 @@ Dependencies — Shared dependencies for NomadMatch API routes.
 Avoids circular imports between routes.py and auth.py.
 """
 import os
+import time
+from typing import Optional
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from jose import jwt, JWTError
 
 from ..models.user import SessionLocal, User
+from ..core.config import settings
+from ..utils.principal_cache import Principal, PrincipalCache
+from ..utils.metrics import AUTH_SECONDS
 
 SECRET_KEY = os.getenv("JWT_SECRET", "supersecretkey")
 ALGORITHM = "HS256"
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login", auto_error=False)
+
+# Usuarios resueltos por `sub`; invalidar al modificar el usuario (auth.py)
+principal_cache = PrincipalCache(
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_entries=settings.PRINCIPAL_CACHE_SIZE,
+)
 
 
 def get_db():
@@ -27,17 +39,48 @@ def get_db():
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
-):
+) -> Principal:
+    """
+    Resolve the JWT to a Principal. The signature and expiry are checked on
+    every request; the user row is read only on a principal_cache miss.
+    """
+    started = time.perf_counter()
+    outcome = "rejected"
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email = payload.get("sub")
         if email is None:
             raise HTTPException(status_code=401, detail="Invalid credentials")
+        principal = principal_cache.get(email)
+        if principal is not None:
+            outcome = "hit"
+            return principal
+        outcome = "miss"
         user = db.query(User).filter(User.email == email).first()
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
-        return user
+        principal = Principal.from_user(user)
+        principal_cache.put(email, principal)
+        return principal
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    finally:
+        AUTH_SECONDS.observe(time.perf_counter() - started, outcome)
+
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[Principal]:
+    """
+    Principal for endpoints that also serve anonymous callers (e.g. /query
+    personalization): None without a token or with an invalid one.
+    """
+    if not token:
+        return None
+    db = SessionLocal()  # sin conexión hasta el primer SELECT (solo en un miss)
+    try:
+        return await get_current_user(token, db)
+    except HTTPException:
+        return None
+    finally:
+        db.close()
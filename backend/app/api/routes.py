@@ -3,15 +3,32 @@ Routes — API Endpoints de NomadMatch (Prototipo 4)
 Endpoints REST para búsqueda RAG, upload, health, chat y preferencias de ciudades.
 Auth se maneja en auth.py.
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from sqlalchemy.orm import Session
 import os
-import shutil
-
-from ..models.user import User, UserCityPreference
-from .deps import get_db, get_current_user
+import io
+import json
+import time
+import asyncio
+
+from ..models.user import SessionLocal, UserCityPreference, upsert_city_preferences
+from .deps import get_db, get_current_user, get_optional_user, principal_cache
+from .auth import password_executor
+from ..core.config import settings
+from ..utils.ranking import rank_cities as _rank_cities
+from ..utils.result_cache import ResultCache, make_key
+from ..utils.filters import FilterError, compile_filters
+from ..utils.streaming_ingest import BodyStreamReader
+from ..utils.principal_cache import Principal
+from ..utils.taste_profiles import TasteProfile, TasteProfiles, blend_taste
+from ..utils.llm_utils import ERROR_ADVICE, AdviceStats, stream_premium_advice
+from ..utils.metrics import ERRORS, PREMIUM_ADVICE_SECONDS, RANK_SECONDS, registry
+from ..utils.request_trace import span, traced_response
 
 router = APIRouter()
 
@@ -19,17 +36,57 @@ router = APIRouter()
 chroma_manager = None
 
 
+# ── Caché de respuestas (invalidada por chroma_manager.version) ──
+result_cache = ResultCache(max_entries=settings.RESULT_CACHE_SIZE)
+
+
+# ── Caché de consejos LLM: (consulta, ids del contexto top-3) + versión de la colección ──
+advice_cache = ResultCache(max_entries=settings.ADVICE_CACHE_SIZE)
+advice_stats = AdviceStats()
+
+
+# ── Vectores de gusto por usuario (likes/dislikes) ──
+taste_profiles = TasteProfiles(max_entries=settings.TASTE_PROFILE_CACHE_SIZE)
+
+
 def set_chroma_manager(cm):
     global chroma_manager
     chroma_manager = cm
 
 
+# ── Auto-ingesta de arranque (set by main.py) ─────
+auto_ingest = None
+
+
+def set_auto_ingest(job):
+    global auto_ingest
+    auto_ingest = job
+
+
+# ── Cliente Langflow (set by main.py) ─────────────
+langflow_client = None
+
+
+def set_langflow_client(client):
+    global langflow_client
+    langflow_client = client
+
+
 # ── Pydantic Models ───────────────────────────────
 class QueryRequest(BaseModel):
     query: str
     num_results: int = 15
     preferences: Optional[dict] = None
     tier: str = "free"
+    # Filtros duros sobre metadata, aplicados antes de la búsqueda vectorial, p. ej.
+    # {"budget_eur": {"lte": 1500}, "region": ["Southern Europe"]} o, en premium,
+    # {"visa": "Yes", "visa_income_req": {"lte": 3000}}. Todos se cumplen en el mismo
+    # documento (una fila de un CSV): no mezclar campos de CSV distintos (compile_filters)
+    filters: Optional[Dict[str, Any]] = None
+
+
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest]
 
 
 class ChatRequest(BaseModel):
@@ -42,103 +99,36 @@ class CityPreferenceRequest(BaseModel):
     action: str  # "like" o "dislike"
 
 
+class BulkCityPreferenceAction(BaseModel):
+    city_name: str
+    action: str  # "like", "dislike" o "delete"
+
+
+class BulkCityPreferenceRequest(BaseModel):
+    actions: List[BulkCityPreferenceAction]
+
+
 # ── Ranking / Boost Scoring ───────────────────────
 def rank_cities(results: list, preferences: dict = None, tier: str = "free") -> list:
-    """Apply boost scoring based on metadata matches."""
-    if not preferences:
-        preferences = {}
-
-    ranked = []
-    for r in results:
-        meta = r.get("metadata", {})
-        score = r.get("base_score", 0.5)
-        boosts_applied = []
-
-        # Visa boost
-        if preferences.get("visa") == "Yes" and meta.get("visa") == "Yes":
-            score += 0.30
-            boosts_applied.append("visa:+0.30")
-
-        # Internet boost
-        if meta.get("internet") == "Excellent":
-            score += 0.15
-            boosts_applied.append("internet:+0.15")
-
-        # Budget boost
-        pref_budget = preferences.get("budget", "")
-        city_budget = meta.get("budget", "")
-        if pref_budget == "Very Affordable" and city_budget == "Very Affordable":
-            score += 0.30
-            boosts_applied.append("budget_match:+0.30")
-        elif pref_budget == "Affordable" and city_budget in ("Affordable", "Very Affordable"):
-            score += 0.20
-            boosts_applied.append("budget_match:+0.20")
-        elif pref_budget == "Moderate" and city_budget in ("Moderate", "Affordable"):
-            score += 0.10
-            boosts_applied.append("budget_match:+0.10")
-
-        # Climate boost
-        pref_climate = preferences.get("climate", "")
-        if pref_climate == "Warm" and meta.get("summer_temp") in ("Warm", "Hot"):
-            score += 0.15
-            boosts_applied.append("climate:+0.15")
-        elif pref_climate == "Mild" and meta.get("summer_temp") == "Mild":
-            score += 0.15
-            boosts_applied.append("climate:+0.15")
-
-        # Safety boost
-        if meta.get("safety") == "Excellent":
-            score += 0.05
-            boosts_applied.append("safety:+0.05")
-
-        # Family boost
-        if preferences.get("family") == "Yes" and meta.get("family") in ("Good", "Excellent"):
-            score += 0.10
-            boosts_applied.append("family:+0.10")
-
-        # Nightlife boost
-        if preferences.get("nightlife") == "Yes" and meta.get("nightlife") in ("Good", "Excellent"):
-            score += 0.10
-            boosts_applied.append("nightlife:+0.10")
-
-        # Vibe tag matching
-        pref_vibes = preferences.get("vibes", [])
-        if isinstance(pref_vibes, str):
-            pref_vibes = [v.strip() for v in pref_vibes.split(",")]
-        city_vibes = meta.get("vibe_tags", "").lower()
-        vibe_matches = sum(1 for v in pref_vibes if v.lower() in city_vibes)
-        if vibe_matches > 0:
-            vibe_boost = min(vibe_matches * 0.05, 0.15)
-            score += vibe_boost
-            boosts_applied.append(f"vibes({vibe_matches}):+{vibe_boost:.2f}")
-
-        final_score = min(score, 1.0)
-
-        entry = {
-            "city": meta.get("city", "Unknown"),
-            "country": meta.get("country", ""),
-            "region": meta.get("region", ""),
-            "score": round(final_score, 4),
-            "score_pct": round(final_score * 100, 1),
-            "base_score": r.get("base_score", 0),
-            "boosts": boosts_applied,
-            "metadata": meta,
-        }
-
-        if tier == "premium":
-            entry["premium_data"] = {
-                "visa_available": meta.get("visa", "No"),
-                "visa_type": meta.get("visa_type", "N/A"),
-                "visa_duration": meta.get("visa_duration", "N/A"),
-                "visa_income_req_eur": meta.get("visa_income_req", 0),
-                "visa_score": meta.get("visa_score", "N/A"),
-                "schengen": meta.get("schengen", "N/A"),
-            }
+    """Apply boost scoring based on metadata matches (vectorized, see utils/ranking.py)."""
+    features = chroma_manager.features if chroma_manager is not None else None
+    with RANK_SECONDS.time(), span("rank"):
+        return _rank_cities(results, preferences, tier=tier, features=features)
 
-        ranked.append(entry)
 
-    ranked.sort(key=lambda x: x["score"], reverse=True)
-    return ranked
+# ── Métricas Prometheus: contadores de las cachés leídos en cada scrape ──
+def _caches() -> dict:
+    caches = {"result": result_cache, "principal": principal_cache, "advice": advice_cache,
+              "taste_profile": taste_profiles}
+    if chroma_manager is not None and chroma_manager.embedding_cache is not None:
+        caches["query_embedding"] = chroma_manager.embedding_cache
+    return caches
+
+
+registry.callback("nomadmatch_cache_hits_total", "Cache hits by cache.", ["cache"],
+                  lambda: {(name,): c.hits for name, c in _caches().items()})
+registry.callback("nomadmatch_cache_misses_total", "Cache misses by cache.", ["cache"],
+                  lambda: {(name,): c.misses for name, c in _caches().items()})
 
 
 # ══════════════════════════════════════════════════
@@ -152,9 +142,45 @@ async def health_check():
         "status": "healthy",
         "chroma_configured": chroma_manager.initialized,
         **stats,
+        "result_cache": result_cache.stats(),
+        "principal_cache": principal_cache.stats(),
+        "taste_profiles": taste_profiles.stats(),
+        "advice": advice_stats.stats(),
+        "advice_cache": advice_cache.stats(),
+        "password_executor": password_executor.stats(),
+        "auto_ingest": auto_ingest.snapshot() if auto_ingest is not None else None,
+        "langflow": langflow_client.stats() if langflow_client is not None else None,
     }
 
 
+@router.get("/api/v1/health/live")
+async def health_live():
+    """Liveness: the process is up and serving (never waits for ingestion)."""
+    return {"status": "alive"}
+
+
+@router.get("/api/v1/health/ready")
+async def health_ready():
+    """Readiness: ChromaDB initialized and startup ingestion finished; 503 otherwise."""
+    ingest = auto_ingest.snapshot() if auto_ingest is not None else None
+    ready = bool(chroma_manager is not None and chroma_manager.initialized
+                 and (auto_ingest is None or auto_ingest.ready))
+    body = {
+        "status": "ready" if ready else "not_ready",
+        "chroma_configured": bool(chroma_manager is not None and chroma_manager.initialized),
+        "auto_ingest": ingest,
+    }
+    if not ready:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+
+@router.get("/api/v1/metrics")
+async def metrics():
+    """Prometheus text exposition: stage histograms, cache, embedding and error counters."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @router.get("/api/v1/collections")
 async def list_collections():
     stats = chroma_manager.get_stats()
@@ -169,43 +195,199 @@ async def upload_csv(file: UploadFile = File(...)):
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files accepted")
 
-    temp_path = f"/tmp/{file.filename}"
-    with open(temp_path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    # Sin copia a /tmp: se parsea por chunks directamente desde el upload
+    try:
+        report = await chroma_manager.aingest_stream(file.file, os.path.basename(file.filename), with_report=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "status": "success" if not report["failed"] else "partial",
+        "chunks_processed": report["added"],
+        "filename": file.filename,
+        "failed_batches": [b for b in report["batches"] if not b["ok"]],
+    }
+
 
+@router.post("/api/v1/upload/stream")
+async def upload_csv_stream(request: Request, filename: str):
+    """
+    Ingesta en streaming del CSV enviado como cuerpo crudo de la petición
+    (Content-Type: text/csv). Parse, embedding y upsert empiezan con los
+    primeros bytes; la memoria queda acotada por INGEST_CHUNK_ROWS. Si la
+    subida no termina (desconexión del cliente, error de parseo o de ingesta)
+    se deshace solo lo que escribió: los documentos nuevos se borran y los que
+    ya existían recuperan su versión anterior.
+    """
+    if not filename.endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Only CSV files accepted")
+
+    source_file = os.path.basename(filename)
+    body = BodyStreamReader()
+    ingest = asyncio.ensure_future(
+        chroma_manager.aingest_stream(io.BufferedReader(body), source_file, with_report=True, rollback_on_error=True)
+    )
+    ingest.add_done_callback(lambda _: body.abandon())
     try:
-        count = chroma_manager.ingest_csv(temp_path)
-        return {"status": "success", "chunks_processed": count, "filename": file.filename}
+        async for chunk in request.stream():
+            if not await body.feed(chunk):
+                break
+        body.end()
+        report = await ingest
+    except ClientDisconnect:
+        await _abort_stream_ingest(body, ingest, source_file)
+        raise HTTPException(status_code=400, detail="Upload interrupted: client disconnected")
     except Exception as e:
+        await _abort_stream_ingest(body, ingest, source_file)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+    return {
+        "status": "success" if not report["failed"] else "partial",
+        "chunks_processed": report["added"],
+        "filename": filename,
+        "bytes_received": body.bytes_received,
+        "failed_batches": [b for b in report["batches"] if not b["ok"]],
+    }
+
+
+async def _abort_stream_ingest(body: BodyStreamReader, ingest: asyncio.Future, source_file: str):
+    """Stop the ingest of an unfinished upload and wait for it to roll back what it wrote."""
+    body.end(aborted=True)  # el lector falla en vez de ingestar un CSV truncado
+    try:
+        await ingest
+    except Exception:
+        pass  # error esperado ("Upload interrupted") o el mismo que ya se está reportando
+    ERRORS.inc("ingest")
+    print(f"⚠️ Subida de {source_file} interrumpida")
 
 
 @router.post("/api/v1/query")
-async def query_cities(request: QueryRequest):
+async def query_cities(
+    request: QueryRequest,
+    current_user: Optional[Principal] = Depends(get_optional_user),
+):
+    """Búsqueda RAG; con token, el ranking se mezcla con el vector de gusto del usuario."""
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty")
 
-    results = chroma_manager.search(request.query, n_results=request.num_results)
+    where = _compile_filters(request)
+    version = chroma_manager.version
+    profile = await _taste_profile(current_user)
+    # La revisión del perfil cambia con cada swipe: la respuesta cacheada sigue siendo válida
+    endpoint = "query" if profile is None else f"query:taste:{current_user.id}:{profile.revision}"
+    key = make_key(endpoint, request.query, request.preferences, request.tier, request.num_results, request.filters)
+    cached = result_cache.get(key, version)
+    if cached is not None:
+        return traced_response({**cached, "query": request.query})
 
+    results = await chroma_manager.asearch(request.query, n_results=request.num_results, where=where)
+    return traced_response(_query_response(request, results, key, version, profile))
+
+
+def _load_city_actions(user_id: int) -> Dict[str, str]:
+    db = SessionLocal()
+    try:
+        rows = db.query(UserCityPreference.city_name, UserCityPreference.action).filter(
+            UserCityPreference.user_id == user_id
+        ).all()
+        return {city: action for city, action in rows}
+    finally:
+        db.close()
+
+
+async def _taste_profile(user: Optional[Principal]) -> Optional[TasteProfile]:
+    """The caller's taste profile, or None (anonymous, personalization off, or no likes/dislikes)."""
+    if user is None or settings.TASTE_WEIGHT <= 0 or not chroma_manager.initialized:
+        return None
+    centroids = await chroma_manager.acity_centroids()
+    if not len(centroids):
+        return None
+    profile = await taste_profiles.get(user.id, centroids, lambda: run_in_threadpool(_load_city_actions, user.id))
+    return profile if profile.taste is not None else None
+
+
+def _compile_filters(request: QueryRequest) -> Optional[dict]:
+    try:
+        return compile_filters(request.filters)
+    except FilterError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filters: {e}")
+
+
+def _query_response(request: QueryRequest, results: list, key: str, version: int,
+                    profile: Optional[TasteProfile] = None) -> dict:
+    """Rank the search results of one query (blended with the user's taste if given) and cache the response."""
     if not results:
         return {"results": [], "query": request.query, "message": "No results found"}
 
     ranked = rank_cities(results, request.preferences, tier=request.tier)
+    if profile is not None:
+        ranked = blend_taste(ranked, profile, settings.TASTE_WEIGHT)
 
-    return {
+    response = {
         "results": ranked[:3],
         "total_searched": len(results),
         "query": request.query,
         "tier": request.tier,
+        "personalized": profile is not None,
     }
+    result_cache.put(key, version, response)
+    return response
+
+
+@router.post("/api/v1/query/batch")
+async def query_cities_batch(request: BatchQueryRequest):
+    """
+    Varias consultas en una sola llamada: un único request de embeddings y una
+    única consulta vectorial por grupo de filtros y num_results; el ranking se
+    aplica por consulta.
+    """
+    if len(request.queries) > settings.BATCH_QUERY_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.BATCH_QUERY_MAX} queries per batch")
+    for i, q in enumerate(request.queries):
+        if not q.query.strip():
+            raise HTTPException(status_code=400, detail=f"Query {i} cannot be empty")
+
+    wheres = [_compile_filters(q) for q in request.queries]
+    version = chroma_manager.version
+    keys = [make_key("query", q.query, q.preferences, q.tier, q.num_results, q.filters) for q in request.queries]
+    responses = [result_cache.get(key, version) for key in keys]
+    responses = [
+        {**cached, "query": q.query} if cached is not None else None
+        for q, cached in zip(request.queries, responses)
+    ]
+
+    # Una búsqueda por grupo de consultas con los mismos filtros y num_results: el
+    # top-n híbrido depende de n (fusión BM25, camino léxico), así que recortar una
+    # búsqueda más larga no da lo mismo que /query y la clave de caché es compartida
+    groups: Dict[str, List[int]] = {}
+    for i, r in enumerate(responses):
+        if r is None:
+            group = json.dumps([wheres[i], request.queries[i].num_results], sort_keys=True)
+            groups.setdefault(group, []).append(i)
+
+    if len(groups) > 1:
+        # Precalentar la caché: un único request de embeddings para todos los grupos
+        pending_queries = [request.queries[i].query for ids in groups.values() for i in ids]
+        await chroma_manager.executor.run(chroma_manager.embed_queries, pending_queries)
+
+    for pending in groups.values():
+        first = request.queries[pending[0]]
+        all_results = await chroma_manager.asearch_many(
+            [request.queries[i].query for i in pending], n_results=first.num_results, where=wheres[pending[0]]
+        )
+        for i, results in zip(pending, all_results):
+            responses[i] = _query_response(request.queries[i], results, keys[i], version)
+
+    return {"results": responses, "count": len(responses)}
 
 
 @router.post("/api/v1/chat")
 async def chat(request: ChatRequest):
-    results = chroma_manager.search(request.message, n_results=5)
+    key = make_key("chat", request.message, num_results=5)
+    version = chroma_manager.version
+    cached = result_cache.get(key, version)
+    if cached is not None:
+        return traced_response({"response": cached, "session_id": request.session_id})
+
+    results = await chroma_manager.asearch(request.message, n_results=5)
     ranked = rank_cities(results)
 
     if ranked:
@@ -219,7 +401,9 @@ async def chat(request: ChatRequest):
     else:
         response = "I couldn't find matching cities. Try different preferences."
 
-    return {"response": response, "session_id": request.session_id}
+    if ranked:
+        result_cache.put(key, version, response)
+    return traced_response({"response": response, "session_id": request.session_id})
 
 
 # ══════════════════════════════════════════════════
@@ -229,29 +413,19 @@ async def chat(request: ChatRequest):
 @router.post("/api/v1/preferences/city")
 async def set_city_preference(
     request: CityPreferenceRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """Guardar o actualizar preferencia (like/dislike) para una ciudad."""
     if request.action not in ("like", "dislike"):
         raise HTTPException(status_code=400, detail="Action must be 'like' or 'dislike'")
 
-    existing = db.query(UserCityPreference).filter(
-        UserCityPreference.user_id == current_user.id,
-        UserCityPreference.city_name == request.city_name,
-    ).first()
-
-    if existing:
-        existing.action = request.action
-    else:
-        pref = UserCityPreference(
-            user_id=current_user.id,
-            city_name=request.city_name,
-            action=request.action,
-        )
-        db.add(pref)
-
+    # Un solo INSERT ... ON CONFLICT DO UPDATE (sin SELECT previo ni carrera)
+    db.execute(upsert_city_preferences([
+        {"user_id": current_user.id, "city_name": request.city_name, "action": request.action}
+    ]))
     db.commit()
+    taste_profiles.apply(current_user.id, {request.city_name: request.action})
     return {
         "message": f"Preference saved for {request.city_name}",
         "city_name": request.city_name,
@@ -260,18 +434,57 @@ async def set_city_preference(
     }
 
 
-@router.get("/api/v1/preferences/cities")
-async def get_city_preferences(
-    current_user: User = Depends(get_current_user),
+@router.post("/api/v1/preferences/cities/bulk")
+async def bulk_city_preferences(
+    request: BulkCityPreferenceRequest,
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Obtener todas las preferencias del usuario."""
+    """
+    Aplicar un lote ordenado de swipes (like/dislike/delete) en una transacción.
+    Gana la última acción de cada ciudad. Devuelve el estado resultante.
+    """
+    if len(request.actions) > settings.PREFERENCES_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {settings.PREFERENCES_BULK_MAX} actions per batch")
+    final: Dict[str, str] = {}
+    for item in request.actions:
+        if item.action not in ("like", "dislike", "delete"):
+            raise HTTPException(status_code=400, detail="Action must be 'like', 'dislike' or 'delete'")
+        final.pop(item.city_name, None)  # conservar el orden de la última acción
+        final[item.city_name] = item.action
+
+    upserts = [
+        {"user_id": current_user.id, "city_name": city, "action": action}
+        for city, action in final.items() if action != "delete"
+    ]
+    deletes = [city for city, action in final.items() if action == "delete"]
+    if upserts:
+        db.execute(upsert_city_preferences(upserts))
+    if deletes:
+        db.query(UserCityPreference).filter(
+            UserCityPreference.user_id == current_user.id,
+            UserCityPreference.city_name.in_(deletes),
+        ).delete(synchronize_session=False)
+    db.commit()
+    taste_profiles.apply(current_user.id, {
+        city: None if action == "delete" else action for city, action in final.items()
+    })
+
+    return {
+        "applied": len(request.actions),
+        "upserted": len(upserts),
+        "deleted": len(deletes),
+        **_preferences_state(db, current_user.id),
+    }
+
+
+def _preferences_state(db: Session, user_id: int) -> dict:
     prefs = db.query(UserCityPreference).filter(
-        UserCityPreference.user_id == current_user.id
+        UserCityPreference.user_id == user_id
     ).all()
 
     return {
-        "user_id": current_user.id,
+        "user_id": user_id,
         "preferences": [
             {
                 "city_name": p.city_name,
@@ -285,23 +498,32 @@ async def get_city_preferences(
     }
 
 
+@router.get("/api/v1/preferences/cities")
+async def get_city_preferences(
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Obtener todas las preferencias del usuario."""
+    return _preferences_state(db, current_user.id)
+
+
 @router.delete("/api/v1/preferences/city/{city_name}")
 async def delete_city_preference(
     city_name: str,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """Eliminar preferencia de una ciudad."""
-    pref = db.query(UserCityPreference).filter(
+    deleted = db.query(UserCityPreference).filter(
         UserCityPreference.user_id == current_user.id,
         UserCityPreference.city_name == city_name,
-    ).first()
+    ).delete(synchronize_session=False)
 
-    if not pref:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Preference not found")
 
-    db.delete(pref)
     db.commit()
+    taste_profiles.apply(current_user.id, {city_name: None})
     return {"message": f"Preference deleted for {city_name}"}
 
 
@@ -317,40 +539,93 @@ class PremiumAdviceRequest(BaseModel):
 @router.post("/api/v1/premium/advice")
 async def premium_advice(
     request: PremiumAdviceRequest,
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
-    """Devuelve datos premium (visa/tax) para usuarios premium."""
+    """
+    Devuelve datos premium (visa/tax) para usuarios premium: `num_results`
+    ciudades distintas, cada una con su fila de visado y de impuestos unidas,
+    con una sola consulta vectorial.
+    """
     if not current_user.is_premium:
         raise HTTPException(status_code=403, detail="Premium subscription required")
 
-    # Buscar documentos premium en ChromaDB
-    results = chroma_manager.search(
-        request.query,
-        n_results=request.num_results,
-        tier="premium",
-    )
-
-    # Si no hay resultados premium, buscar todos y filtrar
-    if not results:
-        all_results = chroma_manager.search(request.query, n_results=50)
-        results = [
-            r for r in all_results
-            if r.get("metadata", {}).get("tier") == "premium"
-               or r.get("metadata", {}).get("data_type") in ("Visa", "Tax")
-        ][:request.num_results]
-
-    # Deduplicar por ciudad
-    seen = set()
-    unique = []
-    for r in results:
-        city = r.get("metadata", {}).get("city", "")
-        if city and city not in seen:
-            seen.add(city)
-            unique.append(r)
+    with PREMIUM_ADVICE_SECONDS.time("retrieve"):
+        results = await chroma_manager.apremium_grouped(request.query, request.num_results)
 
-    return {
-        "results": unique,
+    return traced_response({
+        "results": results,
         "query": request.query,
-        "count": len(unique),
+        "count": len(results),
         "advice": None,  # placeholder for LLM-generated advice
-    }
+    })
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@router.post("/api/v1/premium/advice/stream")
+async def premium_advice_stream(
+    request: PremiumAdviceRequest,
+    current_user: Principal = Depends(get_current_user),
+):
+    """
+    Consejo LLM en streaming (Server-Sent Events) sobre los datos premium:
+    `context` (ciudades usadas), `token` (fragmentos del texto), `done` (métricas
+    ttft_ms / total_ms) o `error`. La respuesta se cachea por (consulta
+    normalizada, ids del top-3, versión de la colección) y un hit se reenvía al instante.
+    """
+    if not current_user.is_premium:
+        raise HTTPException(status_code=403, detail="Premium subscription required")
+
+    started = time.perf_counter()
+    version = chroma_manager.version
+    with PREMIUM_ADVICE_SECONDS.time("retrieve"):
+        results = await chroma_manager.apremium_grouped(request.query, request.num_results)
+    context_ids = [r["id"] for r in results[:3]]
+    key = make_key("advice:" + ",".join(context_ids), request.query)
+    cached = advice_cache.get(key, version)
+
+    async def events():
+        yield _sse("context", {
+            "cities": [r["city"] for r in results[:3]],
+            "ids": context_ids,
+            "count": len(results),
+            "cached": cached is not None,
+        })
+        if cached is not None:
+            yield _sse("token", {"delta": cached})
+            ttft = time.perf_counter() - started
+            advice_stats.record(ttft, ttft, cached=True)
+            yield _sse("done", {"cached": True, "ttft_ms": round(ttft * 1000, 2), "total_ms": round(ttft * 1000, 2)})
+            return
+
+        parts, ttft = [], None
+        try:
+            async for delta in stream_premium_advice(request.query, results):
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                    PREMIUM_ADVICE_SECONDS.observe(ttft, "llm_first_token")
+                parts.append(delta)
+                yield _sse("token", {"delta": delta})
+        except Exception as e:
+            print(f"❌ Error al generar respuesta LLM: {e}")
+            ERRORS.inc("llm")
+            advice_stats.record(0.0, 0.0, cached=False, error=True)
+            yield _sse("error", {"detail": ERROR_ADVICE, "total_ms": round((time.perf_counter() - started) * 1000, 2)})
+            return
+
+        total = time.perf_counter() - started
+        answer = "".join(parts).strip()
+        if answer:
+            advice_cache.put(key, version, answer)
+        ttft = total if ttft is None else ttft
+        PREMIUM_ADVICE_SECONDS.observe(total, "llm_total")
+        advice_stats.record(ttft, total, cached=False)
+        yield _sse("done", {"cached": False, "ttft_ms": round(ttft * 1000, 2), "total_ms": round(total * 1000, 2)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
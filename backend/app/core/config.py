@@ -11,10 +11,90 @@ class Settings:
     # OpenAI
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
 
+    # Langflow: cliente HTTP con pool keep-alive, timeouts por operación y circuit breaker
+    LANGFLOW_URL: str = os.getenv("LANGFLOW_URL", "http://langflow:7860")
+    LANGFLOW_FLOW_ID: str = os.getenv("LANGFLOW_FLOW_ID", "")
+    LANGFLOW_MAX_CONNECTIONS: int = int(os.getenv("LANGFLOW_MAX_CONNECTIONS", "20"))
+    LANGFLOW_MAX_CONCURRENCY: int = int(os.getenv("LANGFLOW_MAX_CONCURRENCY", "32"))
+    LANGFLOW_CONNECT_TIMEOUT: float = float(os.getenv("LANGFLOW_CONNECT_TIMEOUT", "3"))
+    LANGFLOW_RUN_TIMEOUT: float = float(os.getenv("LANGFLOW_RUN_TIMEOUT", "60"))
+    LANGFLOW_UPLOAD_TIMEOUT: float = float(os.getenv("LANGFLOW_UPLOAD_TIMEOUT", "120"))
+    LANGFLOW_BREAKER_FAILURES: int = int(os.getenv("LANGFLOW_BREAKER_FAILURES", "5"))
+    LANGFLOW_BREAKER_RESET_SECONDS: float = float(os.getenv("LANGFLOW_BREAKER_RESET_SECONDS", "30"))
+
     # ChromaDB
     CHROMA_PERSIST_DIR: str = os.getenv("CHROMA_PERSIST_DIR", "/app/chroma_data")
     CHROMA_COLLECTION_NAME: str = os.getenv("CHROMA_COLLECTION_NAME", "nomadmatch_cities")
 
+    # Embeddings: auto (OpenAI con OPENAI_API_KEY, si no local), openai, local (hashed n-grams,
+    # sin descarga) u onnx (MiniLM de Chroma). Se guarda en la metadata de la colección
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "auto")
+    LOCAL_EMBEDDING_DIMS: int = int(os.getenv("LOCAL_EMBEDDING_DIMS", "512"))
+
+    # Búsqueda híbrida BM25 + vectorial (fusión RRF); LEXICAL_FAST_PATH responde las consultas
+    # léxicas de alta confianza (nombre exacto de ciudad/país, términos muy selectivos) sin consulta vectorial
+    HYBRID_SEARCH: bool = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+    LEXICAL_FAST_PATH: bool = os.getenv("LEXICAL_FAST_PATH", "true").lower() in ("1", "true", "yes")
+    RRF_K: int = int(os.getenv("RRF_K", "60"))
+
+    # Caché de embeddings de consultas (LRU + TTL, persistida en CHROMA_PERSIST_DIR)
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+    EMBEDDING_CACHE_TTL_SECONDS: float = float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    # Backend de búsqueda: "chroma" (HNSW + SQLite) o "numpy" (exacto en memoria)
+    SEARCH_BACKEND: str = os.getenv("SEARCH_BACKEND", "chroma")
+
+    # Pool dedicado para ChromaDB / embeddings (búsquedas)
+    CHROMA_WORKERS: int = int(os.getenv("CHROMA_WORKERS", "4"))
+    CHROMA_MAX_CONCURRENCY: int = int(os.getenv("CHROMA_MAX_CONCURRENCY", "32"))
+    # Pool propio para la ingesta async: una subida en streaming ocupa un hilo mientras
+    # el cliente envía el cuerpo, y no debe quitárselo a las búsquedas (CHROMA_WORKERS)
+    INGEST_WORKERS: int = int(os.getenv("INGEST_WORKERS", "2"))
+
+    # Ingesta en streaming: filas por chunk (memoria pico acotada)
+    INGEST_CHUNK_ROWS: int = int(os.getenv("INGEST_CHUNK_ROWS", "1000"))
+
+    # Embedding concurrente en ingesta masiva (batches por tokens, backoff ante 429)
+    EMBED_WORKERS: int = int(os.getenv("EMBED_WORKERS", "4"))
+    EMBED_BATCH_TOKENS: int = int(os.getenv("EMBED_BATCH_TOKENS", "20000"))
+    EMBED_BATCH_ITEMS: int = int(os.getenv("EMBED_BATCH_ITEMS", "256"))
+
+    # Ingesta de CSVs al arrancar (en segundo plano; ver /api/v1/health/ready)
+    AUTO_INGEST: bool = os.getenv("AUTO_INGEST", "true").lower() in ("1", "true", "yes")
+    AUTO_INGEST_DIRS: list = [
+        d.strip() for d in os.getenv("AUTO_INGEST_DIRS", "/app/external_data,/app/data").split(",") if d.strip()
+    ]
+
+    # Máximo de consultas por llamada a /api/v1/query/batch
+    BATCH_QUERY_MAX: int = int(os.getenv("BATCH_QUERY_MAX", "256"))
+
+    # Máximo de acciones por llamada a /api/v1/preferences/cities/bulk
+    PREFERENCES_BULK_MAX: int = int(os.getenv("PREFERENCES_BULK_MAX", "500"))
+
+    # Caché de respuestas de /query y /chat (0 = desactivada)
+    RESULT_CACHE_SIZE: int = int(os.getenv("RESULT_CACHE_SIZE", "512"))
+
+    # Caché de consejos LLM de /api/v1/premium/advice/stream (0 = desactivada)
+    ADVICE_CACHE_SIZE: int = int(os.getenv("ADVICE_CACHE_SIZE", "256"))
+
+    # Cabecera Server-Timing (embed, vector_query, rank, serialize) en /query, /chat y premium;
+    # con SERVER_TIMING_DEBUG además un objeto `timings` en el JSON de respuesta
+    SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+    SERVER_TIMING_DEBUG: bool = os.getenv("SERVER_TIMING_DEBUG", "false").lower() in ("1", "true", "yes")
+
+    # Caché de usuarios autenticados (get_current_user), por `sub` del JWT
+    PRINCIPAL_CACHE_TTL_SECONDS: float = float(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", "60"))
+    PRINCIPAL_CACHE_SIZE: int = int(os.getenv("PRINCIPAL_CACHE_SIZE", "4096"))
+
+    # Personalización de /query con el vector de gusto (likes - dislikes) del usuario
+    TASTE_WEIGHT: float = float(os.getenv("TASTE_WEIGHT", "0.15"))
+    TASTE_PROFILE_CACHE_SIZE: int = int(os.getenv("TASTE_PROFILE_CACHE_SIZE", "4096"))
+
+    # Hash de contraseñas (bcrypt) en un pool propio, con fail-fast (503) si se satura
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
     # CORS — incluye frontend en Docker (8080) y desarrollo local (3000)
     BACKEND_CORS_ORIGINS: list = [
         "http://localhost:3000",
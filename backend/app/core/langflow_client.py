@@ -1,56 +1,144 @@
-import httpx
+"""
+LangflowClient — Cliente HTTP de Langflow (Prototipo 4)
+Un único httpx.AsyncClient de larga vida (keep-alive, pool acotado), creado en
+el primer uso y cerrado en el lifespan de la app. Timeouts por operación,
+límite de llamadas concurrentes y circuit breaker: con Langflow caído se
+responde al instante con {"error": ...} en vez de esperar al timeout.
+"""
+import asyncio
 from typing import Optional, Dict, Any
-import json
+
 from ..core.config import settings
+from ..utils.circuit_breaker import CircuitBreaker, CircuitOpen
+
 
 class LangflowClient:
-    def __init__(self):
-        self.base_url = settings.LANGFLOW_URL
-        self.flow_id = settings.LANGFLOW_FLOW_ID
-        
-    async def run_flow(self, 
+    def __init__(self, base_url: Optional[str] = None, flow_id: Optional[str] = None,
+                 max_connections: Optional[int] = None, max_concurrency: Optional[int] = None,
+                 connect_timeout: Optional[float] = None, run_timeout: Optional[float] = None,
+                 upload_timeout: Optional[float] = None, breaker: Optional[CircuitBreaker] = None):
+        self.base_url = (base_url or settings.LANGFLOW_URL).rstrip("/")
+        self.flow_id = flow_id or settings.LANGFLOW_FLOW_ID
+        self.max_connections = max_connections or settings.LANGFLOW_MAX_CONNECTIONS
+        self.max_concurrency = max_concurrency or settings.LANGFLOW_MAX_CONCURRENCY
+        self.connect_timeout = connect_timeout or settings.LANGFLOW_CONNECT_TIMEOUT
+        self.run_timeout = run_timeout or settings.LANGFLOW_RUN_TIMEOUT
+        self.upload_timeout = upload_timeout or settings.LANGFLOW_UPLOAD_TIMEOUT
+        self.breaker = breaker or CircuitBreaker(
+            "Langflow",
+            failure_threshold=settings.LANGFLOW_BREAKER_FAILURES,
+            reset_timeout=settings.LANGFLOW_BREAKER_RESET_SECONDS,
+        )
+        self._client = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.requests = 0
+        self.failures = 0
+        self.connections_opened = 0
+        self.in_flight = 0
+
+    def _get_client(self):
+        # httpx se importa en el primer uso (arranque en frío)
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+                timeout=httpx.Timeout(self.run_timeout, connect=self.connect_timeout),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def _trace(self, event_name: str, info: dict):
+        # httpcore solo emite connect_tcp al abrir una conexión nueva (no en keep-alive)
+        if event_name == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+
+    def _timeout(self, seconds: float):
+        import httpx
+        return httpx.Timeout(seconds, connect=self.connect_timeout)
+
+    async def _post(self, path: str, timeout: float, **kwargs) -> Dict[str, Any]:
+        """POST through the pool, the concurrency limit and the circuit breaker."""
+        import httpx
+
+        try:
+            self.breaker.before_call()
+        except CircuitOpen as e:
+            return {"error": str(e), "retry_after": round(e.retry_after, 1)}
+
+        client = self._get_client()
+        try:
+            async with self._semaphore:
+                self.requests += 1
+                self.in_flight += 1
+                try:
+                    response = await client.post(path, timeout=self._timeout(timeout),
+                                                 extensions={"trace": self._trace}, **kwargs)
+                finally:
+                    self.in_flight -= 1
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except httpx.HTTPError as e:  # conexión rechazada, timeout, ...
+            self.failures += 1
+            self.breaker.record_failure()
+            return {"error": f"{type(e).__name__}: {e}"}
+
+        if response.status_code >= 500:
+            self.failures += 1
+            self.breaker.record_failure()
+            return {"error": f"HTTP error: {response.status_code}"}
+        self.breaker.record_success()  # 4xx: Langflow responde, el error es de la petición
+        if response.is_error:
+            return {"error": f"HTTP error: {response.status_code}"}
+        try:
+            return response.json()
+        except ValueError as e:
+            return {"error": f"Invalid JSON from Langflow: {e}"}
+
+    async def run_flow(self,
                       message: str,
                       session_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Execute a Langflow flow with the given message
         """
-        url = f"{self.base_url}/api/v1/run/{self.flow_id}"
-        
         payload = {
             "input_value": message,
             "output_type": "chat",
             "input_type": "chat"
         }
-        
+
         if session_id:
             payload["session_id"] = session_id
-            
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    url, 
-                    json=payload,
-                    timeout=60.0
-                )
-                response.raise_for_status()
-                return response.json()
-            except httpx.HTTPStatusError as e:
-                return {"error": f"HTTP error: {e}"}
-            except Exception as e:
-                return {"error": str(e)}
-    
+
+        return await self._post(f"/api/v1/run/{self.flow_id}", self.run_timeout, json=payload)
+
     async def upload_document(self, file_content: bytes, filename: str) -> Dict[str, Any]:
         """
         Upload a document to Langflow for processing
         """
-        url = f"{self.base_url}/api/v1/upload/{self.flow_id}"
-        
         files = {"file": (filename, file_content, "text/csv")}
-        
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, files=files)
-                response.raise_for_status()
-                return response.json()
-            except Exception as e:
-                return {"error": str(e)}
+        return await self._post(f"/api/v1/upload/{self.flow_id}", self.upload_timeout, files=files)
+
+    async def aclose(self):
+        """Close the pooled client (app lifespan shutdown)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> dict:
+        return {
+            "base_url": self.base_url,
+            "flow_id": self.flow_id,
+            "connected": self._client is not None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "connections_opened": self.connections_opened,
+            # Fracción de peticiones servidas por una conexión keep-alive ya abierta
+            "connection_reuse": round(1 - self.connections_opened / self.requests, 4) if self.requests else 0.0,
+            "max_connections": self.max_connections,
+            "max_concurrency": self.max_concurrency,
+            "breaker": self.breaker.stats(),
+        }
@@ -0,0 +1,16 @@
+"""
+Security — Hash de contraseñas con bcrypt (Prototipo 4)
+Módulo mínimo (solo bcrypt) para que los procesos del pool de hashing
+(auth.password_executor) arranquen rápido: bcrypt 4.0 no libera el GIL, así
+que se ejecuta en procesos aparte y no bloquea el event loop.
+"""
+import bcrypt
+
+
+def hash_password(password: str, rounds: int = 12) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
+
+
+def check_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
@@ -1,24 +1,48 @@
 """
 NomadMatch Backend — FastAPI Application (Prototipo 4)
 RAG-powered city recommendation system for digital nomads.
-Punto de entrada único: arranca FastAPI, inicializa ChromaDB y auto-ingesta CSVs.
+Punto de entrada único: arranca FastAPI, inicializa ChromaDB y auto-ingesta CSVs
+en segundo plano.
 """
 import os
-import glob
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from app.core.config import settings
+from app.models.user import init_db
 from app.utils.chroma_utils import ChromaManager
-from app.api.routes import router as routes_router, set_chroma_manager
-from app.api.auth import router as auth_router
+from app.utils.auto_ingest import AutoIngest
+from app.core.langflow_client import LangflowClient
+from app.utils.request_trace import ServerTimingMiddleware
+from app.api.routes import router as routes_router, set_chroma_manager, set_auto_ingest, set_langflow_client
+from app.api.auth import router as auth_router, password_executor
+
+
+# ── Lifespan: auto-ingesta en segundo plano ───────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tablas + migraciones una sola vez, antes de servir (SQLite: milisegundos)
+    init_db()
+    # ChromaDB se abre en segundo plano: el worker responde desde el primer momento
+    print("📂 Inicialización de ChromaDB y auto-ingesta en segundo plano — "
+          "/api/v1/health/ready responde 503 hasta terminar")
+    auto_ingest.start()
+    yield
+    auto_ingest.stop()
+    await langflow_client.aclose()
+    cm.close()
+    password_executor.shutdown(wait=False)
+
 
 app = FastAPI(
     title="NomadMatch RAG API",
     description="RAG-powered city recommendation for digital nomads",
-    version="4.0.0"
+    version="4.0.0",
+    lifespan=lifespan,
 )
 
 # ── CORS ──────────────────────────────────────────
@@ -30,58 +54,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ── Server-Timing (opt-in): desglose de tiempos por petición ──
+if settings.SERVER_TIMING:
+    app.add_middleware(
+        ServerTimingMiddleware,
+        paths=["/api/v1/query", "/api/v1/chat", "/api/v1/premium/advice", "/api/v1/premium/advice/stream"],
+        debug=settings.SERVER_TIMING_DEBUG,
+    )
+
 # ── ChromaDB init ─────────────────────────────────
 persist_dir = os.getenv("CHROMA_PERSIST_DIR", "/app/chroma_data")
-cm = ChromaManager(persist_directory=persist_dir)
+cm = ChromaManager(
+    persist_directory=persist_dir,
+    embedding_cache_size=settings.EMBEDDING_CACHE_SIZE,
+    embedding_cache_ttl=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    search_workers=settings.CHROMA_WORKERS,
+    max_concurrency=settings.CHROMA_MAX_CONCURRENCY,
+    search_backend=settings.SEARCH_BACKEND,
+    ingest_workers=settings.INGEST_WORKERS,
+    ingest_chunk_rows=settings.INGEST_CHUNK_ROWS,
+    embed_workers=settings.EMBED_WORKERS,
+    embed_batch_tokens=settings.EMBED_BATCH_TOKENS,
+    embed_batch_items=settings.EMBED_BATCH_ITEMS,
+    embedding_backend=settings.EMBEDDING_BACKEND,
+    local_embedding_dims=settings.LOCAL_EMBEDDING_DIMS,
+    hybrid_search=settings.HYBRID_SEARCH,
+    lexical_fast_path=settings.LEXICAL_FAST_PATH,
+    rrf_k=settings.RRF_K,
+    lazy_init=True,
+)
 set_chroma_manager(cm)
 
-# ── Auto-ingest CSVs on startup ──────────────────
-def auto_ingest():
-    """
-    Busca CSVs en /app/data (backend interno) y /app/external_data (montado desde ./data)
-    y los ingesta si ChromaDB está vacío.
-    """
-    stats = cm.get_stats()
-    current_docs = stats.get("total_documents", 0)
-
-    if current_docs > 0:
-        print(f"✅ ChromaDB ya tiene {current_docs} documentos — saltando ingesta")
-        return
-
-    print("📂 ChromaDB vacío — buscando CSVs para auto-ingestar...")
-
-    # Directorios donde buscar CSVs
-    search_dirs = [
-        "/app/external_data",  # montado desde ./data (raíz del proyecto)
-        "/app/data",           # copiado desde backend/data en el Dockerfile
-    ]
-
-    csv_files = []
-    for d in search_dirs:
-        if os.path.isdir(d):
-            found = glob.glob(os.path.join(d, "*.csv"))
-            csv_files.extend(found)
-            print(f"  📁 {d}: {len(found)} CSV(s) encontrados")
-
-    if not csv_files:
-        print("⚠️ No se encontraron CSVs para ingestar")
-        return
-
-    import pandas as pd
-    total = 0
-    for csv_path in csv_files:
-        try:
-            filename = os.path.basename(csv_path)
-            df = pd.read_csv(csv_path)
-            print(f"  📊 Ingestando {filename}: {len(df)} filas, {len(df.columns)} columnas")
-            count = cm.ingest_dataframe(df, source_file=filename)
-            total += count
-        except Exception as e:
-            print(f"  ❌ Error ingestando {csv_path}: {e}")
-
-    print(f"🎉 Auto-ingesta completada: {total} documentos totales en ChromaDB")
+# ── Auto-ingest CSVs on startup (background) ─────
+# Busca CSVs en /app/external_data (montado desde ./data) y /app/data (copiado
+# desde backend/data en el Dockerfile). Solo ingesta los nuevos, modificados o
+# incompletos según el manifest (ver utils/auto_ingest.py).
+auto_ingest = AutoIngest(cm, search_dirs=settings.AUTO_INGEST_DIRS, enabled=settings.AUTO_INGEST)
+set_auto_ingest(auto_ingest)
 
-auto_ingest()
+# ── Langflow: un cliente con pool keep-alive para toda la app (cerrado en el lifespan)
+langflow_client = LangflowClient()
+set_langflow_client(langflow_client)
 
 # ── Routers ───────────────────────────────────────
 app.include_router(routes_router)
@@ -95,9 +108,14 @@ async def root():
         "docs": "/docs",
         "endpoints": [
             "GET  /api/v1/health",
+            "GET  /api/v1/health/live",
+            "GET  /api/v1/health/ready",
+            "GET  /api/v1/metrics",
             "GET  /api/v1/collections",
             "POST /api/v1/upload",
+            "POST /api/v1/upload/stream",
             "POST /api/v1/query",
+            "POST /api/v1/query/batch",
             "POST /api/v1/chat",
             "POST /api/v1/auth/register",
             "POST /api/v1/auth/login",
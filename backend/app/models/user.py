@@ -1,11 +1,41 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Text, DateTime, ForeignKey
+from sqlalchemy import (
+    create_engine, event, inspect, text, Column, Integer, String, Boolean, Text, DateTime, ForeignKey, Index,
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import os
+import threading
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./users.db")
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+# SQLite: WAL (lectores no bloquean al escritor), fsync solo en checkpoints y
+# espera ante SQLITE_BUSY en vez de fallar con "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -20000,  # ~20 MB de páginas en memoria
+    "temp_store": "MEMORY",
+}
+
+
+def make_engine(url: str = DATABASE_URL, tuned: bool = True):
+    """Create the engine; for SQLite, apply SQLITE_PRAGMAS on every new connection (tuned=True)."""
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    if tuned:
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, _record):
+            cursor = dbapi_connection.cursor()
+            for name, value in SQLITE_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return engine
+
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -31,5 +61,63 @@ class UserCityPreference(Base):
 
     user = relationship("User", back_populates="city_preferences")
 
-# Crear tablas si no existen (conserva datos)
-Base.metadata.create_all(bind=engine)
+    # Una preferencia por (usuario, ciudad): permite INSERT ... ON CONFLICT DO UPDATE
+    __table_args__ = (
+        Index("uq_user_city_preferences_user_city", "user_id", "city_name", unique=True),
+    )
+
+
+def upsert_city_preferences(rows: list):
+    """
+    Single-statement upsert of {"user_id", "city_name", "action"} rows:
+    INSERT ... ON CONFLICT (user_id, city_name) DO UPDATE SET action = excluded.action.
+    """
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    now = datetime.utcnow()
+    stmt = insert(UserCityPreference).values([{**row, "created_at": now} for row in rows])
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id", "city_name"],
+        set_={"action": stmt.excluded.action},
+    )
+
+
+# ── Migraciones ───────────────────────────────────
+def migrate_city_preferences_unique_index(conn):
+    """
+    Existing databases: create_all() does not add indexes to existing tables.
+    Keep the newest row per (user_id, city_name) and create the unique index.
+    """
+    indexes = {ix["name"] for ix in inspect(conn).get_indexes("user_city_preferences")}
+    if "uq_user_city_preferences_user_city" in indexes:
+        return
+    removed = conn.execute(text(
+        "DELETE FROM user_city_preferences WHERE id NOT IN ("
+        " SELECT MAX(id) FROM user_city_preferences GROUP BY user_id, city_name)"
+    )).rowcount
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_user_city_preferences_user_city "
+        "ON user_city_preferences (user_id, city_name)"
+    ))
+    print(f"🛠️ Migración: índice único (user_id, city_name) creado ({removed} duplicados eliminados)")
+
+
+# Crear tablas si no existen (conserva datos). Se hace una vez en el lifespan
+# de la app (main.py), no al importar; el lock evita dos create_all + migración
+# concurrentes si se llama desde varios hilos (scripts, tests).
+_tables_ready = False
+_tables_lock = threading.Lock()
+
+
+def init_db():
+    global _tables_ready
+    if _tables_ready:
+        return
+    with _tables_lock:
+        if not _tables_ready:
+            Base.metadata.create_all(bind=engine)
+            with engine.begin() as conn:
+                migrate_city_preferences_unique_index(conn)
+            _tables_ready = True
@@ -0,0 +1,161 @@
+"""
+AutoIngest — Ingesta de CSVs al arrancar, en segundo plano (Prototipo 4)
+Se lanza desde el lifespan de FastAPI en un hilo propio, de modo que uvicorn
+acepta conexiones desde el primer momento (/api/v1/health/live) y
+/api/v1/health/ready responde 503 hasta que termina. También abre ChromaDB si
+ChromaManager se creó con lazy_init. Usa IngestManifest para saltar los CSVs
+sin cambios y para detectar ingestas incompletas (proceso interrumpido,
+batches fallidos o documentos que faltan en la colección).
+"""
+import glob
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from .document_builder import METADATA_VERSION
+from .ingest_manifest import IngestManifest, file_fingerprint, file_sha256
+
+# Estados de la ingesta de arranque
+PENDING, RUNNING, READY, FAILED = "pending", "running", "ready", "failed"
+
+
+class AutoIngest:
+    def __init__(self, chroma_manager, search_dirs: List[str], manifest_path: Optional[str] = None,
+                 enabled: bool = True):
+        self.cm = chroma_manager
+        self.search_dirs = search_dirs
+        self.enabled = enabled
+        # Sin ruta explícita, el manifest de la colección abierta (se resuelve en run(),
+        # tras abrir ChromaDB: cada modelo de embeddings tiene su colección)
+        self.manifest_path = manifest_path
+        self.manifest = IngestManifest(manifest_path) if manifest_path else None
+        self.status = PENDING
+        self.files: Dict[str, str] = {}  # source_file -> "skipped" / "ingested" / "partial" / "error: ..."
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    # ── Ciclo de vida ─────────────────────────────
+    def start(self) -> None:
+        """Run in a daemon thread so startup never waits for CSV reads or embedding calls."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self.run, name="auto-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop after the file being ingested (upserts are idempotent; the rest resumes next start)."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def find_csvs(self) -> List[str]:
+        csv_files = []
+        for d in self.search_dirs:
+            if os.path.isdir(d):
+                found = sorted(glob.glob(os.path.join(d, "*.csv")))
+                csv_files.extend(found)
+                print(f"  📁 {d}: {len(found)} CSV(s) encontrados")
+        return csv_files
+
+    def run(self) -> None:
+        self.status = RUNNING
+        self.started_at = time.time()
+        try:
+            # Con lazy_init, ChromaDB (y chromadb/onnxruntime) se abre aquí, fuera del arranque
+            self.cm.initialize()
+            if not self.cm.initialized:
+                raise RuntimeError("ChromaDB no inicializado")
+            if self.manifest is None:
+                self.manifest = IngestManifest(self.cm.manifest_path)
+            if not self.enabled:
+                self.status = READY
+                return
+            csv_files = self.find_csvs()
+            if not csv_files:
+                print("⚠️ No se encontraron CSVs para ingestar")
+            counts = self.cm.source_counts()
+            total = 0
+            for csv_path in csv_files:
+                if self._stop.is_set():
+                    print("⏹️ Auto-ingesta interrumpida (shutdown)")
+                    return
+                filename = os.path.basename(csv_path)
+                try:
+                    total += self.sync_file(csv_path, counts.get(filename, 0))
+                except Exception as e:
+                    self.files[filename] = f"error: {e}"
+                    print(f"  ❌ Error ingestando {csv_path}: {e}")
+            print(f"🎉 Auto-ingesta completada: {total} documentos nuevos, "
+                  f"{self.cm.get_stats().get('total_documents', 0)} totales en ChromaDB")
+            self.status = READY
+        except Exception as e:
+            self.error = str(e)
+            self.status = FAILED
+            print(f"❌ Auto-ingesta fallida: {e}")
+        finally:
+            self.finished_at = time.time()
+
+    # ── Un fichero ────────────────────────────────
+    def sync_file(self, csv_path: str, indexed: int) -> int:
+        """Ingest `csv_path` unless the manifest and the collection say it is already complete."""
+        filename = os.path.basename(csv_path)
+        model = self.cm.embedding_model
+        entry = self.manifest.get(filename)
+
+        # Camino rápido: mismo tamaño/mtime y todos sus documentos en la colección
+        if self.manifest.is_unchanged(filename, csv_path, model, METADATA_VERSION) \
+                and indexed >= entry.get("documents", 0):
+            self.files[filename] = "skipped"
+            return 0
+
+        sha = file_sha256(csv_path)
+        fingerprint = file_fingerprint(csv_path)
+        stale = entry is not None and entry.get("metadata_version", 1) != METADATA_VERSION
+        if entry and entry.get("sha256") == sha and entry.get("embedding_model") == model and not stale \
+                and entry.get("status") == "complete" and indexed >= entry.get("documents", 0):
+            # Solo cambió el mtime (p. ej. checkout / copia): contenido idéntico
+            self.manifest.record(filename, **fingerprint)
+            self.files[filename] = "skipped"
+            return 0
+
+        if entry is None:
+            # Documentos sin entrada en el manifest: colección anterior a él, con el
+            # mapeo de metadata v1 (population/visa_income_req vacíos): se reingesta
+            reason = "metadata de una versión anterior" if indexed else "nuevo"
+        elif entry.get("sha256") != sha or entry.get("embedding_model") != model:
+            reason = "modificado"
+        elif stale:
+            reason = "metadata de una versión anterior"
+        else:
+            reason = f"incompleto (estado '{entry.get('status')}', {indexed}/{entry.get('documents')} documentos)"
+
+        # Contenido o metadata distintos: borrar sus documentos para no dejar filas huérfanas
+        if indexed and reason in ("modificado", "metadata de una versión anterior"):
+            self.cm.delete_source(filename)
+
+        print(f"  📊 Ingestando {filename}: {reason}")
+        self.manifest.record(filename, sha256=sha, embedding_model=model, metadata_version=METADATA_VERSION,
+                             status="ingesting", **fingerprint)
+        with open(csv_path, "rb") as f:
+            report = self.cm.ingest_stream(f, filename, with_report=True)
+        status = "complete" if not report["failed"] else "partial"
+        self.manifest.record(filename, documents=report["added"] + report["failed"],
+                             failed=report["failed"], status=status)
+        self.files[filename] = "ingested" if status == "complete" else "partial"
+        return report["added"]
+
+    def snapshot(self) -> Dict:
+        return {
+            "status": self.status,
+            "files": dict(self.files),
+            "error": self.error,
+            "seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else None,
+        }
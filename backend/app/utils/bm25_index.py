@@ -0,0 +1,136 @@
+"""
+BM25Index — Índice invertido BM25 en memoria para búsqueda híbrida (Prototipo 4)
+Se construye en cada refresh de la colección (tras la ingesta) con los mismos
+documentos y en el mismo orden que MetadataBitmapIndex, así que los filtros
+(`mask`) se aplican tal cual. Cada posting guarda ya su peso BM25 (idf y
+normalización por longitud precalculados): puntuar una consulta es sumar
+arrays. Además detecta consultas léxicas de alta confianza (nombre exacto de
+ciudad/país, o 2-3 términos selectivos): sus documentos van primero y, si el
+ranking BM25 llena el top-k, ChromaManager la resuelve sin consulta vectorial.
+"""
+import re
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[^\W_]+")  # "Visa_Type_Details" -> visa, type, details
+_COMBINING = re.compile(r"[\u0300-\u036f]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, accent-folded word tokens ("Málaga, D7/D8" -> ["malaga", "d7", "d8"])."""
+    text = (text or "").lower()
+    if not text.isascii():
+        text = _COMBINING.sub("", unicodedata.normalize("NFKD", text))
+    return _TOKEN.findall(text)
+
+
+class BM25Index:
+    def __init__(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict],
+                 k1: float = 1.2, b: float = 0.75):
+        self.ids = list(ids)
+        self.size = len(self.ids)
+        self.k1 = k1
+        self.b = b
+        # Nombre exacto (ciudad, país, "ciudad país") -> filas
+        self.names: Dict[Tuple[str, ...], List[int]] = {}
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        lengths = np.zeros(self.size, dtype=np.intp)
+
+        for row, (document, meta) in enumerate(zip(documents, metadatas)):
+            tokens = tokenize(document)
+            lengths[row] = len(tokens)
+            term_ids += [vocabulary.setdefault(t, len(vocabulary)) for t in tokens]
+            meta = meta or {}
+            city, country = tuple(tokenize(meta.get("city"))), tuple(tokenize(meta.get("country")))
+            for name in {city, country, city + country}:
+                if name:
+                    self.names.setdefault(name, []).append(row)
+
+        # (término, fila) -> tf en un solo np.unique, agrupado por término
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), lengths)
+        pairs, tf = np.unique(np.asarray(term_ids, dtype=np.int64) * max(self.size, 1) + rows, return_counts=True)
+        pair_terms, pair_rows = np.divmod(pairs, max(self.size, 1))
+        bounds = np.searchsorted(pair_terms, np.arange(len(vocabulary) + 1))
+        df = np.diff(bounds)
+
+        avgdl = float(lengths.mean()) if self.size else 0.0
+        norm = k1 * (1 - b + b * lengths / avgdl) if avgdl else np.zeros(self.size)
+        idf = np.log(1 + (self.size - df + 0.5) / (df + 0.5))
+        weights = idf[pair_terms] * tf * (k1 + 1) / (tf + norm[pair_rows])
+        pair_rows = pair_rows.astype(np.intp)
+        # term -> (filas, peso BM25 de la fila para el término)
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {
+            term: (pair_rows[bounds[t]:bounds[t + 1]], weights[bounds[t]:bounds[t + 1]])
+            for term, t in vocabulary.items()
+        }
+
+    def __len__(self):
+        return self.size
+
+    def scores(self, terms: Sequence[str]) -> np.ndarray:
+        scores = np.zeros(self.size)
+        for term in set(terms):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def search(self, query: str, n: int, mask: Optional[np.ndarray] = None,
+               first: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-n (rows, scores) by BM25 among rows in `mask`; only rows matching at least
+        one term. `first` rows (see exact_match) go ahead of the rest, still ordered
+        among themselves by BM25 (their scores are offset above every other score).
+        """
+        scores = self.scores(tokenize(query))
+        if mask is not None:
+            scores[~mask] = 0.0
+        if first is not None and len(first):
+            scores[first] += scores.max() + 1.0
+        return self._top(scores, n)
+
+    def relative_scores(self, query: str, rows: np.ndarray) -> np.ndarray:
+        """BM25 scores of `rows` for `query` over the best of them (1.0 = best hit), no offsets."""
+        scores = self.scores(tokenize(query))[rows]
+        best = scores.max() if len(scores) else 0.0
+        return scores / best if best > 0 else np.ones(len(scores))
+
+    def exact_match(self, query: str, n: int, mask: Optional[np.ndarray] = None,
+                    max_terms: int = 3) -> Optional[np.ndarray]:
+        """
+        Rows (within `mask`) of a high-confidence lexical query, else None. High
+        confidence: the query is exactly a city/country name, or it has 2 to
+        `max_terms` terms, all indexed, and the documents containing all of them fit
+        in the top-n. A single rare word (e.g. "surf") is not an exact lookup.
+        """
+        terms = tokenize(query)
+        if not terms or not self.size:
+            return None
+        exact = self.names.get(tuple(terms))
+        selective = exact is None
+        if selective:
+            if not 2 <= len(terms) <= max_terms or any(t not in self.postings for t in terms):
+                return None
+            exact = self.postings[terms[0]][0]
+            for term in terms[1:]:
+                exact = np.intersect1d(exact, self.postings[term][0], assume_unique=True)
+        exact = np.asarray(exact, dtype=np.intp)
+        if mask is not None:
+            exact = exact[mask[exact]]
+        if not len(exact) or (selective and len(exact) > n):
+            return None
+        return exact
+
+    @staticmethod
+    def _top(scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > n:
+            candidates = candidates[np.argpartition(-scores[candidates], n - 1)[:n]]
+        rows = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return rows, scores[rows]
+
+    def stats(self) -> dict:
+        return {"documents": self.size, "terms": len(self.postings), "names": len(self.names)}
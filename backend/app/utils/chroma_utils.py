@@ -1,53 +1,266 @@
 """
 ChromaManager — Motor RAG de NomadMatch (Prototipo 4)
 Gestiona ChromaDB: ingesta de datos, búsqueda semántica y scoring.
+chromadb y pandas se importan al usarse (inicialización / ingesta), no al
+importar el módulo, para que el arranque en frío sea rápido.
 """
 import os
-import pandas as pd
-import chromadb
-from chromadb.utils import embedding_functions
-from typing import List, Dict, Any, Optional
+import re
+import threading
+import time
+import numpy as np
+from typing import TYPE_CHECKING, List, Dict, Any, Optional
+
+from .ranking import CityFeatureMatrix
+from .embedding_cache import QueryEmbeddingCache, normalize_query
+from .executor import BoundedExecutor
+from .vector_index import NumpyVectorIndex
+from .filters import MetadataBitmapIndex
+from .embedding_pipeline import EmbeddingPipeline, merge_reports
+from .taste_profiles import CityCentroids
+from .premium_index import PremiumIndex
+from .bm25_index import BM25Index
+from .local_embeddings import HashedNgramEmbeddingFunction
+from .metrics import EMBEDDING_CALLS, ERRORS, INGEST_SECONDS, SEARCH_PATHS, SEARCH_SECONDS
+from .request_trace import span
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+SEARCH_BACKENDS = ("chroma", "numpy")
+# "auto" = OpenAI con OPENAI_API_KEY, si no "local" (local_embeddings.py); "onnx" = MiniLM de Chroma (descarga)
+EMBEDDING_BACKENDS = ("auto", "openai", "local", "onnx")
+# base_score del mejor resultado del camino léxico sin embedding (= el neutro de rank_cities)
+LEXICAL_BASE_SCORE = 0.5
+
+
+def model_collection_name(base: str, embedding_model: str) -> str:
+    """Collection for `embedding_model` next to `base` ("nomadmatch_cities-local-hash-ngram-v1-512")."""
+    # Nombres de Chroma: 3-63 caracteres [a-zA-Z0-9._-], empezando y acabando en alfanumérico
+    slug = re.sub(r"[^a-zA-Z0-9_-]+", "-", embedding_model).strip("-_") or "model"
+    return f"{base}-{slug}"[:63].rstrip("-_")
 
 
 class ChromaManager:
-    def __init__(self, persist_directory="/app/chroma_data", collection_name="nomadmatch_cities"):
+    def __init__(self, persist_directory="/app/chroma_data", collection_name="nomadmatch_cities",
+                 embedding_cache_size: int = 1024, embedding_cache_ttl: float = 7 * 24 * 3600,
+                 search_workers: int = 4, max_concurrency: int = 32,
+                 search_backend: str = "chroma", embedding_function=None,
+                 ingest_workers: int = 2, ingest_chunk_rows: int = 1000, embed_workers: int = 4,
+                 embed_batch_tokens: int = 20000, embed_batch_items: int = 256,
+                 embedding_backend: str = "auto", local_embedding_dims: int = 512,
+                 hybrid_search: bool = True, lexical_fast_path: bool = True, rrf_k: int = 60,
+                 lazy_init: bool = False):
+        if search_backend not in SEARCH_BACKENDS:
+            raise ValueError(f"search_backend must be one of {SEARCH_BACKENDS}, got '{search_backend}'")
+        if embedding_backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"embedding_backend must be one of {EMBEDDING_BACKENDS}, got '{embedding_backend}'")
         self.persist_directory = persist_directory
+        # collection_name = colección abierta; distinta de la configurada si otro
+        # embedder ya la usa (ver _open_collection)
+        self.base_collection_name = collection_name
         self.collection_name = collection_name
+        self.embedding_cache_size = embedding_cache_size
+        self.embedding_cache_ttl = embedding_cache_ttl
+        self.embedding_cache = None
+        self.embedding_model = None
+        self.embedding_function = embedding_function
+        self.embedding_backend = embedding_backend
+        self.local_embedding_dims = local_embedding_dims
+        # "chroma" = HNSW + SQLite; "numpy" = índice exacto en memoria (vector_index.py)
+        self.search_backend = search_backend
+        self.vector_index = None
+        self.ingest_chunk_rows = ingest_chunk_rows
+        self.embed_workers = embed_workers
+        self.embed_batch_tokens = embed_batch_tokens
+        self.embed_batch_items = embed_batch_items
+        self.embedding_pipeline = None
+        self.last_ingest_report = None
+        # Búsqueda híbrida: BM25 (bm25_index.py) + vectorial, fusionadas por RRF
+        self.hybrid_search = hybrid_search
+        self.lexical_fast_path = lexical_fast_path
+        self.rrf_k = rrf_k
+        # Pool dedicado para que Chroma/embeddings no bloqueen el event loop
+        self.executor = BoundedExecutor(max_workers=search_workers, max_concurrency=max_concurrency, name="chroma")
+        # Ingesta async en su propio pool: una subida lenta no ocupa hilos de búsqueda
+        self.ingest_executor = BoundedExecutor(max_workers=ingest_workers, max_concurrency=ingest_workers,
+                                               name="chroma-ingest")
         self.client = None
         self.collection = None
         self.initialized = False
-        self._init_chroma()
+        self.features = CityFeatureMatrix([], [])
+        self.metadata_index = MetadataBitmapIndex([])
+        self.premium_index = PremiumIndex([], [], [])
+        self.bm25_index = BM25Index([], [], [])
+        # Se incrementa en cada cambio de la colección (invalida cachés de resultados)
+        self.version = 0
+        self._centroids = None
+        # lazy_init: no abrir ChromaDB hasta initialize() / primer uso (arranque en frío)
+        self._init_lock = threading.Lock()
+        self._init_done = False
+        if not lazy_init:
+            self.initialize()
+
+    def initialize(self):
+        """Initialize ChromaDB once (thread-safe; concurrent callers wait for the first one)."""
+        if self._init_done:
+            return
+        with self._init_lock:
+            if not self._init_done:
+                self._init_chroma()
+                self._init_done = True
 
     def _init_chroma(self):
         """Initialize ChromaDB client and collection."""
         try:
+            import chromadb
+            from chromadb.utils import embedding_functions
+
             os.makedirs(self.persist_directory, exist_ok=True)
             self.client = chromadb.PersistentClient(path=self.persist_directory)
             print(f"✅ ChromaDB PersistentClient: {self.persist_directory}")
 
             api_key = os.getenv("OPENAI_API_KEY", "")
-            if api_key:
+            backend = self.embedding_backend
+            if backend == "auto":
+                backend = "openai" if api_key else "local"
+            if self.embedding_function is not None:
+                self.embedding_model = getattr(self.embedding_function, "model_name", type(self.embedding_function).__name__)
+                print(f"✅ Using custom embedding function: {self.embedding_model}")
+            elif backend == "openai":
+                if not api_key:
+                    raise RuntimeError("EMBEDDING_BACKEND=openai requires OPENAI_API_KEY")
                 self.embedding_function = embedding_functions.OpenAIEmbeddingFunction(
                     api_key=api_key,
                     model_name="text-embedding-3-small"
                 )
+                self.embedding_model = "text-embedding-3-small"
                 print("✅ Using OpenAI text-embedding-3-small (1536 dims)")
+            elif backend == "local":
+                self.embedding_function = HashedNgramEmbeddingFunction(dims=self.local_embedding_dims)
+                self.embedding_model = self.embedding_function.model_name
+                print(f"⚡ Using local hashed n-gram embeddings ({self.local_embedding_dims} dims, no download)")
             else:
                 self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
-                print("⚠️ No OPENAI_API_KEY — using default embeddings")
+                self.embedding_model = "default"
+                print("⚠️ Using Chroma default embeddings (ONNX MiniLM, downloaded on first use)")
+
+            self.embedding_pipeline = EmbeddingPipeline(
+                self.embedding_function,
+                workers=self.embed_workers,
+                max_batch_tokens=self.embed_batch_tokens,
+                max_batch_items=self.embed_batch_items,
+            )
 
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                embedding_function=self.embedding_function,
-                metadata={"hnsw:space": "cosine"}
+            self.embedding_cache = QueryEmbeddingCache(
+                os.path.join(self.persist_directory, "query_embeddings.sqlite3"),
+                max_entries=self.embedding_cache_size,
+                ttl_seconds=self.embedding_cache_ttl,
             )
+
+            self.collection = self._open_collection()
             self.initialized = True
+            self.refresh_features()
+            if self.search_backend == "numpy":
+                self.vector_index = NumpyVectorIndex()
+                loaded = self.vector_index.load_from_collection(self.collection)
+                print(f"🧮 Índice NumPy exacto: {loaded} embeddings en memoria")
             print(f"🎻 ChromaDB listo: {self.collection_name} ({self.collection.count()} docs)")
 
         except Exception as e:
             print(f"❌ Error initializing ChromaDB: {e}")
             self.initialized = False
 
+    def _open_collection(self):
+        """
+        Open the collection for the current embedding model, recorded in its metadata
+        ("embedding_model"). Vectors from different embedders are never mixed and
+        never deleted: the configured name belongs to the first embedder that used it
+        (a collection from before this metadata is adopted if its vectors have the
+        current dimension); any other embedder gets its own collection, suffixed with
+        the model name, so switching back reopens the original vectors untouched.
+        """
+        collection = self._get_or_create_collection(self.base_collection_name)
+        stored = (collection.metadata or {}).get("embedding_model")
+        if stored == self.embedding_model:
+            return collection
+
+        if stored is None:
+            sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            if not sample or len(sample[0]) == len(self.embedding_function(["nomadmatch"])[0]):
+                collection.modify(metadata={"hnsw:space": "cosine", "embedding_model": self.embedding_model})
+                print(f"🏷️ Colección {self.base_collection_name} registrada con embeddings '{self.embedding_model}'")
+                return collection
+
+        self.collection_name = model_collection_name(self.base_collection_name, self.embedding_model)
+        print(f"⚠️ La colección {self.base_collection_name} tiene embeddings de '{stored or 'desconocido'}' "
+              f"({collection.count()} docs), no de '{self.embedding_model}': se conserva intacta y se usa "
+              f"{self.collection_name}. Los documentos subidos por /upload no se copian: re-subirlos o "
+              f"volver a EMBEDDING_BACKEND con '{stored or 'desconocido'}'")
+        return self._get_or_create_collection(self.collection_name)
+
+    def _get_or_create_collection(self, name: str):
+        # get_or_create_collection sobrescribiría la metadata guardada: abrir y, si no existe, crear
+        try:
+            return self.client.get_collection(name, embedding_function=self.embedding_function)
+        except ValueError:
+            return self.client.create_collection(
+                name=name,
+                embedding_function=self.embedding_function,
+                metadata={"hnsw:space": "cosine", "embedding_model": self.embedding_model},
+            )
+
+    @property
+    def manifest_path(self) -> str:
+        """Auto-ingest manifest of the open collection (one per collection, see ingest_manifest.py)."""
+        if self.collection_name == self.base_collection_name:
+            return os.path.join(self.persist_directory, "ingest_manifest.json")
+        return os.path.join(self.persist_directory, f"ingest_manifest.{self.collection_name}.json")
+
+    # ── Matriz de features e índice de metadata ──
+    def refresh_features(self):
+        """
+        Re-encode the metadata of every document for ranking (ranking.py), filters
+        (filters.py) and the premium city → {visa, tax} join (premium_index.py), and
+        rebuild the BM25 index (bm25_index.py, same row order as the filter bitmaps).
+        """
+        try:
+            data = self.collection.get(include=["metadatas", "documents"])
+            metadatas = data["metadatas"] or [{} for _ in data["ids"]]
+            documents = data["documents"] or [""] * len(data["ids"])
+            bm25_index = BM25Index(data["ids"], documents, metadatas) if self.hybrid_search else BM25Index([], [], [])
+            self.features = CityFeatureMatrix(data["ids"], metadatas)
+            self.metadata_index = MetadataBitmapIndex(metadatas)
+            self.premium_index = PremiumIndex(data["ids"], documents, metadatas)
+            self.bm25_index = bm25_index
+        except Exception as e:
+            print(f"❌ Error building feature matrix: {e}")
+            self.features = CityFeatureMatrix([], [])
+            self.metadata_index = MetadataBitmapIndex([])
+            self.premium_index = PremiumIndex([], [], [])
+            self.bm25_index = BM25Index([], [], [])
+
+    def city_centroids(self) -> CityCentroids:
+        """Mean stored embedding per city, rebuilt only when the collection version changes."""
+        self.initialize()
+        centroids = self._centroids
+        if centroids is not None and centroids.version == self.version:
+            return centroids
+        version = self.version
+        try:
+            data = self.collection.get(include=["embeddings", "metadatas"])
+            centroids = CityCentroids(data["embeddings"] or [], data["metadatas"] or [], version)
+        except Exception as e:
+            print(f"❌ Error building city centroids: {e}")
+            centroids = CityCentroids([], [], version)
+        self._centroids = centroids
+        return centroids
+
+    def source_counts(self) -> Dict[str, int]:
+        """Documents per source CSV (from the metadata bitmaps, no Chroma query)."""
+        bitmaps = self.metadata_index.bitmaps.get("source", {})
+        return {source: int(bitmap.sum()) for source, bitmap in bitmaps.items()}
+
     # ── Stats ─────────────────────────────────────
     def get_stats(self) -> Dict:
         if self.collection:
@@ -57,8 +270,20 @@ class ChromaManager:
                 "total_docs": count,  # alias para compatibilidad
                 "collection": self.collection_name,
                 "initialized": self.initialized,
+                "version": self.version,
                 "persist_directory": self.persist_directory,
-                "embedding_model": "text-embedding-3-small",
+                "embedding_model": self.embedding_model,
+                "embedding_cache": self.embedding_cache.stats() if self.embedding_cache else None,
+                "executor": self.executor.stats(),
+                "ingest_executor": self.ingest_executor.stats(),
+                "search_backend": self.search_backend,
+                "vector_index": self.vector_index.stats() if self.vector_index is not None else None,
+                "premium_index": self.premium_index.stats(),
+                "bm25_index": self.bm25_index.stats() if self.hybrid_search else None,
+                "last_ingest": (
+                    {k: v for k, v in self.last_ingest_report.items() if k != "batches"}
+                    if self.last_ingest_report else None
+                ),
             }
         return {
             "total_documents": 0,
@@ -69,174 +294,400 @@ class ChromaManager:
         }
 
     # ── Ingesta desde DataFrame ───────────────────
-    def ingest_dataframe(self, df: pd.DataFrame, source_file: str) -> int:
+    def ingest_dataframe(self, df: "pd.DataFrame", source_file: str) -> int:
         """Ingest a pandas DataFrame into ChromaDB."""
+        from .document_builder import build_documents, file_tier
+
+        self.initialize()
         if not self.initialized or not self.collection:
             print("❌ ChromaDB no inicializado")
             return 0
 
         # Detectar tipo de archivo
-        is_visa_premium = "visa_premium" in source_file.lower()
-        is_tax_premium = "tax_premium" in source_file.lower()
+        is_visa_premium, is_tax_premium = file_tier(source_file)
         is_premium = is_visa_premium or is_tax_premium
 
         print(f"📄 Procesando {len(df)} filas de '{source_file}' ({'PREMIUM' if is_premium else 'FREE'})...")
 
-        documents = []
-        metadatas = []
-        ids = []
-
-        for idx, row in df.iterrows():
-            # Build rich text for embedding
-            text_parts = []
-            for col in df.columns:
-                if pd.notna(row[col]) and str(row[col]).strip():
-                    text_parts.append(f"{col}: {row[col]}")
-            text = " | ".join(text_parts)
-
-            # Determine tier and data_type
-            if is_visa_premium:
-                data_type, tier = "Visa", "premium"
-            elif is_tax_premium:
-                data_type, tier = "Tax", "premium"
-            else:
-                data_type = str(row.get("data_type", "General"))
-                tier = str(row.get("tier", "free"))
-
-            # City name (try multiple column names)
-            city = str(row.get("city", row.get("City", "")))
-            country = str(row.get("Country", row.get("country", "")))
-            region = str(row.get("Region", row.get("region", "")))
-
-            # Base metadata
-            metadata = {
-                "source": source_file,
-                "row_index": str(idx),
-                "city": city,
-                "country": country,
-                "region": region,
-                "data_type": data_type,
-                "tier": tier,
-            }
+        # Documentos + metadata construidos columna a columna (ver document_builder.py)
+        with INGEST_SECONDS.time("build"):
+            documents, metadatas, ids = build_documents(df, source_file)
+
+        report = self._embed_and_upsert(documents, metadatas, ids)
+        self._finish_ingest(source_file, report)
+        return report["added"]
+
+    def _embed_and_upsert(self, documents: List[str], metadatas: List[Dict], ids: List[str],
+                          first_batch: int = 1) -> Dict:
+        """Embed concurrently in token-sized batches and upsert (see embedding_pipeline.py)."""
+        with INGEST_SECONDS.time("upsert"):
+            report = self.embedding_pipeline.run(documents, metadatas, ids, self._write_batch, first_batch=first_batch)
+        EMBEDDING_CALLS.inc("ingest", amount=sum(batch["attempts"] for batch in report["batches"]))
+        for batch in report["batches"]:
+            if not batch["ok"]:
+                ERRORS.inc("ingest")
+                print(f"  ❌ Error en batch {batch['batch']} (filas {batch['start']}-{batch['end']}): {batch['error']}")
+        return report
+
+    def _write_batch(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        embeddings = np.asarray(embeddings, dtype=np.float64).tolist()
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        if self.vector_index is not None:
+            self.vector_index.upsert(ids, embeddings, documents, metadatas)
+
+    def _finish_ingest(self, source_file: str, report: Dict):
+        self.version += 1
+        if report["added"]:
+            self.refresh_features()
+        self.last_ingest_report = {"source": source_file, **report}
+        failed = f", {report['failed']} fallidos" if report["failed"] else ""
+        print(f"  ✅ Ingestados {report['added']} documentos de {source_file}{failed} ({report['seconds']}s)")
+
+    # ── Ingesta en streaming (chunks acotados) ────
+    def ingest_stream(self, fileobj, source_file: str, chunk_rows: int = None, with_report: bool = False,
+                      rollback_on_error: bool = False):
+        """
+        Ingest a CSV from a binary file-like object chunk by chunk (see
+        streaming_ingest.py): memory stays bounded by `chunk_rows`, and each
+        chunk is embedded and upserted while the next one is being parsed.
+        With `rollback_on_error`, an exception mid-stream undoes this upload
+        only: documents it created are deleted and the ones it overwrote are
+        restored, so a failed re-upload keeps the previous version of the file.
+        Returns the number of documents added, or the full report if `with_report`.
+        """
+        from .streaming_ingest import iter_document_chunks
+
+        self.initialize()
+        if not self.initialized or not self.collection:
+            print("❌ ChromaDB no inicializado")
+            return merge_reports([]) if with_report else 0
 
-            # Campos comunes para free
-            common_fields = {
-                "Monthly_Budget_Single": "budget",
-                "Internet_Reliability_Score": "internet",
-                "Digital_Nomad_Visa": "visa",
-                "Summer_Temperature": "summer_temp",
-                "Winter_Temperature": "winter_temp",
-                "Vibe_Tags": "vibe_tags",
-                "Safety_Score": "safety",
-                "Nightlife_Score": "nightlife",
-                "Family_Friendly_Score": "family",
-                "Startup_Scene_Score": "startup",
-                "Coworking_Availability": "coworking",
-                "Expat_Community_Size": "expat_size",
-                "English_Proficiency_Score": "english",
-                "Outdoor_Activities_Score": "outdoor",
-                "Sunshine_Level": "sunshine",
-                "Visa_Score": "visa_score",
-                "Visa_Type": "visa_type",
-                "Visa_Duration": "visa_duration",
-                "Schengen": "schengen",
-            }
-            for csv_col, meta_key in common_fields.items():
-                if csv_col in df.columns and pd.notna(row.get(csv_col)):
-                    metadata[meta_key] = str(row[csv_col])
-
-            # Campos numéricos
-            int_fields = {
-                "Monthly_Budget_Single_EUR": "budget_eur",
-                "Coworking_Monthly_EUR": "coworking_eur",
-                "Airbnb_Avg_Monthly_EUR": "airbnb_eur",
-                "Population": "population",
-                "Visa_Income_Req_EUR": "visa_income_req",
-            }
-            for csv_col, meta_key in int_fields.items():
-                if csv_col in df.columns and pd.notna(row.get(csv_col)):
-                    try:
-                        metadata[meta_key] = int(float(row[csv_col]))
-                    except (ValueError, TypeError):
-                        metadata[meta_key] = str(row[csv_col])
-
-            # Premium: almacenar TODAS las columnas extra
-            if is_premium:
-                for col in df.columns:
-                    if col.lower() in ["city", "country", "region", "tier"]:
-                        continue
-                    val = row.get(col)
-                    if pd.notna(val) and str(val).strip():
-                        metadata[col] = str(val)
-
-            documents.append(text)
-            metadatas.append(metadata)
-            ids.append(f"{source_file}_{idx}")
-
-        # Upsert en batches
-        batch_size = 50
-        total_added = 0
-        for i in range(0, len(documents), batch_size):
-            end = min(i + batch_size, len(documents))
-            try:
-                self.collection.upsert(
-                    documents=documents[i:end],
-                    metadatas=metadatas[i:end],
-                    ids=ids[i:end],
-                )
-                total_added += (end - i)
-            except Exception as e:
-                print(f"  ❌ Error en batch {i // batch_size + 1}: {e}")
+        chunk_rows = chunk_rows or self.ingest_chunk_rows
+        print(f"📄 Procesando '{source_file}' en streaming (chunks de {chunk_rows} filas)...")
 
-        print(f"  ✅ Ingestados {total_added} documentos de {source_file}")
-        return total_added
+        reports = []
+        created, previous = [], []
+        try:
+            for documents, metadatas, ids in iter_document_chunks(fileobj, source_file, chunk_rows=chunk_rows):
+                if rollback_on_error:
+                    # Solo lo que esta subida toca: ids nuevos y versión anterior de los existentes
+                    existing = self.collection.get(ids=ids, include=["embeddings", "documents", "metadatas"])
+                    known = set(existing["ids"])
+                    created.extend(doc_id for doc_id in ids if doc_id not in known)
+                    if known:
+                        previous.append(existing)
+                first_batch = sum(len(r["batches"]) for r in reports) + 1
+                reports.append(self._embed_and_upsert(documents, metadatas, ids, first_batch=first_batch))
+        except BaseException:
+            if rollback_on_error:
+                self._rollback_stream(source_file, created, previous)
+            raise
+        finally:
+            report = merge_reports(reports)
+            self._finish_ingest(source_file, report)
+
+        return report if with_report else report["added"]
+
+    def _rollback_stream(self, source_file: str, created: List[str], previous: List[Dict]):
+        """Undo an unfinished ingest_stream(): delete the ids it created, restore the ones it overwrote."""
+        if created:
+            self._delete_ids(created)
+        for existing in previous:
+            self._write_batch(existing["ids"], existing["embeddings"], existing["documents"], existing["metadatas"])
+        restored = sum(len(existing["ids"]) for existing in previous)
+        print(f"↩️ Subida de {source_file} revertida: {len(created)} documentos nuevos eliminados, "
+              f"{restored} restaurados")
+
+    def _delete_ids(self, ids: List[str]):
+        self.collection.delete(ids=ids)
+        if self.vector_index is not None:
+            self.vector_index.remove(ids)
+
+    def delete_source(self, source_file: str) -> int:
+        """Delete every document ingested from `source_file`."""
+        self.initialize()
+        if not self.initialized or not self.collection:
+            return 0
+        ids = self.collection.get(where={"source": source_file}, include=[])["ids"]
+        if ids:
+            self._delete_ids(ids)
+            self.version += 1
+            self.refresh_features()
+            print(f"🗑️ Eliminados {len(ids)} documentos de {source_file}")
+        return len(ids)
 
     # ── Ingesta desde CSV path (compatibilidad) ──
     def ingest_csv(self, csv_path: str) -> int:
         """Read CSV and ingest into ChromaDB."""
-        df = pd.read_csv(csv_path)
+        import pandas as pd
+
+        with INGEST_SECONDS.time("parse"):
+            df = pd.read_csv(csv_path)
         filename = os.path.basename(csv_path)
         return self.ingest_dataframe(df, source_file=filename)
 
+    # ── Embedding de consultas (con caché) ───────
+    def embed_query(self, query: str) -> List[float]:
+        """Return the query embedding, from the cache when possible."""
+        return self.embed_queries([query])[0]
+
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries: cache hits first, then ONE embedding call for the misses."""
+        self.initialize()
+        embeddings = [self.embedding_cache.get(self.embedding_model, q) for q in queries]
+        missing = {}
+        for i, emb in enumerate(embeddings):
+            if emb is None:
+                missing.setdefault(normalize_query(queries[i]), []).append(i)
+
+        if missing:
+            EMBEDDING_CALLS.inc("query")
+            texts = [queries[positions[0]] for positions in missing.values()]
+            for text, positions, embedding in zip(texts, missing.values(), self.embedding_function(texts)):
+                self.embedding_cache.put(self.embedding_model, text, embedding)
+                # Misma precisión (float32) que un hit, para resultados deterministas
+                embedding = np.asarray(embedding, dtype=np.float32).tolist()
+                for i in positions:
+                    embeddings[i] = embedding
+        return embeddings
+
     # ── Búsqueda semántica ────────────────────────
-    def search(self, query: str, n_results: int = 15, tier: str = None) -> list:
-        """Semantic search against ChromaDB."""
-        if not self.initialized or not self.collection:
+    def search(self, query: str, n_results: int = 15, tier: str = None, where: Optional[Dict] = None) -> list:
+        """Semantic search against ChromaDB. `where` is a compiled filter (see filters.compile_filters)."""
+        return self.search_many([query], n_results=n_results, tier=tier, where=where)[0]
+
+    def search_many(self, queries: List[str], n_results: int = 15, tier: str = None,
+                    where: Optional[Dict] = None) -> List[list]:
+        """
+        Hybrid search for N queries, sharing one embedding request: high-confidence
+        lexical queries are ranked by the BM25 index alone (no vector query); the
+        rest share one vector query, fused with BM25 by reciprocal rank fusion.
+        """
+        if not queries:
             return []
+        self.initialize()
+        if not self.initialized or not self.collection:
+            return [[] for _ in queries]
 
         try:
-            count = self.collection.count()
+            if self.vector_index is not None:
+                source, count = self.vector_index, len(self.vector_index)
+            else:
+                source, count = self.collection, self.collection.count()
             if count == 0:
-                return []
+                return [[] for _ in queries]
 
+            # Filtrar por tier si se especifica
+            if tier:
+                where = {"$and": [{"tier": tier}, where]} if where else {"tier": tier}
+
+            # Con filtro: contar candidatos en el índice de bitmaps antes de embeber;
+            # si ninguno cumple no hace falta ni embedding ni consulta vectorial
+            if where:
+                if self.vector_index is not None:
+                    count = int(self.vector_index.where_mask(where).sum())
+                else:
+                    count = self.metadata_index.count(where)
+                if count == 0:
+                    return [[] for _ in queries]
+
+            n_results = min(n_results, count)
+            lexical = self._lexical_index()
+            mask = self.metadata_index.mask(where) if lexical is not None and where else None
+
+            # Camino léxico: consultas de alta confianza (nombre exacto, términos muy
+            # selectivos) van primero; si BM25 llena el top-k, sin consulta vectorial
+            lexical_rows: Dict[int, np.ndarray] = {}
+            exact_rows: Dict[int, np.ndarray] = {}
+            if lexical is not None and self.lexical_fast_path:
+                with SEARCH_SECONDS.time("lexical"), span("lexical"):
+                    for q, query in enumerate(queries):
+                        exact = lexical.exact_match(query, n_results, mask)
+                        if exact is None:
+                            continue
+                        rows, _ = lexical.search(query, n_results, mask, first=exact)
+                        if len(rows) >= n_results:
+                            lexical_rows[q] = rows
+                        else:
+                            exact_rows[q] = exact
+            pending = [q for q in range(len(queries)) if q not in lexical_rows]
+
+            # Camino léxico sin embedding: base_score coseno solo si la consulta ya está
+            # en la caché de embeddings; si no, el BM25 relativo (ver _bm25_results)
+            outputs: List[Optional[list]] = [None] * len(queries)
+            for q, rows in lexical_rows.items():
+                ids = [lexical.ids[r] for r in rows]
+                cached = self.embedding_cache.get(self.embedding_model, queries[q])
+                if cached is not None:
+                    outputs[q] = self._lexical_results(ids, cached)
+                else:
+                    outputs[q] = self._bm25_results(ids, lexical.relative_scores(queries[q], rows))
+            if lexical_rows:
+                SEARCH_PATHS.inc("lexical", amount=len(lexical_rows))
+            if not pending:
+                return outputs
+
+            # Un único embedding para las consultas que sí van al índice vectorial
+            with SEARCH_SECONDS.time("embed"), span("embed"):
+                query_embeddings = self.embed_queries([queries[q] for q in pending])
             kwargs = {
-                "query_texts": [query],
-                "n_results": min(n_results, count),
+                "query_embeddings": query_embeddings,
+                "n_results": n_results,
                 "include": ["documents", "metadatas", "distances"],
             }
-
-            # Filtrar por tier si se especifica
-            if tier:
-                kwargs["where"] = {"tier": tier}
-
-            results = self.collection.query(**kwargs)
-
-            output = []
-            if results and results["ids"] and results["ids"][0]:
-                for i in range(len(results["ids"][0])):
-                    distance = results["distances"][0][i] if results["distances"] else 1.0
-                    output.append({
-                        "id": results["ids"][0][i],
-                        "document": results["documents"][0][i] if results["documents"] else "",
-                        "metadata": results["metadatas"][0][i] if results["metadatas"] else {},
-                        "distance": distance,
-                        "base_score": round(1 - distance, 4),
-                    })
-            return output
+            if where:
+                kwargs["where"] = where
+
+            with SEARCH_SECONDS.time("vector_query"), span("vector_query"):
+                results = source.query(**kwargs)
+
+            started = time.perf_counter()
+            for j, q in enumerate(pending):
+                output = []
+                if results and results["ids"] and results["ids"][j]:
+                    for i in range(len(results["ids"][j])):
+                        distance = results["distances"][j][i] if results["distances"] else 1.0
+                        output.append({
+                            "id": results["ids"][j][i],
+                            "document": results["documents"][j][i] if results["documents"] else "",
+                            "metadata": results["metadatas"][j][i] if results["metadatas"] else {},
+                            "distance": distance,
+                            "base_score": round(1 - distance, 4),
+                        })
+                if lexical is not None:
+                    with span("fusion"):
+                        exact = exact_rows.get(q)
+                        rows, _ = lexical.search(queries[q], n_results, mask, first=exact)
+                        lexical_ids = [lexical.ids[r] for r in rows]
+                        pinned = lexical_ids[:len(exact)] if exact is not None else []
+                        output = self._fuse(output, lexical_ids, query_embeddings[j], n_results, pinned)
+                outputs[q] = output
+            SEARCH_PATHS.inc("hybrid" if lexical is not None else "vector", amount=len(pending))
+            SEARCH_SECONDS.observe(time.perf_counter() - started, "results")
+            return outputs
 
         except Exception as e:
+            ERRORS.inc("search")
             print(f"❌ Error en search: {e}")
-            return []
+            return [[] for _ in queries]
+
+    # ── Búsqueda léxica (BM25) y fusión ───────────
+    def _lexical_index(self) -> Optional[BM25Index]:
+        """The BM25 index if hybrid search is on and it matches the filter bitmaps (same refresh)."""
+        index = self.bm25_index
+        if not self.hybrid_search or not len(index) or len(index) != len(self.metadata_index):
+            return None
+        return index
+
+    def _fetch(self, ids: List[str], include: List[str]) -> Dict[str, Dict]:
+        """id -> {document, metadata[, embedding]} for the given ids (Chroma get, no embedding call)."""
+        data = self.collection.get(ids=ids, include=include)
+        embeddings = data.get("embeddings") if "embeddings" in include else None
+        return {
+            doc_id: {
+                "document": data["documents"][i] if data["documents"] else "",
+                "metadata": data["metadatas"][i] if data["metadatas"] else {},
+                "embedding": embeddings[i] if embeddings is not None else None,
+            }
+            for i, doc_id in enumerate(data["ids"])
+        }
+
+    def _lexical_results(self, ids: List[str], query_embedding) -> list:
+        """Search results for BM25-ranked ids, in that order, with their real cosine base_score."""
+        by_id = self._scored(ids, query_embedding)
+        return [by_id[doc_id] for doc_id in ids if doc_id in by_id]
+
+    def _bm25_results(self, ids: List[str], relative: np.ndarray) -> list:
+        """
+        Search results for BM25-ranked ids without a query vector: base_score is the
+        BM25 score relative to the best hit, scaled so the best hit gets
+        LEXICAL_BASE_SCORE (the neutral base score of rank_cities).
+        """
+        docs = self._fetch(ids, ["documents", "metadatas"])
+        results = []
+        for doc_id, rel in zip(ids, np.asarray(relative, dtype=np.float64).tolist()):
+            doc = docs.get(doc_id)
+            if doc is None:
+                continue
+            base_score = round(LEXICAL_BASE_SCORE * rel, 4)
+            results.append({"id": doc_id, "document": doc["document"], "metadata": doc["metadata"],
+                            "distance": round(1 - base_score, 4), "base_score": base_score})
+        return results
+
+    def _scored(self, ids: List[str], query_embedding) -> Dict[str, Dict]:
+        """id -> search result for `ids`, distance = cosine against their stored embeddings."""
+        query = np.asarray(query_embedding, dtype=np.float64)
+        query_norm = np.linalg.norm(query) or 1.0
+        scored = {}
+        for doc_id, doc in self._fetch(ids, ["documents", "metadatas", "embeddings"]).items():
+            embedding = np.asarray(doc["embedding"], dtype=np.float64)
+            distance = float(1 - embedding @ query / ((np.linalg.norm(embedding) or 1.0) * query_norm))
+            scored[doc_id] = {"id": doc_id, "document": doc["document"], "metadata": doc["metadata"],
+                              "distance": distance, "base_score": round(1 - distance, 4)}
+        return scored
+
+    def _fuse(self, vector_results: list, lexical_ids: List[str], query_embedding, n_results: int,
+              pinned: List[str] = ()) -> list:
+        """
+        Reciprocal rank fusion (1 / (rrf_k + rank)) of the vector and BM25 rankings,
+        after the `pinned` ids (exact lexical matches). Documents found only by BM25
+        get their real cosine distance from the stored embedding, so base_score
+        keeps the same meaning for every result.
+        """
+        fused: Dict[str, float] = {}
+        for rank, r in enumerate(vector_results):
+            fused[r["id"]] = 1.0 / (self.rrf_k + rank + 1)
+        for rank, doc_id in enumerate(lexical_ids):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        top = list(pinned) + [doc_id for doc_id in sorted(fused, key=fused.get, reverse=True) if doc_id not in pinned]
+        top = top[:n_results]
+
+        by_id = {r["id"]: r for r in vector_results}
+        missing = [doc_id for doc_id in top if doc_id not in by_id]
+        if missing:
+            by_id.update(self._scored(missing, query_embedding))
+        return [by_id[doc_id] for doc_id in top if doc_id in by_id]
+
+    # ── API asíncrona (pool dedicado) ─────────────
+    async def asearch(self, query: str, n_results: int = 15, tier: str = None,
+                      where: Optional[Dict] = None) -> list:
+        """Non-blocking search(): runs on the bounded Chroma executor."""
+        return await self.executor.run(self.search, query, n_results=n_results, tier=tier, where=where)
+
+    async def asearch_many(self, queries: List[str], n_results: int = 15, tier: str = None,
+                           where: Optional[Dict] = None) -> List[list]:
+        """Non-blocking search_many()."""
+        return await self.executor.run(self.search_many, queries, n_results=n_results, tier=tier, where=where)
+
+    async def apremium_grouped(self, query: str, n_cities: int = 10) -> List[Dict[str, Any]]:
+        """Non-blocking premium_grouped()."""
+        return await self.executor.run(self.premium_grouped, query, n_cities)
+
+    async def acity_centroids(self) -> CityCentroids:
+        """Non-blocking city_centroids() (no executor hop once built for this version)."""
+        centroids = self._centroids
+        if centroids is not None and centroids.version == self.version:
+            return centroids
+        return await self.executor.run(self.city_centroids)
+
+    async def aingest(self, df: "pd.DataFrame", source_file: str) -> int:
+        """Non-blocking ingest_dataframe() (ingest executor)."""
+        return await self.ingest_executor.run(self.ingest_dataframe, df, source_file)
+
+    async def aingest_csv(self, csv_path: str) -> int:
+        """Non-blocking ingest_csv() (ingest executor)."""
+        return await self.ingest_executor.run(self.ingest_csv, csv_path)
+
+    async def aingest_stream(self, fileobj, source_file: str, chunk_rows: int = None, with_report: bool = False,
+                             rollback_on_error: bool = False):
+        """Non-blocking ingest_stream() (ingest executor: it may wait on the client for the whole upload)."""
+        return await self.ingest_executor.run(
+            self.ingest_stream, fileobj, source_file, chunk_rows, with_report, rollback_on_error
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.ingest_executor.shutdown(wait=False)
 
     # ── Búsqueda free (alias) ─────────────────────
     def similarity_search(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
@@ -256,8 +707,24 @@ class ChromaManager:
         """Search premium tier documents (visa/tax)."""
         return self.search(query, n_results=k, tier="premium")
 
+    def premium_grouped(self, query: str, n_cities: int = 10) -> List[Dict[str, Any]]:
+        """
+        Premium retrieval grouped by city: ONE vector query filtered by tier=premium,
+        sized so the top-k holds n_cities distinct cities, joined with the visa and
+        tax rows of each city from premium_index.
+        """
+        self.initialize()
+        index = self.premium_index
+        n_results = index.n_results_for(n_cities)
+        if n_results == 0:
+            return []
+        results = self.search(query, n_results=n_results, tier="premium")
+        with span("group"):
+            return index.group(results, n_cities)
+
     # ── Utilidades ────────────────────────────────
     def list_collections(self) -> List[str]:
+        self.initialize()
         try:
             collections = self.client.list_collections()
             return [col.name for col in collections]
@@ -266,10 +733,18 @@ class ChromaManager:
             return []
 
     def delete_collection(self):
+        self.initialize()
         try:
             self.client.delete_collection(self.collection_name)
             print(f"🗑️ Colección eliminada: {self.collection_name}")
             self.collection = None
             self.initialized = False
+            self.features = CityFeatureMatrix([], [])
+            self.metadata_index = MetadataBitmapIndex([])
+            self.premium_index = PremiumIndex([], [], [])
+            self.bm25_index = BM25Index([], [], [])
+            if self.vector_index is not None:
+                self.vector_index.clear()
+            self.version += 1
         except Exception as e:
             print(f"❌ Error deleting collection: {e}")
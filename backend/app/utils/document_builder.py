@@ -0,0 +1,153 @@
+"""
+DocumentBuilder — Construcción columnar de documentos para ChromaDB (Prototipo 4)
+Genera documents, metadatas e ids de un DataFrame completo trabajando columna a
+columna (sin iterrows). El resultado es idéntico byte a byte al del bucle fila
+a fila original de ChromaManager.ingest_dataframe (con el mapeo de columnas
+actual, ver benchmarks/bench_document_builder.py).
+"""
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+# Campos comunes para free: columna CSV -> clave de metadata
+COMMON_FIELDS = {
+    "Monthly_Budget_Single": "budget",
+    "Internet_Reliability_Score": "internet",
+    "Digital_Nomad_Visa": "visa",
+    "Summer_Temperature": "summer_temp",
+    "Winter_Temperature": "winter_temp",
+    "Vibe_Tags": "vibe_tags",
+    "Safety_Score": "safety",
+    "Nightlife_Score": "nightlife",
+    "Family_Friendly_Score": "family",
+    "Startup_Scene_Score": "startup",
+    "Coworking_Availability": "coworking",
+    "Expat_Community_Size": "expat_size",
+    "English_Proficiency_Score": "english",
+    "Outdoor_Activities_Score": "outdoor",
+    "Sunshine_Level": "sunshine",
+    "Visa_Score": "visa_score",
+    "Visa_Type": "visa_type",
+    "Visa_Duration": "visa_duration",
+    "Schengen": "schengen",
+}
+
+# Campos numéricos (filtrables por rango, ver filters.NUMERIC_FIELDS). Cada CSV
+# aporta los suyos: budget/coworking/airbnb/population en city_general_free,
+# visa_income_req en city_visa_premium
+INT_FIELDS = {
+    "Monthly_Budget_Single_EUR": "budget_eur",
+    "Coworking_Monthly_EUR": "coworking_eur",
+    "Airbnb_Avg_Monthly_EUR": "airbnb_eur",
+    "Current_Population": "population",
+    "Visa_Monthly_Income_Requirement_EUR": "visa_income_req",
+}
+
+# Versión del mapeo CSV -> metadata: al cambiarla, auto_ingest reingesta los
+# ficheros registrados con otra versión (2: columnas reales de population y
+# visa_income_req)
+METADATA_VERSION = 2
+
+# Columnas que no se copian como metadata extra en los CSV premium
+_PREMIUM_SKIP = ("city", "country", "region", "tier")
+
+
+def file_tier(source_file: str) -> Tuple[bool, bool]:
+    """(is_visa_premium, is_tax_premium) detected from the file name."""
+    name = source_file.lower()
+    return "visa_premium" in name, "tax_premium" in name
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def build_documents(df: pd.DataFrame, source_file: str) -> Tuple[List[str], List[Dict], List[str]]:
+    """
+    Build (documents, metadatas, ids) for every row of `df`.
+    Values are read from df.to_numpy(), the same per-row values iterrows() yields.
+    """
+    is_visa_premium, is_tax_premium = file_tier(source_file)
+    is_premium = is_visa_premium or is_tax_premium
+
+    n = len(df)
+    columns = list(df.columns)
+    values = df.to_numpy()
+    col_pos = {col: j for j, col in enumerate(columns)}
+
+    col_values = [values[:, j].tolist() if values.dtype == object else list(values[:, j]) for j in range(len(columns))]
+    notna = [pd.notna(values[:, j]).tolist() for j in range(len(columns))]
+    as_str = [None] * len(columns)
+
+    def strs(j):
+        if as_str[j] is None:
+            as_str[j] = [str(v) for v in col_values[j]]
+        return as_str[j]
+
+    # Texto: "col: valor" para cada celda no nula y no vacía
+    text_columns = []
+    for j, col in enumerate(columns):
+        text_columns.append([
+            f"{col}: {v}" if ok and s.strip() else None
+            for v, s, ok in zip(col_values[j], strs(j), notna[j])
+        ])
+    documents = [" | ".join(filter(None, parts)) for parts in zip(*text_columns)] if columns else [""] * n
+
+    def column_or(primary: str, fallback: str):
+        for name in (primary, fallback):
+            if name in col_pos:
+                return strs(col_pos[name])
+        return [""] * n
+
+    # Tier y data_type
+    if is_visa_premium:
+        data_types, tiers = ["Visa"] * n, ["premium"] * n
+    elif is_tax_premium:
+        data_types, tiers = ["Tax"] * n, ["premium"] * n
+    else:
+        data_types = strs(col_pos["data_type"]) if "data_type" in col_pos else ["General"] * n
+        tiers = strs(col_pos["tier"]) if "tier" in col_pos else ["free"] * n
+
+    base_columns = [
+        ("source", [source_file] * n),
+        ("row_index", [str(idx) for idx in df.index]),
+        ("city", column_or("city", "City")),
+        ("country", column_or("Country", "country")),
+        ("region", column_or("Region", "region")),
+        ("data_type", data_types),
+        ("tier", tiers),
+    ]
+
+    # Columnas opcionales en el mismo orden en que el bucle original las asigna;
+    # None marca "no asignar" para esa fila.
+    optional_columns = []
+    for csv_col, meta_key in COMMON_FIELDS.items():
+        if csv_col in col_pos:
+            j = col_pos[csv_col]
+            optional_columns.append((meta_key, [s if ok else None for s, ok in zip(strs(j), notna[j])]))
+    for csv_col, meta_key in INT_FIELDS.items():
+        if csv_col in col_pos:
+            j = col_pos[csv_col]
+            optional_columns.append((meta_key, [_to_int(v) if ok else None for v, ok in zip(col_values[j], notna[j])]))
+    if is_premium:
+        for j, col in enumerate(columns):
+            if col.lower() in _PREMIUM_SKIP:
+                continue
+            optional_columns.append((col, [s if ok and s.strip() else None for s, ok in zip(strs(j), notna[j])]))
+
+    base_keys = [key for key, _ in base_columns]
+    opt_keys = [key for key, _ in optional_columns]
+    metadatas = []
+    for base_vals, opt_vals in zip(zip(*[vals for _, vals in base_columns]),
+                                   zip(*[vals for _, vals in optional_columns]) if optional_columns else [()] * n):
+        metadata = dict(zip(base_keys, base_vals))
+        for key, val in zip(opt_keys, opt_vals):
+            if val is not None:
+                metadata[key] = val
+        metadatas.append(metadata)
+
+    ids = [f"{source_file}_{idx}" for idx in df.index]
+    return documents, metadatas, ids
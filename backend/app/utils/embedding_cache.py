@@ -0,0 +1,117 @@
+"""
+EmbeddingCache — Caché persistente de embeddings de consultas (Prototipo 4)
+LRU + TTL acotado en memoria, respaldado por SQLite bajo persist_directory
+para que sobreviva a reinicios. Clave: (modelo de embedding, texto normalizado).
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used as cache key: trimmed, lowercased, single-spaced."""
+    return " ".join(text.lower().split())
+
+
+class QueryEmbeddingCache:
+    def __init__(self, path: str, max_entries: int = 1024, ttl_seconds: float = 7 * 24 * 3600):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (created_at, vector)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._open()
+
+    # ── Persistencia ──────────────────────────────
+    def _open(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " model TEXT NOT NULL, query TEXT NOT NULL, embedding BLOB NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (model, query))"
+            )
+            self._conn.commit()
+            self._load()
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache sin persistencia ({self.path}): {e}")
+            self._conn = None
+
+    def _load(self):
+        cutoff = time.time() - self.ttl_seconds
+        self._conn.execute("DELETE FROM query_embeddings WHERE created_at < ?", (cutoff,))
+        rows = self._conn.execute(
+            "SELECT model, query, embedding, created_at FROM query_embeddings"
+            " ORDER BY created_at DESC LIMIT ?", (self.max_entries,)
+        ).fetchall()
+        # Los hits no se escriben a disco: al recargar, el orden LRU parte de created_at
+        for model, query, blob, created_at in reversed(rows):
+            self._entries[(model, query)] = (created_at, np.frombuffer(blob, dtype=np.float32))
+        self._conn.commit()
+
+    def _persist(self, sql: str, params: tuple):
+        if self._conn is None:
+            return
+        try:
+            self._conn.execute(sql, params)
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Error persistiendo embedding cache: {e}")
+
+    # ── API ───────────────────────────────────────
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        key = (model, normalize_query(text))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self._persist("DELETE FROM query_embeddings WHERE model = ? AND query = ?", key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1].tolist()
+
+    def put(self, model: str, text: str, embedding) -> None:
+        key = (model, normalize_query(text))
+        vector = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            self._entries[key] = (now, vector)
+            self._entries.move_to_end(key)
+            self._persist(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, embedding, created_at)"
+                " VALUES (?, ?, ?, ?)", (*key, vector.tobytes(), now)
+            )
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._persist("DELETE FROM query_embeddings WHERE model = ? AND query = ?", old_key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._persist("DELETE FROM query_embeddings", ())
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,168 @@
+"""
+EmbeddingPipeline — Embedding concurrente para ingesta masiva (Prototipo 4)
+Agrupa documentos en batches por nº estimado de tokens (no por filas), los
+embebe en paralelo con un nº de workers configurable, reduce la concurrencia y
+reintenta con backoff exponencial ante 429 (rate limit), y escribe en Chroma con
+upsert(embeddings=...). Cada batch se reporta por separado.
+"""
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for OpenAI embedding models (~4 chars per token)."""
+    return len(text) // 4 + 1
+
+
+def token_batches(documents: List[str], max_tokens: int = 20000, max_items: int = 256) -> List[Tuple[int, int, int]]:
+    """Split documents into (start, end, tokens) ranges under `max_tokens` / `max_items`."""
+    batches = []
+    start, tokens = 0, 0
+    for i, doc in enumerate(documents):
+        t = estimate_tokens(doc)
+        if i > start and (tokens + t > max_tokens or i - start >= max_items):
+            batches.append((start, i, tokens))
+            start, tokens = i, 0
+        tokens += t
+    if start < len(documents):
+        batches.append((start, len(documents), tokens))
+    return batches
+
+
+def is_rate_limit(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429 or type(error).__name__ == "RateLimitError" or "429" in str(error) \
+        or "rate limit" in str(error).lower()
+
+
+def is_retryable(error: Exception) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    return is_rate_limit(error) or (isinstance(status, int) and status >= 500) \
+        or isinstance(error, (ConnectionError, TimeoutError))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header, if the error carries an HTTP response."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers and headers.get("retry-after") else None
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: halves on a 429, grows by one after `limit` successes."""
+
+    def __init__(self, max_limit: int):
+        self.max_limit = max(max_limit, 1)
+        self.limit = self.max_limit
+        self.active = 0
+        self.rate_limited = 0
+        self._successes = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.active >= self.limit:
+                self._cond.wait()
+            self.active += 1
+
+    def release(self, rate_limited: bool = False):
+        with self._cond:
+            self.active -= 1
+            if rate_limited:
+                self.rate_limited += 1
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            else:
+                self._successes += 1
+                if self._successes >= self.limit and self.limit < self.max_limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._cond.notify_all()
+
+
+class EmbeddingPipeline:
+    def __init__(self, embedding_function: Callable[[List[str]], List], workers: int = 4,
+                 max_batch_tokens: int = 20000, max_batch_items: int = 256,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.embedding_function = embedding_function
+        self.workers = max(workers, 1)
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _embed_with_backoff(self, texts: List[str], limiter: AdaptiveLimiter, result: Dict) -> List:
+        attempt = 0
+        while True:
+            attempt += 1
+            result["attempts"] = attempt
+            limiter.acquire()
+            try:
+                embeddings = self.embedding_function(texts)
+            except Exception as e:
+                limited = is_rate_limit(e)
+                limiter.release(rate_limited=limited)
+                if attempt > self.max_retries or not is_retryable(e):
+                    raise
+                delay = retry_after(e) or min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                continue
+            limiter.release()
+            return embeddings
+
+    def run(self, documents: List[str], metadatas: List[Dict], ids: List[str],
+            write: Callable[[List[str], List, List[str], List[Dict]], None], first_batch: int = 1) -> Dict:
+        """
+        Embed all documents concurrently and hand each batch to
+        `write(ids, embeddings, documents, metadatas)` (serialized).
+        Returns a report with one entry per batch.
+        """
+        started = time.perf_counter()
+        limiter = AdaptiveLimiter(self.workers)
+        write_lock = threading.Lock()
+        batches = token_batches(documents, self.max_batch_tokens, self.max_batch_items)
+
+        def process(n: int, start: int, end: int, tokens: int) -> Dict:
+            result = {"batch": first_batch + n, "start": start, "end": end, "size": end - start,
+                      "tokens_est": tokens, "ok": False, "attempts": 0, "error": None}
+            t0 = time.perf_counter()
+            try:
+                embeddings = self._embed_with_backoff(documents[start:end], limiter, result)
+                with write_lock:
+                    write(ids[start:end], embeddings, documents[start:end], metadatas[start:end])
+                result["ok"] = True
+            except Exception as e:
+                result["error"] = f"{type(e).__name__}: {e}"
+            result["seconds"] = round(time.perf_counter() - t0, 4)
+            return result
+
+        if len(batches) <= 1:
+            results = [process(n, *b) for n, b in enumerate(batches)]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(batches)), thread_name_prefix="embed") as pool:
+                results = list(pool.map(lambda nb: process(nb[0], *nb[1]), enumerate(batches)))
+
+        return {
+            "added": sum(r["size"] for r in results if r["ok"]),
+            "failed": sum(r["size"] for r in results if not r["ok"]),
+            "batches": results,
+            "rate_limited": limiter.rate_limited,
+            "seconds": round(time.perf_counter() - started, 4),
+        }
+
+
+def merge_reports(reports: List[Dict]) -> Dict:
+    """Combine the reports of several pipeline runs (e.g. streaming chunks)."""
+    return {
+        "added": sum(r["added"] for r in reports),
+        "failed": sum(r["failed"] for r in reports),
+        "batches": [b for r in reports for b in r["batches"]],
+        "rate_limited": sum(r["rate_limited"] for r in reports),
+        "seconds": round(sum(r["seconds"] for r in reports), 4),
+    }
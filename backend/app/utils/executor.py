@@ -0,0 +1,111 @@
+"""
+BoundedExecutor — Pool de hilos dedicado para trabajo bloqueante (Prototipo 4)
+Ejecuta llamadas síncronas (ChromaDB, embeddings HTTP) fuera del event loop,
+con un límite de concurrencia configurable y métricas de profundidad de cola y
+latencia. Con `max_pending`, rechaza trabajo nuevo (ExecutorSaturated) en vez
+de encolarlo sin límite.
+"""
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+
+class ExecutorSaturated(RuntimeError):
+    """Raised by BoundedExecutor.run when `max_pending` calls are already queued or running."""
+
+    def __init__(self, name: str, pending: int, retry_after: float):
+        super().__init__(f"Executor '{name}' saturated ({pending} pending)")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    def __init__(self, max_workers: int = 4, max_concurrency: int = 32, name: str = "worker",
+                 max_pending: Optional[int] = None, processes: bool = False):
+        self.max_workers = max_workers
+        self.max_concurrency = max(max_concurrency, 1)
+        # None = sin límite (espera en el semáforo); N = fail-fast a partir de N pendientes
+        self.max_pending = max_pending
+        self.name = name
+        # processes=True para trabajo CPU-bound que no libera el GIL (fn y args deben ser picklables)
+        if processes:
+            self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.processes = processes
+        self._semaphore = None
+        self._loop = None
+        self.waiting = 0     # esperando un hueco de concurrencia
+        self.in_flight = 0   # enviados al pool (en cola del pool o ejecutándose)
+        self.completed = 0
+        self.rejected = 0
+        self.max_waiting = 0
+        self._latencies = deque(maxlen=1024)  # segundos en el pool, últimas llamadas
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        # asyncio.Semaphore queda ligado a un loop; se recrea si cambia (tests, reinicios)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, fn, *args, **kwargs):
+        """Run `fn(*args, **kwargs)` on the pool without blocking the event loop."""
+        # Los contadores solo se modifican desde el event loop
+        semaphore = self._get_semaphore()
+        pending = self.waiting + self.in_flight
+        if self.max_pending is not None and pending >= self.max_pending:
+            self.rejected += 1
+            raise ExecutorSaturated(self.name, pending, self.retry_after())
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            if not self.processes:
+                # Como asyncio.to_thread: el hilo ve los ContextVar de la petición (p. ej. request_trace)
+                call = functools.partial(contextvars.copy_context().run, call)
+            return await loop.run_in_executor(self._pool, call)
+        finally:
+            self._latencies.append(time.perf_counter() - started)
+            self.in_flight -= 1
+            self.completed += 1
+            semaphore.release()
+
+    def retry_after(self) -> float:
+        """Rough seconds until a slot frees up: pending calls x mean latency / workers."""
+        mean = sum(self._latencies) / len(self._latencies) if self._latencies else 0.0
+        return (self.waiting + self.in_flight) * mean / max(self.max_workers, 1)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        latencies = np.asarray(self._latencies) * 1000
+        return {
+            "max_workers": self.max_workers,
+            "max_concurrency": self.max_concurrency,
+            "max_pending": self.max_pending,
+            "processes": self.processes,
+            "queue_depth": self.waiting + max(self.in_flight - self.max_workers, 0),
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "max_waiting": self.max_waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)), 3) if len(latencies) else None,
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)), 3) if len(latencies) else None,
+        }
@@ -0,0 +1,221 @@
+"""
+Filters — Filtros estructurados sobre metadata (Prototipo 4)
+Compila el campo `filters` de /api/v1/query a cláusulas `where` de Chroma
+($lte, $gte, $in, $and...) y las evalúa de forma vectorizada con un índice de
+bitmaps en memoria, para acotar los candidatos antes de la búsqueda vectorial.
+"""
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Metadata numérica que escribe ingest_dataframe (document_builder.INT_FIELDS,
+# cada campo sale de un CSV concreto)
+NUMERIC_FIELDS = ("budget_eur", "coworking_eur", "airbnb_eur", "visa_income_req", "population")
+
+# Metadata categórica filtrable (valores str exactos)
+CATEGORICAL_FIELDS = (
+    "city", "country", "region", "tier", "data_type", "source",
+    "visa", "budget", "internet", "summer_temp", "winter_temp", "safety",
+    "nightlife", "family", "startup", "coworking", "expat_size", "english",
+    "outdoor", "sunshine", "schengen",
+)
+
+_RANGE_OPS = {"lt": "$lt", "lte": "$lte", "gt": "$gt", "gte": "$gte", "eq": "$eq", "ne": "$ne"}
+
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a > b,
+    "$gte": lambda a, b: a >= b,
+    "$lt": lambda a, b: a < b,
+    "$lte": lambda a, b: a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+class FilterError(ValueError):
+    """Invalid `filters` payload."""
+
+
+# ── Compilación a where de Chroma ─────────────────
+def compile_filters(filters: Optional[Dict[str, Any]], tier: Optional[str] = None) -> Optional[Dict]:
+    """
+    Compile user filters to a Chroma `where` clause, e.g.
+    {"budget_eur": {"lte": 1500}, "region": ["Southern Europe"]}
+    -> {"$and": [{"budget_eur": {"$lte": 1500}}, {"region": {"$in": [...]}}]}
+    Every clause applies to the same document, and each document is one row of
+    one CSV: combine fields that CSV has (budget_eur, coworking_eur, airbnb_eur,
+    population... in city_general_free; visa, visa_income_req in
+    city_visa_premium). {"visa": "Yes", "budget_eur": ...} matches nothing.
+    """
+    clauses: List[Dict] = []
+    if tier:
+        clauses.append({"tier": tier})
+
+    for field, spec in (filters or {}).items():
+        if field in NUMERIC_FIELDS:
+            if isinstance(spec, bool):
+                raise FilterError(f"'{field}' expects a number or a range object")
+            if isinstance(spec, (int, float)):
+                clauses.append({field: spec})
+                continue
+            if not isinstance(spec, dict) or not spec:
+                raise FilterError(f"'{field}' expects a number or an object like {{\"lte\": 1500}}")
+            for op, value in spec.items():
+                if op not in _RANGE_OPS:
+                    raise FilterError(f"Unknown operator '{op}' for '{field}' (use {', '.join(_RANGE_OPS)})")
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    raise FilterError(f"'{field}.{op}' must be a number")
+                clauses.append({field: {_RANGE_OPS[op]: value}})
+        elif field in CATEGORICAL_FIELDS:
+            if isinstance(spec, str):
+                clauses.append({field: spec})
+            elif isinstance(spec, list) and spec and all(isinstance(v, str) for v in spec):
+                clauses.append({field: {"$in": spec}} if len(spec) > 1 else {field: spec[0]})
+            else:
+                raise FilterError(f"'{field}' expects a string or a non-empty list of strings")
+        else:
+            raise FilterError(f"Unknown filter field '{field}'")
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+# ── Evaluación escalar (referencia) ───────────────
+def matches_where(metadata: Dict, where: Optional[Dict]) -> bool:
+    """Evaluate a Chroma-style `where` filter against one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches_where(metadata, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(matches_where(metadata, c) for c in cond):
+                return False
+        elif key not in metadata:
+            # Como Chroma: un documento sin la clave no cumple ningún operador
+            return False
+        elif isinstance(cond, dict):
+            value = metadata[key]
+            for op, operand in cond.items():
+                try:
+                    if not _OPS[op](value, operand):
+                        return False
+                except TypeError:
+                    # Tipos no comparables (p. ej. str vs int): no cumple
+                    return False
+        elif metadata[key] != cond:
+            return False
+    return True
+
+
+# ── Índice de bitmaps ─────────────────────────────
+class MetadataBitmapIndex:
+    """
+    One boolean bitmap per (categorical field, value) and one float column per
+    numeric field (NaN = missing / non numeric). `mask(where)` combines them
+    with vectorized ops; unknown fields fall back to matches_where.
+    """
+
+    def __init__(self, metadatas: Sequence[Dict]):
+        self.metadatas = list(metadatas)
+        self.size = len(self.metadatas)
+        self.bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        self.present: Dict[str, np.ndarray] = {}
+        self.numeric: Dict[str, np.ndarray] = {}
+        self._cache: Dict[str, np.ndarray] = {}
+
+        for field in CATEGORICAL_FIELDS:
+            values: Dict[Any, List[int]] = {}
+            present = np.zeros(self.size, dtype=bool)
+            for i, meta in enumerate(self.metadatas):
+                if field in meta:
+                    present[i] = True
+                    values.setdefault(meta[field], []).append(i)
+            bitmaps = {}
+            for value, rows in values.items():
+                bitmap = np.zeros(self.size, dtype=bool)
+                bitmap[rows] = True
+                bitmaps[value] = bitmap
+            self.bitmaps[field] = bitmaps
+            self.present[field] = present
+
+        for field in NUMERIC_FIELDS:
+            column = np.full(self.size, np.nan)
+            for i, meta in enumerate(self.metadatas):
+                value = meta.get(field)
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    column[i] = value
+            self.numeric[field] = column
+
+    def __len__(self):
+        return self.size
+
+    def mask(self, where: Optional[Dict]) -> np.ndarray:
+        """Boolean mask of documents matching `where` (cached per filter)."""
+        if not where:
+            return np.ones(self.size, dtype=bool)
+        key = json.dumps(where, sort_keys=True, default=str)
+        cached = self._cache.get(key)
+        if cached is None:
+            cached = self._eval(where)
+            if len(self._cache) >= 1024:
+                self._cache.clear()
+            self._cache[key] = cached
+        return cached
+
+    def count(self, where: Optional[Dict]) -> int:
+        return int(self.mask(where).sum())
+
+    def _eval(self, where: Dict) -> np.ndarray:
+        result = np.ones(self.size, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for c in cond:
+                    result &= self._eval(c)
+            elif key == "$or":
+                any_mask = np.zeros(self.size, dtype=bool)
+                for c in cond:
+                    any_mask |= self._eval(c)
+                result &= any_mask
+            else:
+                result &= self._eval_field(key, cond)
+        return result
+
+    def _eval_field(self, field: str, cond) -> np.ndarray:
+        ops = cond if isinstance(cond, dict) else {"$eq": cond}
+        result = np.ones(self.size, dtype=bool)
+
+        if field in self.numeric and all(
+            isinstance(v, (int, float)) and not isinstance(v, bool) for v in ops.values()
+        ):
+            column = self.numeric[field]
+            with np.errstate(invalid="ignore"):
+                for op, operand in ops.items():
+                    if op not in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+                        return self._fallback(field, cond)
+                    result &= ~np.isnan(column) & _OPS[op](column, operand)
+            return result
+
+        if field in self.bitmaps and all(op in ("$eq", "$ne", "$in", "$nin") for op in ops):
+            bitmaps, present = self.bitmaps[field], self.present[field]
+            empty = np.zeros(self.size, dtype=bool)
+            for op, operand in ops.items():
+                values = operand if op in ("$in", "$nin") else [operand]
+                hit = empty.copy()
+                for value in values:
+                    bitmap = bitmaps.get(value)
+                    if bitmap is not None:
+                        hit |= bitmap
+                result &= hit if op in ("$eq", "$in") else (present & ~hit)
+            return result
+
+        return self._fallback(field, cond)
+
+    def _fallback(self, field: str, cond) -> np.ndarray:
+        where = {field: cond}
+        return np.fromiter((matches_where(m, where) for m in self.metadatas), dtype=bool, count=self.size)
@@ -0,0 +1,81 @@
+"""
+IngestManifest — Registro persistente de CSVs ingestados (Prototipo 4)
+Guarda por fichero su hash de contenido (SHA-256), tamaño, mtime, modelo de
+embeddings, versión del mapeo de metadata, nº de documentos y estado
+("ingesting" / "complete" / "partial") en CHROMA_PERSIST_DIR/ingest_manifest.json.
+Al arrancar, un CSV sin cambios se detecta con un os.stat() y se salta sin
+leerlo ni embeberlo.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_fingerprint(path: str) -> Dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class IngestManifest:
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+        except FileNotFoundError:
+            self.entries = {}
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Manifest de ingesta ilegible ({e}) — se reconstruirá")
+            self.entries = {}
+
+    def save(self) -> None:
+        """Write atomically (tmp file + os.replace) so a crash never leaves a truncated manifest."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "files": self.entries}, f, indent=2, sort_keys=True)
+            os.replace(tmp, self.path)
+
+    def get(self, source_file: str) -> Optional[Dict]:
+        return self.entries.get(source_file)
+
+    def record(self, source_file: str, **fields) -> Dict:
+        """Update the entry for `source_file` and persist the manifest."""
+        entry = {**self.entries.get(source_file, {}), **fields, "updated_at": time.time()}
+        self.entries[source_file] = entry
+        self.save()
+        return entry
+
+    def remove(self, source_file: str) -> None:
+        if self.entries.pop(source_file, None) is not None:
+            self.save()
+
+    def clear(self) -> None:
+        self.entries = {}
+        self.save()
+
+    def is_unchanged(self, source_file: str, path: str, embedding_model: str, metadata_version: int) -> bool:
+        """O(1) check: complete entry with the same size, mtime, embedding model and metadata version."""
+        entry = self.entries.get(source_file)
+        if not entry or entry.get("status") != "complete" or entry.get("embedding_model") != embedding_model \
+                or entry.get("metadata_version", 1) != metadata_version:
+            return False
+        fp = file_fingerprint(path)
+        return entry.get("size") == fp["size"] and entry.get("mtime_ns") == fp["mtime_ns"]
@@ -1,21 +1,47 @@
-from openai import OpenAI
 import os
-from typing import List, Dict, Any
+import threading
+from collections import deque
+from typing import AsyncIterator, List, Dict, Any
 
-# Configurar cliente OpenAI
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+import numpy as np
 
-def generate_premium_advice(user_query: str, results: List[Dict[str, Any]]) -> str:
-    """
-    Genera una respuesta en lenguaje natural usando los resultados premium.
-    """
-    if not results:
-        return "No se encontraron datos premium para tu consulta."
+ADVICE_MODEL = "gpt-3.5-turbo"
+NO_RESULTS_ADVICE = "No se encontraron datos premium para tu consulta."
+ERROR_ADVICE = "Lo siento, no pude generar una respuesta en este momento."
+
+# Clientes OpenAI, creados en el primer uso (importar openai cuesta ~0.7 s).
+# OPENAI_BASE_URL (leído por el SDK) permite apuntar a un servidor compatible.
+_client = None
+_async_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        from openai import OpenAI
+        _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        from openai import AsyncOpenAI
+        _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _async_client
+
+
+def build_advice_messages(user_query: str, results: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Chat messages (system + prompt) with the top-3 results as context."""
     # Construir contexto con los 3 mejores resultados
     context = ""
     for i, res in enumerate(results[:3], 1):
-        meta = res.get("metadata", {})
+        # Registros agrupados por ciudad (premium_grouped): unir metadata de visado e impuestos
+        meta = {
+            **((res.get("tax") or {}).get("metadata") or {}),
+            **((res.get("visa") or {}).get("metadata") or {}),
+            **res.get("metadata", {}),
+        }
         context += f"\n--- Ciudad {i} ---\n"
         context += f"Ciudad: {meta.get('city', 'Desconocida')}, {meta.get('country', '')}\n"
         context += f"Visa nómada digital: {'Sí' if meta.get('Digital_Nomad_Visa') == 1 else 'No'}\n"
@@ -40,20 +66,89 @@ Aquí tienes información detallada de las ciudades más relevantes (ordenadas p
 
 Con base en estos datos, redacta una respuesta útil, clara y en español. Incluye comparaciones entre ciudades si es relevante, destaca los puntos fuertes y menciona requisitos importantes (ingresos, duración, zona Schengen). No inventes datos que no estén en la información proporcionada. Sé conciso pero informativo.
 """
+    return [
+        {"role": "system", "content": "Eres un asesor experto en visados y fiscalidad para nómadas digitales."},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def generate_premium_advice(user_query: str, results: List[Dict[str, Any]]) -> str:
+    """
+    Genera una respuesta en lenguaje natural usando los resultados premium.
+    """
+    if not results:
+        return NO_RESULTS_ADVICE
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Eres un asesor experto en visados y fiscalidad para nómadas digitales."},
-                {"role": "user", "content": prompt}
-            ],
+        response = get_client().chat.completions.create(
+            model=ADVICE_MODEL,
+            messages=build_advice_messages(user_query, results),
             temperature=0.7,
             max_tokens=500
         )
         return response.choices[0].message.content.strip()
     except Exception as e:
         print(f"❌ Error al generar respuesta LLM: {e}")
-        return "Lo siento, no pude generar una respuesta en este momento."
+        return ERROR_ADVICE
+
+
+async def stream_premium_advice(user_query: str, results: List[Dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    Async, streaming version of generate_premium_advice: yields text deltas as
+    the model produces them (never blocks the event loop). Errors propagate to
+    the caller, which decides what to send to the client.
+    """
+    if not results:
+        yield NO_RESULTS_ADVICE
+        return
+    stream = await get_async_client().chat.completions.create(
+        model=ADVICE_MODEL,
+        messages=build_advice_messages(user_query, results),
+        temperature=0.7,
+        max_tokens=500,
+        stream=True,
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+class AdviceStats:
+    """Time-to-first-token / total latency of streamed advice, misses vs cache hits."""
+
+    def __init__(self, window: int = 1024):
+        self.requests = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self._ttft = {True: deque(maxlen=window), False: deque(maxlen=window)}  # cached -> segundos
+        self._total = {True: deque(maxlen=window), False: deque(maxlen=window)}
+        self._lock = threading.Lock()
+
+    def record(self, ttft: float, total: float, cached: bool, error: bool = False) -> None:
+        with self._lock:
+            self.requests += 1
+            self.cache_hits += int(cached)
+            self.errors += int(error)
+            if not error:
+                self._ttft[cached].append(ttft)
+                self._total[cached].append(total)
+
+    @staticmethod
+    def _percentiles(samples) -> Dict[str, Any]:
+        if not samples:
+            return {"p50_ms": None, "p95_ms": None}
+        ms = np.asarray(samples) * 1000
+        return {"p50_ms": round(float(np.percentile(ms, 50)), 2), "p95_ms": round(float(np.percentile(ms, 95)), 2)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "cache_hits": self.cache_hits,
+                "errors": self.errors,
+                "ttft_miss": self._percentiles(self._ttft[False]),
+                "ttft_hit": self._percentiles(self._ttft[True]),
+                "total_miss": self._percentiles(self._total[False]),
+            }
 
 def interpret_eu_non_eu(value):
     """Convierte el código EU_NonEU_Intl a texto legible."""
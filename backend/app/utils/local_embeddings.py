@@ -0,0 +1,84 @@
+"""
+LocalEmbeddings — Embeddings locales deterministas, sin descarga ni API (Prototipo 4)
+Feature hashing de palabras, bigramas de palabras y n-gramas de caracteres
+(tolerante a tildes y variantes: "Málaga" ≈ "malaga", "nomad" ≈ "nomads") en un
+vector de dimensión fija con signo, tf sublineal y norma L2 (coseno). Arranca al
+instante y embebe miles de textos por segundo en CPU: es el modo por defecto sin
+OPENAI_API_KEY (EMBEDDING_BACKEND=local) en lugar del modelo ONNX de Chroma.
+Los rasgos de cada palabra se calculan una vez y se cachean.
+"""
+import re
+import unicodedata
+import zlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Cambiar el algoritmo implica cambiar la versión: el nombre se guarda en la
+# metadata de la colección y en el manifest: un cambio usa otra colección y re-embebe
+LOCAL_EMBEDDING_VERSION = "v1"
+
+_TOKEN = re.compile(r"\w+")
+_COMBINING = re.compile(r"[\u0300-\u036f]")
+_BIGRAM_WEIGHT = 0.5
+_CHAR_WEIGHT = 0.25
+
+
+def _fold(text: str) -> str:
+    """Lowercase without accents ("Málaga" -> "malaga")."""
+    text = text.lower()
+    return text if text.isascii() else _COMBINING.sub("", unicodedata.normalize("NFKD", text))
+
+
+class HashedNgramEmbeddingFunction:
+    """Chroma-compatible embedding function: `ef(input: List[str]) -> List[List[float]]`."""
+
+    def __init__(self, dims: int = 512, char_ngrams: Tuple[int, ...] = (3, 4), max_cached_tokens: int = 200_000):
+        self.dims = dims
+        self.char_ngrams = tuple(char_ngrams)
+        self.max_cached_tokens = max_cached_tokens
+        self.model_name = f"local-hash-ngram-{LOCAL_EMBEDDING_VERSION}-{dims}"
+        self._tokens: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _hash(self, feature: str) -> Tuple[int, float]:
+        # crc32 es estable entre procesos (hash() de Python no: PYTHONHASHSEED)
+        h = zlib.crc32(feature.encode("utf-8"))
+        return h % self.dims, (1.0 if h & 0x80000000 else -1.0)
+
+    def _token_features(self, token: str) -> Tuple[np.ndarray, np.ndarray]:
+        """(indices, signed weights) of a word: the word itself plus its character n-grams."""
+        cached = self._tokens.get(token)
+        if cached is not None:
+            return cached
+        features = [(f"w:{token}", 1.0)]
+        padded = f"<{token}>"
+        for n in self.char_ngrams:
+            features += [(f"c:{padded[i:i + n]}", _CHAR_WEIGHT) for i in range(len(padded) - n + 1)]
+        indices, weights = [], []
+        for feature, weight in features:
+            index, sign = self._hash(feature)
+            indices.append(index)
+            weights.append(sign * weight)
+        cached = (np.asarray(indices, dtype=np.int64), np.asarray(weights, dtype=np.float64))
+        if len(self._tokens) >= self.max_cached_tokens:
+            self._tokens.clear()
+        self._tokens[token] = cached
+        return cached
+
+    def embed(self, text: str) -> np.ndarray:
+        tokens = _TOKEN.findall(_fold(text))
+        if not tokens:
+            return np.zeros(self.dims, dtype=np.float32)
+        parts = [self._token_features(t) for t in tokens]
+        bigrams = np.fromiter((zlib.crc32(f"b:{a} {b}".encode("utf-8")) for a, b in zip(tokens, tokens[1:])),
+                              dtype=np.int64, count=len(tokens) - 1)
+        indices = np.concatenate([p[0] for p in parts] + [bigrams % self.dims])
+        weights = np.concatenate([p[1] for p in parts]
+                                 + [np.where(bigrams & 0x80000000, _BIGRAM_WEIGHT, -_BIGRAM_WEIGHT)])
+        vector = np.bincount(indices, weights=weights, minlength=self.dims)
+        vector = np.sign(vector) * np.log1p(np.abs(vector))  # tf sublineal: un término repetido no domina
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).astype(np.float32)
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        return [self.embed(text).tolist() for text in input]
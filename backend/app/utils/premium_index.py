@@ -0,0 +1,63 @@
+"""
+PremiumIndex — Tabla ciudad → {visa, tax} de los documentos premium (Prototipo 4)
+Se construye en cada refresh de la colección (tras la ingesta) a partir de la
+metadata ya leída, y agrupa los resultados de UNA consulta vectorial filtrada
+por tier=premium en registros por ciudad, con la fila de visado y la de
+impuestos unidas aunque solo una de ellas haya entrado en el top-k.
+"""
+from typing import Dict, List, Sequence
+
+from .taste_profiles import city_key
+
+
+class PremiumIndex:
+    def __init__(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict]):
+        # city_key -> {"visa": {...}, "tax": {...}} (clave = data_type en minúsculas)
+        self.cities: Dict[str, Dict[str, Dict]] = {}
+        self.doc_count = 0
+        for doc_id, document, meta in zip(ids, documents, metadatas):
+            meta = meta or {}
+            key = city_key(meta.get("city"))
+            if meta.get("tier") != "premium" or not key:
+                continue
+            kind = str(meta.get("data_type") or "premium").lower()
+            self.cities.setdefault(key, {})[kind] = {"id": doc_id, "document": document or "", "metadata": meta}
+            self.doc_count += 1
+        # Máximo de documentos premium por ciudad: el top-k de documentos necesario
+        # para garantizar k ciudades distintas es k * max_per_city
+        self.max_per_city = max((len(kinds) for kinds in self.cities.values()), default=0)
+
+    def __len__(self):
+        return len(self.cities)
+
+    def n_results_for(self, n_cities: int) -> int:
+        """Documents to fetch so that the top-k contains n_cities distinct cities (when they exist)."""
+        return min(n_cities * self.max_per_city, self.doc_count)
+
+    def group(self, results: list, n_cities: int) -> List[Dict]:
+        """Collapse ranked premium search results to one joined record per city, best match first."""
+        grouped: Dict[str, Dict] = {}
+        for r in results:
+            meta = r.get("metadata", {})
+            key = city_key(meta.get("city"))
+            if not key:
+                continue
+            record = grouped.get(key)
+            if record is None:
+                if len(grouped) == n_cities:
+                    continue
+                joined = self.cities.get(key, {})
+                record = grouped[key] = {
+                    **r,  # mejor documento de la ciudad (id, document, metadata, distance, base_score)
+                    "city": meta.get("city", ""),
+                    "country": meta.get("country", ""),
+                    "region": meta.get("region", ""),
+                    "visa": joined.get("visa"),
+                    "tax": joined.get("tax"),
+                    "matched": [],
+                }
+            record["matched"].append(str(meta.get("data_type", "")).lower())
+        return list(grouped.values())
+
+    def stats(self) -> dict:
+        return {"cities": len(self.cities), "documents": self.doc_count, "max_per_city": self.max_per_city}
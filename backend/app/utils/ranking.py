@@ -0,0 +1,187 @@
+"""
+Ranking — Motor de scoring vectorizado de NomadMatch (Prototipo 4)
+Codifica una sola vez los metadatos relevantes para los boosts de cada ciudad
+en arrays NumPy y calcula boosts + score final para todo un set de candidatos
+(o para todas las ciudades) en una sola pasada.
+"""
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+# Códigos de presupuesto (0 = otro / sin dato)
+BUDGET_CODES = {"Very Affordable": 1, "Affordable": 2, "Moderate": 3}
+# Las vibes llegan sin validar en `preferences`: caché LRU acotada de sus máscaras
+VIBE_MASK_CACHE_SIZE = 256
+
+
+class CityFeatureMatrix:
+    """Boost-relevant metadata for a set of documents, one row per document."""
+
+    def __init__(self, ids: Sequence[str], metadatas: Sequence[Dict]):
+        self.ids = list(ids)
+        self.metadatas = list(metadatas)
+        self.index = {doc_id: i for i, doc_id in enumerate(self.ids)}
+
+        metas = self.metadatas
+        self.visa_yes = np.array([m.get("visa") == "Yes" for m in metas], dtype=bool)
+        self.internet_excellent = np.array([m.get("internet") == "Excellent" for m in metas], dtype=bool)
+        self.budget = np.array([BUDGET_CODES.get(m.get("budget", ""), 0) for m in metas], dtype=np.int8)
+        self.summer_warm = np.array([m.get("summer_temp") in ("Warm", "Hot") for m in metas], dtype=bool)
+        self.summer_mild = np.array([m.get("summer_temp") == "Mild" for m in metas], dtype=bool)
+        self.safety_excellent = np.array([m.get("safety") == "Excellent" for m in metas], dtype=bool)
+        self.family_good = np.array([m.get("family") in ("Good", "Excellent") for m in metas], dtype=bool)
+        self.nightlife_good = np.array([m.get("nightlife") in ("Good", "Excellent") for m in metas], dtype=bool)
+        self.vibe_tags = np.array([str(m.get("vibe_tags", "")).lower() for m in metas], dtype=str)
+        self._vibe_masks: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_collection(cls, collection) -> "CityFeatureMatrix":
+        """Build the matrix from every document stored in a Chroma collection."""
+        data = collection.get(include=["metadatas"])
+        return cls(data["ids"], data["metadatas"] or [{} for _ in data["ids"]])
+
+    # ── Vibes ─────────────────────────────────────
+    def vibe_mask(self, vibe: str) -> np.ndarray:
+        """Substring match of a (lowercased) vibe against every city, LRU-cached."""
+        mask = self._vibe_masks.get(vibe)
+        if mask is not None:
+            self._vibe_masks.move_to_end(vibe)
+            return mask
+        if len(self.vibe_tags):
+            mask = np.char.find(self.vibe_tags, vibe) >= 0
+        else:
+            mask = np.zeros(0, dtype=bool)
+        self._vibe_masks[vibe] = mask
+        if len(self._vibe_masks) > VIBE_MASK_CACHE_SIZE:
+            self._vibe_masks.popitem(last=False)
+        return mask
+
+    # ── Scoring ───────────────────────────────────
+    def score(self, preferences: Optional[dict] = None, rows: Optional[np.ndarray] = None,
+              base_scores: Optional[np.ndarray] = None):
+        """
+        Compute final scores and boost explanations in one vectorized pass.
+        `rows` selects a candidate subset (all cities if None); `base_scores`
+        defaults to 0.5 like rank_cities. Returns (scores, boosts).
+        """
+        if not preferences:
+            preferences = {}
+        if rows is None:
+            rows = np.arange(len(self.ids))
+        n = len(rows)
+        score = np.full(n, 0.5) if base_scores is None else np.asarray(base_scores, dtype=np.float64).copy()
+
+        # Stages in the same order rank_cities applies them: (mask, amount, label)
+        stages = []
+
+        if preferences.get("visa") == "Yes":
+            stages.append((self.visa_yes[rows], 0.30, "visa:+0.30"))
+
+        stages.append((self.internet_excellent[rows], 0.15, "internet:+0.15"))
+
+        pref_budget = preferences.get("budget", "")
+        budget = self.budget[rows]
+        if pref_budget == "Very Affordable":
+            stages.append((budget == 1, 0.30, "budget_match:+0.30"))
+        elif pref_budget == "Affordable":
+            stages.append(((budget == 1) | (budget == 2), 0.20, "budget_match:+0.20"))
+        elif pref_budget == "Moderate":
+            stages.append(((budget == 2) | (budget == 3), 0.10, "budget_match:+0.10"))
+
+        pref_climate = preferences.get("climate", "")
+        if pref_climate == "Warm":
+            stages.append((self.summer_warm[rows], 0.15, "climate:+0.15"))
+        elif pref_climate == "Mild":
+            stages.append((self.summer_mild[rows], 0.15, "climate:+0.15"))
+
+        stages.append((self.safety_excellent[rows], 0.05, "safety:+0.05"))
+
+        if preferences.get("family") == "Yes":
+            stages.append((self.family_good[rows], 0.10, "family:+0.10"))
+
+        if preferences.get("nightlife") == "Yes":
+            stages.append((self.nightlife_good[rows], 0.10, "nightlife:+0.10"))
+
+        for mask, amount, _ in stages:
+            score[mask] += amount
+
+        # Vibe tag matching
+        pref_vibes = preferences.get("vibes", [])
+        if isinstance(pref_vibes, str):
+            pref_vibes = [v.strip() for v in pref_vibes.split(",")]
+        vibe_matches = np.zeros(n, dtype=np.int64)
+        for v in pref_vibes:
+            vibe_matches += self.vibe_mask(v.lower())[rows]
+        vibe_boost = np.minimum(vibe_matches * 0.05, 0.15)
+        has_vibes = vibe_matches > 0
+        score[has_vibes] += vibe_boost[has_vibes]
+
+        final = np.minimum(score, 1.0)
+
+        boosts = [[] for _ in range(n)]
+        for mask, _, label in stages:
+            for i in np.flatnonzero(mask).tolist():
+                boosts[i].append(label)
+        for i in np.flatnonzero(has_vibes).tolist():
+            boosts[i].append(f"vibes({int(vibe_matches[i])}):+{float(vibe_boost[i]):.2f}")
+
+        return final, boosts
+
+    # ── Ranking de candidatos ─────────────────────
+    def rank(self, results: list, preferences: Optional[dict] = None, tier: str = "free") -> list:
+        """Vectorized equivalent of rank_cities for a list of search results."""
+        if not results:
+            return []
+
+        rows = [self.index.get(r.get("id")) for r in results]
+        matrix = self
+        if any(row is None for row in rows):
+            # Candidatos fuera de la matriz (p. ej. aún no refrescada): codificar al vuelo
+            matrix = CityFeatureMatrix(
+                [r.get("id", str(i)) for i, r in enumerate(results)],
+                [r.get("metadata", {}) for r in results],
+            )
+            rows = range(len(results))
+
+        base_scores = [r.get("base_score", 0.5) for r in results]
+        final, boosts = matrix.score(preferences, np.fromiter(rows, dtype=np.intp, count=len(results)), base_scores)
+
+        ranked = []
+        for r, final_score, boosts_applied in zip(results, final.tolist(), boosts):
+            meta = r.get("metadata", {})
+            entry = {
+                "city": meta.get("city", "Unknown"),
+                "country": meta.get("country", ""),
+                "region": meta.get("region", ""),
+                "score": round(final_score, 4),
+                "score_pct": round(final_score * 100, 1),
+                "base_score": r.get("base_score", 0),
+                "boosts": boosts_applied,
+                "metadata": meta,
+            }
+
+            if tier == "premium":
+                entry["premium_data"] = {
+                    "visa_available": meta.get("visa", "No"),
+                    "visa_type": meta.get("visa_type", "N/A"),
+                    "visa_duration": meta.get("visa_duration", "N/A"),
+                    "visa_income_req_eur": meta.get("visa_income_req", 0),
+                    "visa_score": meta.get("visa_score", "N/A"),
+                    "schengen": meta.get("schengen", "N/A"),
+                }
+
+            ranked.append(entry)
+
+        ranked.sort(key=lambda x: x["score"], reverse=True)
+        return ranked
+
+
+def rank_cities(results: list, preferences: dict = None, tier: str = "free",
+                features: Optional[CityFeatureMatrix] = None) -> List[dict]:
+    """Apply boost scoring based on metadata matches."""
+    if features is None:
+        features = CityFeatureMatrix([], [])
+    return features.rank(results, preferences, tier=tier)
@@ -0,0 +1,115 @@
+"""
+RequestTrace — Desglose de tiempos por petición (Server-Timing) (Prototipo 4)
+El middleware (opt-in, SERVER_TIMING) crea una traza por petición en las rutas
+elegidas y la publica en un ContextVar; el código del pipeline marca etapas con
+`span("embed")`, también desde los hilos del BoundedExecutor (que propaga el
+contexto). Al enviar la respuesta se añade la cabecera `Server-Timing`
+(visible en el panel de red del navegador) y, con SERVER_TIMING_DEBUG, los
+endpoints incluyen un objeto `timings` en el JSON (ver `traced_response`).
+Sin traza activa, `span()` no mide nada.
+"""
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+_current: ContextVar[Optional["RequestTrace"]] = ContextVar("request_trace", default=None)
+_NO_SPAN = nullcontext()
+
+
+class RequestTrace:
+    def __init__(self, debug: bool = False):
+        self.debug = debug
+        self.started = time.perf_counter()
+        self.spans: Dict[str, float] = {}  # etapa -> segundos (acumulados si se repite)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def span(self, name: str) -> "Span":
+        return Span(self, name)
+
+    def timings(self) -> Dict[str, float]:
+        """Milliseconds per stage, plus the elapsed total so far."""
+        out = {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()}
+        out["total"] = round((time.perf_counter() - self.started) * 1000, 3)
+        return out
+
+    def server_timing(self) -> str:
+        """`Server-Timing` header value, e.g. `embed;dur=0.512, vector_query;dur=3.1, total;dur=4.9`."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.timings().items())
+
+
+class Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: RequestTrace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current.get()
+
+
+def span(name: str):
+    """`with span("rank"):` records the block in the current request's trace (no-op without one)."""
+    trace = _current.get()
+    return trace.span(name) if trace is not None else _NO_SPAN
+
+
+def traced_response(body: dict):
+    """
+    Endpoint return value: unchanged without a trace; otherwise serialized here
+    under a `serialize` span, with `timings` added to the body in debug mode
+    (taken before serializing, so it reports every stage except `serialize`).
+    """
+    trace = _current.get()
+    if trace is None:
+        return body
+    with trace.span("serialize"):
+        if trace.debug:
+            body = {**body, "timings": trace.timings()}
+        return JSONResponse(jsonable_encoder(body))
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware: traces requests to `paths` and adds the `Server-Timing` header."""
+
+    def __init__(self, app, paths: Iterable[str], debug: bool = False):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        trace = RequestTrace(debug=self.debug)
+        token = _current.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                # Sin Timing-Allow-Origin el navegador oculta Server-Timing en peticiones cross-origin
+                headers.append((b"timing-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,66 @@
+"""
+ResultCache — Caché versionada de respuestas de búsqueda (Prototipo 4)
+Guarda en memoria las respuestas de /api/v1/query y /api/v1/chat, con clave
+canónica (endpoint, query, preferences, tier, num_results, filters). Cada
+entrada lleva la versión de la colección con la que se calculó: si
+ChromaManager.version cambió (ingesta, borrado), la entrada ya no es válida.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from .embedding_cache import normalize_query
+
+
+def make_key(endpoint: str, query: str, preferences: Optional[dict] = None,
+             tier: str = "free", num_results: int = 0, filters: Optional[dict] = None) -> str:
+    """Canonical cache key: normalized query + preferences/filters with sorted keys."""
+    return json.dumps(
+        [endpoint, normalize_query(query), preferences or {}, tier, num_results, filters or {}],
+        sort_keys=True, separators=(",", ":"), default=str,
+    )
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (version, value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str, version: int) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, version: int, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,126 @@
+"""
+StreamingIngest — Ingesta CSV por chunks en streaming (Prototipo 4)
+Parsea el CSV en bloques acotados de filas (pd.read_csv(chunksize=...)) y
+encadena parse + construcción de documentos (hilo productor) con embedding +
+upsert (consumidor) a través de una cola acotada, de modo que la memoria pico
+no depende del tamaño del fichero. BodyStreamReader permite leer el CSV
+directamente del cuerpo de la petición, sin fichero temporal (y no necesita
+pandas: se importa solo al parsear).
+"""
+import asyncio
+import io
+import queue
+import threading
+import time
+from typing import Iterator, Tuple
+
+_DONE = object()
+
+
+def iter_document_chunks(fileobj, source_file: str, chunk_rows: int = 1000,
+                         max_pending: int = 2) -> Iterator[Tuple[list, list, list]]:
+    """
+    Yield (documents, metadatas, ids) per chunk of `chunk_rows` rows. Parsing and
+    document building run in a background thread, at most `max_pending` chunks ahead.
+    Row ids continue across chunks, so they match a whole-file ingest. Note that
+    pandas infers dtypes per chunk: an integer column with empty cells in only
+    some chunks is rendered as float ("1400.0") in those chunks only.
+    """
+    import pandas as pd
+
+    from .document_builder import build_documents
+    from .metrics import INGEST_SECONDS
+
+    chunks: "queue.Queue" = queue.Queue(maxsize=max(max_pending, 1))
+    stop = threading.Event()
+
+    def produce():
+        try:
+            reader = pd.read_csv(fileobj, chunksize=chunk_rows)
+            while not stop.is_set():
+                started = time.perf_counter()
+                df = next(reader, None)
+                if df is None:
+                    return
+                INGEST_SECONDS.observe(time.perf_counter() - started, "parse")
+                with INGEST_SECONDS.time("build"):
+                    built = build_documents(df, source_file)
+                chunks.put(built)
+        except Exception as e:  # se relanza en el consumidor
+            chunks.put(e)
+        finally:
+            chunks.put(_DONE)
+
+    producer = threading.Thread(target=produce, name=f"ingest-parse-{source_file}", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Vaciar la cola para desbloquear al productor si el consumidor abandona
+        while producer.is_alive():
+            try:
+                chunks.get(timeout=0.05)
+            except queue.Empty:
+                pass
+
+
+class BodyStreamReader(io.RawIOBase):
+    """
+    Blocking binary file-like object fed from the event loop (request.stream()).
+    The consumer (pandas, in a worker thread) reads; the route awaits `feed()`.
+    The internal queue is bounded, so a slow consumer applies backpressure.
+    """
+
+    def __init__(self, max_chunks: int = 16):
+        super().__init__()
+        self._chunks: "queue.Queue" = queue.Queue(maxsize=max_chunks)
+        self._buffer = b""
+        self._ended = False
+        self._aborted = False
+        self.abandoned = False  # el consumidor terminó (p. ej. error de parseo)
+        self.bytes_received = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            if self._aborted:
+                raise IOError("Upload interrupted before the end of the body")
+            try:
+                self._buffer = self._chunks.get(timeout=0.05)
+            except queue.Empty:
+                if self._ended and self._chunks.empty():
+                    return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    async def feed(self, chunk: bytes) -> bool:
+        """Queue a body chunk; returns False once the consumer has stopped reading."""
+        if not chunk:
+            return not self.abandoned
+        self.bytes_received += len(chunk)
+        while not self.abandoned:
+            try:
+                self._chunks.put_nowait(chunk)
+                return True
+            except queue.Full:
+                await asyncio.sleep(0.005)
+        return False
+
+    def end(self, aborted: bool = False) -> None:
+        """Signal end of body; `aborted` makes the reader fail instead of ingesting a truncated CSV."""
+        self._aborted = aborted
+        self._ended = True
+
+    def abandon(self) -> None:
+        self.abandoned = True
@@ -0,0 +1,200 @@
+"""
+TasteProfiles — Vectores de gusto por usuario a partir de likes/dislikes (Prototipo 4)
+El vector de gusto de un usuario es la suma de los embeddings de las ciudades
+que le gustan menos la de las que descartó (normalizado). Los embeddings de
+ciudad son la media de los embeddings de sus documentos ya guardados en la
+colección (CityCentroids): no hay llamadas nuevas de embeddings. Los perfiles
+viven en memoria (LRU acotado), se actualizan de forma incremental en cada
+swipe y se reconstruyen desde la BD si cambia la versión de la colección.
+"""
+import asyncio
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+ACTION_SIGN = {"like": 1.0, "dislike": -1.0}
+
+# Revisión global: nunca se repite, aunque un perfil se expulse y se reconstruya
+_revisions = itertools.count(1)
+
+
+def city_key(name: str) -> str:
+    return str(name or "").strip().lower()
+
+
+class CityCentroids:
+    """Unit-norm mean embedding per city, one row per city, for one collection version."""
+
+    def __init__(self, embeddings, metadatas: Sequence[Dict], version: int = 0):
+        self.version = version
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            key = city_key((meta or {}).get("city"))
+            if key:
+                groups.setdefault(key, []).append(i)
+        self.index = {key: row for row, key in enumerate(groups)}
+
+        vectors = np.asarray(embeddings, dtype=np.float32) if len(groups) else np.zeros((0, 0), dtype=np.float32)
+        if len(groups):
+            matrix = np.stack([vectors[rows].mean(axis=0) for rows in groups.values()])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix /= norms
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.index)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def vector(self, city: str) -> Optional[np.ndarray]:
+        row = self.index.get(city_key(city))
+        return None if row is None else self.matrix[row]
+
+
+class TasteProfile:
+    """Actions and running like-minus-dislike sum of one user, for one CityCentroids."""
+
+    def __init__(self, centroids: CityCentroids, actions: Dict[str, str]):
+        self.centroids = centroids
+        self.actions: Dict[str, str] = {}
+        self.total = np.zeros(centroids.dim, dtype=np.float32)
+        self.taste: Optional[np.ndarray] = None
+        self.revision = 0
+        self.apply(actions)
+
+    def apply(self, changes: Dict[str, Optional[str]]) -> None:
+        """Apply {city: "like" | "dislike" | None (deleted)}: subtract the old contribution, add the new one."""
+        for city, action in changes.items():
+            key = city_key(city)
+            old = self.actions.pop(key, None)
+            if action in ACTION_SIGN:
+                self.actions[key] = action
+            vector = self.centroids.vector(key)
+            if vector is None:
+                continue
+            self.total += (ACTION_SIGN.get(action, 0.0) - ACTION_SIGN.get(old, 0.0)) * vector
+        norm = float(np.linalg.norm(self.total)) if self.total.size else 0.0
+        self.taste = self.total / norm if norm > 1e-6 else None
+        self.revision = next(_revisions)
+
+    def affinity(self, cities: Sequence[str]) -> np.ndarray:
+        """Cosine between the taste vector and each city (0 for unknown cities): one small mat-vec."""
+        rows = np.array([self.centroids.index.get(city_key(c), -1) for c in cities], dtype=np.intp)
+        scores = np.zeros(len(rows), dtype=np.float32)
+        known = rows >= 0
+        if self.taste is not None and known.any():
+            scores[known] = self.centroids.matrix[rows[known]] @ self.taste
+        return scores
+
+
+class _Load:
+    """One in-flight profile build: its task and the swipes applied while it runs."""
+
+    def __init__(self, centroids: CityCentroids):
+        self.centroids = centroids
+        self.changes: List[Dict[str, Optional[str]]] = []
+        self.task: Optional[asyncio.Future] = None
+
+
+class TasteProfiles:
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.updates = 0
+        self._profiles: "OrderedDict[int, TasteProfile]" = OrderedDict()
+        self._loading: Dict[int, _Load] = {}
+        self._lock = threading.Lock()
+
+    async def get(self, user_id: int, centroids: CityCentroids,
+                  load_actions: Callable[[], Awaitable[Dict[str, str]]]) -> TasteProfile:
+        """
+        Cached profile; rebuilt from `await load_actions()` (the user's stored
+        preferences) on a miss or new version. Single-flight per user: concurrent
+        misses share one load, which a cancelled caller does not cancel.
+        """
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None and profile.centroids is centroids:
+                self._profiles.move_to_end(user_id)
+                self.hits += 1
+                return profile
+            self.misses += 1
+            load = self._loading.get(user_id)
+            if load is None or load.centroids is not centroids:
+                load = _Load(centroids)
+                load.task = asyncio.ensure_future(self._build(user_id, load, load_actions))
+                self._loading[user_id] = load
+        return await asyncio.shield(load.task)
+
+    async def _build(self, user_id: int, load: _Load,
+                     load_actions: Callable[[], Awaitable[Dict[str, str]]]) -> TasteProfile:
+        try:
+            actions = await load_actions()
+        except BaseException:
+            with self._lock:
+                if self._loading.get(user_id) is load:
+                    del self._loading[user_id]
+            raise
+        profile = TasteProfile(load.centroids, actions)
+        with self._lock:
+            if self._loading.get(user_id) is load:
+                del self._loading[user_id]
+            # Swipes escritos durante la lectura: puede que ya estén en `actions` (apply es idempotente)
+            for changes in load.changes:
+                profile.apply(changes)
+            if self.max_entries > 0:
+                self._profiles[user_id] = profile
+                self._profiles.move_to_end(user_id)
+                while len(self._profiles) > self.max_entries:
+                    self._profiles.popitem(last=False)
+        return profile
+
+    def apply(self, user_id: int, changes: Dict[str, Optional[str]]) -> None:
+        """Incremental update after a preference write (recorded for an in-flight build, else no-op if uncached)."""
+        with self._lock:
+            profile = self._profiles.get(user_id)
+            if profile is not None:
+                profile.apply(changes)
+                self.updates += 1
+            load = self._loading.get(user_id)
+            if load is not None:
+                load.changes.append(dict(changes))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "updates": self.updates,
+            "size": len(self._profiles),
+            "max_entries": self.max_entries,
+        }
+
+
+def blend_taste(ranked: List[dict], profile: TasteProfile, weight: float) -> List[dict]:
+    """Add weight * affinity to each ranked city's score (clipped to [0, 1]) and re-sort."""
+    if not ranked or profile.taste is None or weight <= 0:
+        return ranked
+    affinity = profile.affinity([r["city"] for r in ranked])
+    for entry, a in zip(ranked, affinity.tolist()):
+        delta = weight * a
+        score = min(max(entry["score"] + delta, 0.0), 1.0)
+        entry["score"] = round(score, 4)
+        entry["score_pct"] = round(score * 100, 1)
+        entry["boosts"] = entry["boosts"] + [f"taste:{delta:+.2f}"]
+    ranked.sort(key=lambda x: x["score"], reverse=True)
+    return ranked
@@ -0,0 +1,156 @@
+"""
+VectorIndex — Índice vectorial exacto en memoria con NumPy (Prototipo 4)
+Alternativa a HNSW + SQLite de Chroma para corpus pequeños (~150 documentos):
+todos los embeddings en una matriz float32 contigua y top-k por similitud coseno
+con un solo producto matriz-vector. Devuelve el mismo formato que
+collection.query() y aplica los mismos filtros `where`.
+"""
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .filters import MetadataBitmapIndex
+
+
+class NumpyVectorIndex:
+    def __init__(self):
+        self.ids: List[str] = []
+        self.documents: List[str] = []
+        self.metadatas: List[Dict] = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)  # filas normalizadas (L2)
+        self._positions: Dict[str, int] = {}
+        self._bitmaps: Optional[MetadataBitmapIndex] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        m = np.ascontiguousarray(vectors, dtype=np.float32)
+        if m.ndim == 1:
+            m = m.reshape(1, -1)
+        norms = np.linalg.norm(m, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return m / norms
+
+    # ── Carga / actualización ─────────────────────
+    def load_from_collection(self, collection, ids: Optional[List[str]] = None) -> int:
+        """Load every document (or only `ids`) with its embedding from a Chroma collection."""
+        kwargs = {"include": ["embeddings", "documents", "metadatas"]}
+        if ids is not None:
+            kwargs["ids"] = ids
+        data = collection.get(**kwargs)
+        if not data["ids"]:
+            return 0
+        self.upsert(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+        return len(data["ids"])
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]) -> None:
+        vectors = self._normalize(embeddings)
+        with self._lock:
+            if len(self.ids) == 0 or self.matrix.shape[1] != vectors.shape[1]:
+                if len(self.ids):
+                    print("⚠️ Dimensión de embeddings distinta: reconstruyendo índice NumPy")
+                self._reset()
+                self.matrix = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+
+            new_rows = []
+            for row, doc_id in enumerate(ids):
+                pos = self._positions.get(doc_id)
+                if pos is None:
+                    self._positions[doc_id] = len(self.ids)
+                    self.ids.append(doc_id)
+                    self.documents.append(documents[row] if documents else "")
+                    self.metadatas.append(metadatas[row] if metadatas else {})
+                    new_rows.append(row)
+                else:
+                    self.matrix[pos] = vectors[row]
+                    self.documents[pos] = documents[row] if documents else ""
+                    self.metadatas[pos] = metadatas[row] if metadatas else {}
+            if new_rows:
+                self.matrix = np.ascontiguousarray(np.vstack([self.matrix, vectors[new_rows]]))
+            self._bitmaps = None
+
+    def remove(self, ids: List[str]) -> None:
+        with self._lock:
+            drop = {self._positions[i] for i in ids if i in self._positions}
+            if not drop:
+                return
+            keep = [p for p in range(len(self.ids)) if p not in drop]
+            self.ids = [self.ids[p] for p in keep]
+            self.documents = [self.documents[p] for p in keep]
+            self.metadatas = [self.metadatas[p] for p in keep]
+            self.matrix = np.ascontiguousarray(self.matrix[keep])
+            self._positions = {doc_id: p for p, doc_id in enumerate(self.ids)}
+            self._bitmaps = None
+
+    def _reset(self):
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self._positions = {}
+        self._bitmaps = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    # ── Filtros ───────────────────────────────────
+    def where_mask(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Boolean mask of documents matching `where` (bitmap index, rebuilt after upserts)."""
+        if not where:
+            return None
+        if self._bitmaps is None:
+            self._bitmaps = MetadataBitmapIndex(self.metadatas)
+        return self._bitmaps.mask(where)
+
+    # ── Búsqueda ──────────────────────────────────
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None,
+              include: Optional[List[str]] = None, **_) -> Dict:
+        """Exact cosine top-k with the same output shape as collection.query()."""
+        include = include or ["documents", "metadatas", "distances"]
+        queries = self._normalize(query_embeddings)
+        out = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+
+        with self._lock:
+            matrix, ids, documents, metadatas = self.matrix, self.ids, self.documents, self.metadatas
+            mask = self.where_mask(where)
+
+        if len(ids) == 0:
+            for _ in range(len(queries)):
+                for field in out.values():
+                    field.append([])
+            return out
+
+        candidates = np.flatnonzero(mask) if mask is not None else None
+        sub = matrix[candidates] if candidates is not None else matrix
+        k = min(n_results, sub.shape[0])
+
+        sims = queries @ sub.T  # (n_queries, n_candidates)
+        for q in range(sims.shape[0]):
+            row = sims[q]
+            if k == 0:
+                top = np.zeros(0, dtype=np.intp)
+            elif k < row.shape[0]:
+                top = np.argpartition(-row, k - 1)[:k]
+                top = top[np.argsort(-row[top], kind="stable")]
+            else:
+                top = np.argsort(-row, kind="stable")
+            positions = candidates[top] if candidates is not None else top
+            out["ids"].append([ids[p] for p in positions])
+            out["documents"].append([documents[p] for p in positions])
+            out["metadatas"].append([metadatas[p] for p in positions])
+            out["distances"].append((1.0 - row[top].astype(np.float64)).tolist())
+
+        for field in ("documents", "metadatas", "distances"):
+            if field not in include:
+                out[field] = None
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "documents": len(self.ids),
+            "dimensions": int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0,
+            "memory_bytes": int(self.matrix.nbytes),
+        }
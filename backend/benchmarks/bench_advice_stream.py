@@ -0,0 +1,160 @@
+"""
+Benchmark — Consejo LLM en streaming (SSE) y caché de respuestas
+Arranca un stub local de chat completions (stub_openai.py) y la app en uvicorn
+dentro del proceso (embeddings deterministas, BD y ChromaDB temporales). Mide:
+  * generate_premium_advice síncrono: tiempo hasta la respuesta completa
+  * /api/v1/premium/advice/stream sin caché: time-to-first-token y total
+  * la misma consulta repetida (hit de caché): replay inmediato
+  * latencia de /api/v1/health/live mientras hay streams abiertos (event loop libre)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_advice_stream --queries 8 --first-token-ms 400 --token-ms 15
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from .common import DATA_DIR, HashEmbeddingFunction, serve_in_thread, stop_server
+from .stub_openai import make_stub_app
+
+QUERIES = [
+    "visado nómada digital con impuestos bajos",
+    "digital nomad visa low income requirement",
+    "flat tax regime for freelancers",
+    "schengen city with easy bureaucracy",
+    "non habitual resident tax benefits",
+    "cheap visa for remote workers outside schengen",
+    "startup visa and tax incentives",
+    "long stay visa for families",
+    "best tax treaty network",
+    "fast visa processing time",
+]
+
+
+def percentiles(samples) -> str:
+    ms = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):8.1f} ms  p95 {np.percentile(ms, 95):8.1f} ms  (n={len(ms)})"
+
+
+async def stream_advice(client, headers: dict, query: str):
+    """POST the SSE endpoint; return (seconds to first `token` event, total seconds, cached, text)."""
+    t0 = time.perf_counter()
+    ttft, cached, parts, event = None, None, [], None
+    async with client.stream("POST", "/api/v1/premium/advice/stream", headers=headers,
+                             json={"query": query, "num_results": 5}) as r:
+        r.raise_for_status()
+        async for line in r.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+                if event == "token":
+                    if ttft is None:
+                        ttft = time.perf_counter() - t0
+                    parts.append(data["delta"])
+                elif event == "done":
+                    cached = data["cached"]
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+    return ttft, time.perf_counter() - t0, cached, "".join(parts)
+
+
+async def probe_loop(client, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        (await client.get("/api/v1/health/live")).raise_for_status()
+        samples.append(time.perf_counter() - t0)
+        await asyncio.sleep(0.01)
+
+
+async def run(base_url: str, queries, args):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        while (await client.get("/api/v1/health/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+        creds = {"email": "advice@nomad.io", "password": "bench-pw"}
+        token = (await client.post("/api/v1/auth/register", json=creds)).json()["access_token"]
+        token = (await client.post("/api/v1/auth/upgrade",
+                                   headers={"Authorization": f"Bearer {token}"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        phases = {}
+        for phase in ("sin caché", "hit de caché"):
+            probes, stop = [], asyncio.Event()
+            probe = asyncio.create_task(probe_loop(client, stop, probes))
+            outcomes = await asyncio.gather(*(stream_advice(client, headers, q) for q in queries))
+            stop.set()
+            await probe
+            phases[phase] = (outcomes, probes)
+        health = (await client.get("/api/v1/health")).json()
+    return phases, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=8, help=f"consultas concurrentes distintas (máx. {len(QUERIES)})")
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--words", type=int, default=60)
+    args = parser.parse_args()
+    queries = QUERIES[:args.queries]
+
+    stub = make_stub_app(args.first_token_ms, args.token_ms, args.words)
+    stub_url, stub_server, stub_thread = serve_in_thread(stub)
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "CHROMA_PERSIST_DIR": os.path.join(tmp, "chroma"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'users.db')}",
+        "AUTO_INGEST_DIRS": DATA_DIR,
+        "BCRYPT_ROUNDS": "4",
+        "OPENAI_API_KEY": "stub-key",
+        "OPENAI_BASE_URL": f"{stub_url}/v1",
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+
+    import app.main as main_module
+    from app.utils.llm_utils import generate_premium_advice
+
+    # lazy_init: embeddings deterministas en vez de OpenAI (la API key solo sirve al stub)
+    main_module.cm.embedding_function = HashEmbeddingFunction()
+    base_url, server, thread = serve_in_thread(main_module.app)
+    try:
+        phases, health = asyncio.run(run(base_url, queries, args))
+
+        results = main_module.cm.premium_grouped(queries[0], 5)
+        t0 = time.perf_counter()
+        generate_premium_advice(queries[0], results)
+        blocking = time.perf_counter() - t0
+    finally:
+        stop_server(server, thread)
+        stop_server(stub_server, stub_thread)
+
+    print(f"\nStub: primer token {args.first_token_ms:.0f} ms, {args.words} tokens cada {args.token_ms:.0f} ms; "
+          f"{len(queries)} consultas concurrentes\n")
+    print(f"generate_premium_advice (síncrono, respuesta completa): {blocking * 1000:8.1f} ms")
+    for phase, (outcomes, probes) in phases.items():
+        ttft = [o[0] for o in outcomes]
+        total = [o[1] for o in outcomes]
+        cached = sum(1 for o in outcomes if o[2])
+        print(f"\n[{phase}] {cached}/{len(outcomes)} desde caché")
+        print(f"  time-to-first-token : {percentiles(ttft)}")
+        print(f"  respuesta completa  : {percentiles(total)}")
+        print(f"  /health/live        : {percentiles(probes)}")
+    first, second = phases["sin caché"][0], phases["hit de caché"][0]
+    assert all(a[3].strip() == b[3].strip() for a, b in zip(first, second)), \
+        "el replay de caché no coincide con la respuesta original"
+    print(f"\nLlamadas al stub: {stub.state.requests} (esperadas {len(queries) + 1})")
+    print(f"Métricas del servidor: {json.dumps(health['advice'])}")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
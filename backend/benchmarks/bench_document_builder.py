@@ -0,0 +1,162 @@
+"""
+Benchmark — Construcción de documentos para ingest_dataframe
+Compara el bucle original con iterrows() contra build_documents (columnar) sobre
+un DataFrame sintético ancho (columnas de city_general_free.csv, 10k+ filas) y
+verifica que ambos producen exactamente los mismos documents/metadatas/ids.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_document_builder --rows 20000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.utils.document_builder import build_documents
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+
+def build_documents_rowwise(df: pd.DataFrame, source_file: str):
+    """Bucle original de ChromaManager.ingest_dataframe (referencia)."""
+    is_visa_premium = "visa_premium" in source_file.lower()
+    is_tax_premium = "tax_premium" in source_file.lower()
+    is_premium = is_visa_premium or is_tax_premium
+
+    documents = []
+    metadatas = []
+    ids = []
+
+    for idx, row in df.iterrows():
+        # Build rich text for embedding
+        text_parts = []
+        for col in df.columns:
+            if pd.notna(row[col]) and str(row[col]).strip():
+                text_parts.append(f"{col}: {row[col]}")
+        text = " | ".join(text_parts)
+
+        # Determine tier and data_type
+        if is_visa_premium:
+            data_type, tier = "Visa", "premium"
+        elif is_tax_premium:
+            data_type, tier = "Tax", "premium"
+        else:
+            data_type = str(row.get("data_type", "General"))
+            tier = str(row.get("tier", "free"))
+
+        # City name (try multiple column names)
+        city = str(row.get("city", row.get("City", "")))
+        country = str(row.get("Country", row.get("country", "")))
+        region = str(row.get("Region", row.get("region", "")))
+
+        # Base metadata
+        metadata = {
+            "source": source_file,
+            "row_index": str(idx),
+            "city": city,
+            "country": country,
+            "region": region,
+            "data_type": data_type,
+            "tier": tier,
+        }
+
+        # Campos comunes para free
+        common_fields = {
+            "Monthly_Budget_Single": "budget",
+            "Internet_Reliability_Score": "internet",
+            "Digital_Nomad_Visa": "visa",
+            "Summer_Temperature": "summer_temp",
+            "Winter_Temperature": "winter_temp",
+            "Vibe_Tags": "vibe_tags",
+            "Safety_Score": "safety",
+            "Nightlife_Score": "nightlife",
+            "Family_Friendly_Score": "family",
+            "Startup_Scene_Score": "startup",
+            "Coworking_Availability": "coworking",
+            "Expat_Community_Size": "expat_size",
+            "English_Proficiency_Score": "english",
+            "Outdoor_Activities_Score": "outdoor",
+            "Sunshine_Level": "sunshine",
+            "Visa_Score": "visa_score",
+            "Visa_Type": "visa_type",
+            "Visa_Duration": "visa_duration",
+            "Schengen": "schengen",
+        }
+        for csv_col, meta_key in common_fields.items():
+            if csv_col in df.columns and pd.notna(row.get(csv_col)):
+                metadata[meta_key] = str(row[csv_col])
+
+        # Campos numéricos
+        int_fields = {
+            "Monthly_Budget_Single_EUR": "budget_eur",
+            "Coworking_Monthly_EUR": "coworking_eur",
+            "Airbnb_Avg_Monthly_EUR": "airbnb_eur",
+            "Current_Population": "population",
+            "Visa_Monthly_Income_Requirement_EUR": "visa_income_req",
+        }
+        for csv_col, meta_key in int_fields.items():
+            if csv_col in df.columns and pd.notna(row.get(csv_col)):
+                try:
+                    metadata[meta_key] = int(float(row[csv_col]))
+                except (ValueError, TypeError):
+                    metadata[meta_key] = str(row[csv_col])
+
+        # Premium: almacenar TODAS las columnas extra
+        if is_premium:
+            for col in df.columns:
+                if col.lower() in ["city", "country", "region", "tier"]:
+                    continue
+                val = row.get(col)
+                if pd.notna(val) and str(val).strip():
+                    metadata[col] = str(val)
+
+        documents.append(text)
+        metadatas.append(metadata)
+        ids.append(f"{source_file}_{idx}")
+
+    return documents, metadatas, ids
+
+
+def synthetic_frame(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Replica las filas de city_general_free.csv hasta `rows`, con ~5% de celdas vacías."""
+    base = pd.read_csv(os.path.join(DATA_DIR, "city_general_free.csv"))
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), size=rows)].reset_index(drop=True)
+    mask = rng.random(df.shape) < 0.05
+    mask[:, 0] = False  # city siempre presente
+    return df.mask(mask)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    # Equivalencia sobre los CSV reales
+    for name in ("city_general_free.csv", "city_visa_premium.csv", "city_tax_premium.csv"):
+        df = pd.read_csv(os.path.join(DATA_DIR, name))
+        assert build_documents(df, name) == build_documents_rowwise(df, name), name
+
+    df = synthetic_frame(args.rows)
+    print(f"DataFrame sintético: {len(df)} filas x {len(df.columns)} columnas")
+
+    for source in ("synthetic_general_free.csv", "synthetic_visa_premium.csv"):
+        legacy, t_legacy = timed(build_documents_rowwise, df, source)
+        columnar, t_columnar = timed(build_documents, df, source)
+        assert legacy == columnar, f"resultados distintos para {source}"
+        print(f"\n{source}")
+        print(f"  iterrows : {t_legacy:8.3f} s  {len(df) / t_legacy:10,.0f} rows/s")
+        print(f"  columnar : {t_columnar:8.3f} s  {len(df) / t_columnar:10,.0f} rows/s")
+        print(f"  speedup  : {t_legacy / t_columnar:6.1f}x (salida idéntica)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark — Pipeline de embedding concurrente para ingesta masiva
+Simula un proveedor de embeddings remoto (latencia por request + por token y
+429 aleatorios) y compara el esquema anterior (batches fijos de 50 filas, uno
+tras otro) con EmbeddingPipeline (batches por tokens, N workers, backoff).
+No escribe en Chroma: mide solo embedding + escritura simulada.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_ingest_pipeline --rows 2000 --workers 8
+"""
+import argparse
+import random
+import threading
+import time
+
+from app.utils.document_builder import build_documents
+from app.utils.embedding_pipeline import EmbeddingPipeline
+
+from .bench_document_builder import synthetic_frame
+from .common import HashEmbeddingFunction
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class SimulatedRemoteEmbeddings:
+    """HashEmbeddingFunction behind a fake network: fixed RTT, per-token cost and random 429s."""
+
+    def __init__(self, rtt: float, per_1k_tokens: float, rate_limit_prob: float, seed: int = 0):
+        self.inner = HashEmbeddingFunction()
+        self.rtt = rtt
+        self.per_1k_tokens = per_1k_tokens
+        self.rate_limit_prob = rate_limit_prob
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+
+    def __call__(self, input):
+        with self.lock:
+            self.requests += 1
+            limited = self.rng.random() < self.rate_limit_prob
+            if limited:
+                self.throttled += 1
+        time.sleep(self.rtt)
+        if limited:
+            raise RateLimitError("429 Too Many Requests")
+        time.sleep(sum(len(t) for t in input) / 4 / 1000 * self.per_1k_tokens)
+        return self.inner(input)
+
+
+def sequential_50(embed, documents, write):
+    """Esquema anterior: batches fijos de 50, embedding + upsert uno tras otro."""
+    for i in range(0, len(documents), 50):
+        write(embed(documents[i:i + 50]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rtt", type=float, default=0.15, help="latencia por request (s)")
+    parser.add_argument("--per-1k-tokens", type=float, default=0.002, help="coste por 1k tokens (s)")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.05)
+    args = parser.parse_args()
+
+    documents, metadatas, ids = build_documents(synthetic_frame(args.rows), "synthetic_general_free.csv")
+    print(f"{len(documents)} documentos, RTT={args.rtt}s, 429 p={args.rate_limit_prob}")
+
+    # Sin 429 en el esquema anterior (no tenía reintentos: un 429 perdía el batch)
+    remote = SimulatedRemoteEmbeddings(args.rtt, args.per_1k_tokens, 0.0)
+    t0 = time.perf_counter()
+    sequential_50(remote, documents, lambda _: None)
+    t_seq = time.perf_counter() - t0
+    print(f"\n  secuencial (50 filas) : {t_seq:7.2f} s  {len(documents) / t_seq:8.0f} docs/s  {remote.requests} requests")
+
+    remote = SimulatedRemoteEmbeddings(args.rtt, args.per_1k_tokens, args.rate_limit_prob)
+    pipeline = EmbeddingPipeline(remote, workers=args.workers, base_delay=0.05, max_delay=1.0)
+    report = pipeline.run(documents, metadatas, ids, lambda *a: None)
+    print(f"  pipeline ({args.workers} workers)  : {report['seconds']:7.2f} s  "
+          f"{len(documents) / report['seconds']:8.0f} docs/s  {remote.requests} requests, "
+          f"{remote.throttled} x 429, {len(report['batches'])} batches, fallidos={report['failed']}")
+    print(f"  speedup: {t_seq / report['seconds']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Benchmark — LangflowClient: pool keep-alive y circuit breaker
+Contra un Langflow falso local (uvicorn en el proceso) compara:
+  * anterior: un httpx.AsyncClient nuevo por llamada (conexión TCP nueva cada vez)
+  * actual: LangflowClient con un pool de larga vida
+reportando llamadas/s, latencia y conexiones abiertas (reutilización). Después
+"cuelga" el servidor y mide cuánto tarda en fallar cada llamada con y sin
+circuit breaker, y la recuperación (half-open → closed) al volver el servicio.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_langflow_client --calls 500 --concurrency 16 --latency-ms 5
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from .common import serve_in_thread, stop_server
+
+
+def make_fake_langflow(latency_ms: float):
+    """
+    Fake Langflow (run and upload endpoints). `app.state.mode`: "ok"; "hang" (no
+    answer until the mode changes: the client times out); "reject" (400, an
+    error in the request, not in the service).
+    """
+    from fastapi import FastAPI, Request, UploadFile, File
+    from fastapi.responses import JSONResponse
+
+    app = FastAPI()
+    app.state.mode = "ok"  # "ok" | "hang" | "reject"
+
+    async def behave():
+        while app.state.mode == "hang":
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(latency_ms / 1000)
+        if app.state.mode == "reject":
+            return JSONResponse(status_code=400, content={"detail": "Invalid flow input"})
+        return None
+
+    @app.post("/api/v1/run/{flow_id}")
+    async def run(flow_id: str, request: Request):
+        body = await request.json()
+        rejected = await behave()
+        if rejected is not None:
+            return rejected
+        return {"session_id": body.get("session_id", "s"), "outputs": [{"message": f"echo: {body['input_value']}"}]}
+
+    @app.post("/api/v1/upload/{flow_id}")
+    async def upload(flow_id: str, file: UploadFile = File(...)):
+        content = await file.read()
+        rejected = await behave()
+        if rejected is not None:
+            return rejected
+        return {"flowId": flow_id, "file_path": file.filename, "bytes": len(content)}
+
+    return app
+
+
+async def legacy_run_flow(base_url: str, flow_id: str, message: str, counter: dict):
+    """Previous implementation: a new AsyncClient (and TCP connection) per call."""
+    import httpx
+
+    async def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            counter["connections"] += 1
+
+    async with httpx.AsyncClient() as client:
+        try:
+            response = await client.post(f"{base_url}/api/v1/run/{flow_id}", timeout=60.0,
+                                         json={"input_value": message, "output_type": "chat", "input_type": "chat"},
+                                         extensions={"trace": trace})
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            return {"error": str(e)}
+
+
+async def load(call, calls: int, concurrency: int):
+    """Run `calls` calls with at most `concurrency` in flight: (latencies, errors, seconds)."""
+    latencies, errors = [], 0
+    queue = iter(range(calls))
+
+    async def worker():
+        nonlocal errors
+        for i in queue:
+            t0 = time.perf_counter()
+            result = await call(i)
+            latencies.append(time.perf_counter() - t0)
+            errors += "error" in result
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def report(name: str, latencies, errors: int, seconds: float, connections: int):
+    ms = np.asarray(latencies) * 1000
+    print(f"  {name:<30} {len(ms) / seconds:8.0f} llamadas/s   p50 {np.percentile(ms, 50):7.2f} ms   "
+          f"p95 {np.percentile(ms, 95):7.2f} ms   errores {errors:3d}   conexiones {connections}")
+
+
+async def run(base_url: str, fake, args):
+    from app.core.langflow_client import LangflowClient
+    from app.utils.circuit_breaker import CircuitBreaker
+
+    print(f"\n{args.calls} llamadas run_flow, {args.concurrency} concurrentes, latencia del servidor {args.latency_ms} ms")
+    counter = {"connections": 0}
+    report("anterior (cliente por llamada)",
+           *await load(lambda i: legacy_run_flow(base_url, "flow", f"m{i}", counter), args.calls, args.concurrency),
+           counter["connections"])
+
+    client = LangflowClient(base_url=base_url, flow_id="flow", max_connections=args.concurrency)
+    report("LangflowClient (pool)",
+           *await load(lambda i: client.run_flow(f"m{i}"), args.calls, args.concurrency),
+           client.connections_opened)
+    upload = await client.upload_document(b"city,country\nLisbon,Portugal\n", "cities.csv")
+    stats = client.stats()
+    print(f"  reutilización de conexiones: {stats['connection_reuse']:.2%}  (upload: {upload})")
+    await client.aclose()
+
+    # Langflow colgado: cada llamada espera el timeout salvo que el breaker esté abierto
+    print(f"\nLangflow colgado: {args.down_calls} llamadas secuenciales, timeout {args.timeout} s")
+    fake.state.mode = "hang"
+    for name, threshold in (("sin breaker", 10 ** 9), (f"breaker ({args.threshold} fallos)", args.threshold)):
+        client = LangflowClient(base_url=base_url, flow_id="flow", run_timeout=args.timeout,
+                                breaker=CircuitBreaker("Langflow", failure_threshold=threshold,
+                                                       reset_timeout=args.reset))
+        latencies, errors, seconds = await load(lambda i: client.run_flow("down"), args.down_calls, 1)
+        ms = np.asarray(latencies) * 1000
+        print(f"  {name:<22} total {seconds:6.2f} s   p50 {np.percentile(ms, 50):8.2f} ms   "
+              f"última {ms[-1]:8.2f} ms   errores {errors}   breaker {client.breaker.stats()['state']}")
+        if threshold == args.threshold:
+            fake.state.mode = "ok"
+            await asyncio.sleep(args.reset)
+            result = await client.run_flow("back")
+            print(f"  recuperación tras {args.reset} s: {'OK' if 'error' not in result else result['error']} — "
+                  f"breaker {client.breaker.stats()['state']}")
+        await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--down-calls", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=0.5, help="timeout de run_flow durante la caída")
+    parser.add_argument("--threshold", type=int, default=3)
+    parser.add_argument("--reset", type=float, default=1.0, help="segundos en open antes de half-open")
+    args = parser.parse_args()
+
+    fake = make_fake_langflow(args.latency_ms)
+    base_url, server, thread = serve_in_thread(fake)
+    try:
+        asyncio.run(run(base_url, fake, args))
+    finally:
+        fake.state.mode = "ok"
+        stop_server(server, thread)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark — Pool de bcrypt: throughput de login e impacto en /api/v1/query
+Arranca la app en un uvicorn dentro del proceso (embeddings deterministas, BD
+y ChromaDB temporales), mide la latencia de /api/v1/query en reposo y después
+durante una ráfaga de logins concurrentes. Reporta logins/s, 503 (con
+Retry-After) y p50/p95 de /query en ambas fases.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_password_pool --logins 200 --hash-workers 2 --rounds 12
+"""
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from .common import DATA_DIR, HashEmbeddingFunction
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):7.1f} ms  p95 {np.percentile(ms, 95):7.1f} ms  (n={len(ms)})"
+
+
+async def query_loop(client, stop: asyncio.Event, samples: list):
+    body = {"query": "sunny beach city with good internet", "num_results": 10}
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        r = await client.post("/api/v1/query", json=body)
+        r.raise_for_status()
+        samples.append(time.perf_counter() - t0)
+
+
+async def run(base_url: str, args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        while (await client.get("/api/v1/health/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+        await client.post("/api/v1/auth/register", json={"email": "bench@nomad.io", "password": "bench-pw"})
+
+        # Fase 1: /query en reposo
+        idle = []
+        stop = asyncio.Event()
+        loops = [asyncio.create_task(query_loop(client, stop, idle)) for _ in range(args.query_clients)]
+        await asyncio.sleep(args.idle_seconds)
+        stop.set()
+        await asyncio.gather(*loops)
+
+        # Fase 2: /query durante una ráfaga de logins
+        busy, statuses, retry_after = [], [], []
+        stop = asyncio.Event()
+        loops = [asyncio.create_task(query_loop(client, stop, busy)) for _ in range(args.query_clients)]
+
+        async def login():
+            r = await client.post("/api/v1/auth/login", json={"email": "bench@nomad.io", "password": "bench-pw"})
+            statuses.append(r.status_code)
+            if r.status_code == 503:
+                retry_after.append(int(r.headers.get("retry-after", 0)))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(args.logins)))
+        burst = time.perf_counter() - t0
+        stop.set()
+        await asyncio.gather(*loops)
+        health = (await client.get("/api/v1/health")).json()
+
+    ok = statuses.count(200)
+    print(f"\nRáfaga: {args.logins} logins concurrentes en {burst:.2f} s — {ok} OK ({ok / burst:.1f} logins/s), "
+          f"{statuses.count(503)} x 503" + (f" (Retry-After {min(retry_after)}-{max(retry_after)} s)" if retry_after else ""))
+    print(f"/query en reposo      : {percentiles(idle)}")
+    print(f"/query durante ráfaga : {percentiles(busy)}")
+    pool = health["password_executor"]
+    print(f"pool bcrypt: workers={pool['max_workers']} max_pending={pool['max_pending']} "
+          f"hash p50={pool['latency_p50_ms']} ms p95={pool['latency_p95_ms']} ms rechazados={pool['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--hash-workers", type=int, default=2)
+    parser.add_argument("--max-pending", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--query-clients", type=int, default=4)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ.update({
+        "CHROMA_PERSIST_DIR": os.path.join(tmp, "chroma"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'users.db')}",
+        "AUTO_INGEST_DIRS": DATA_DIR,
+        "BCRYPT_ROUNDS": str(args.rounds),
+        "PASSWORD_HASH_WORKERS": str(args.hash_workers),
+        "PASSWORD_HASH_MAX_PENDING": str(args.max_pending),
+        "RESULT_CACHE_SIZE": "0",  # medir búsquedas reales, no la caché de respuestas
+        "ANONYMIZED_TELEMETRY": "False",
+    })
+    os.environ.pop("OPENAI_API_KEY", None)
+
+    import uvicorn
+    import app.main as main_module
+
+    # lazy_init: se puede inyectar el embedding antes de que el lifespan abra ChromaDB
+    main_module.cm.embedding_function = HashEmbeddingFunction()
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(main_module.app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        asyncio.run(run(f"http://127.0.0.1:{port}", args))
+    finally:
+        server.should_exit = True
+        thread.join(10)
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Benchmark — Arranque en frío: import time y time-to-first-response
+Mide en procesos nuevos:
+  * `python -X importtime -c "import app.main"` (total y módulos más caros)
+  * tiempo desde lanzar uvicorn hasta el primer 200 de /api/v1/health/live
+y falla (exit 1) si se supera el presupuesto o si alguna dependencia pesada
+(pandas, chromadb, openai, onnxruntime) se importa al arrancar.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_startup --repeat 3 --import-budget-ms 2000 --ttfr-budget-ms 4000
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Solo deben cargarse en el primer uso (ingesta, ChromaDB, LLM)
+LAZY_MODULES = ("pandas", "chromadb", "openai", "onnxruntime")
+
+
+def clean_env(tmp: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_PERSIST_DIR": os.path.join(tmp, "chroma"),
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmp, 'users.db')}",
+        "AUTO_INGEST": "false",
+        "ANONYMIZED_TELEMETRY": "False",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    })
+    return env
+
+
+def import_time(env: dict):
+    """Return (total_ms, {module imported by app.main: cumulative ms}, eagerly imported lazy modules)."""
+    probe = f"import app.main, sys; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    eager = [m for m in proc.stdout.strip().split(",") if m]
+    total, modules = 0.0, {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if not cumulative.strip().isdigit():
+            continue
+        ms = int(cumulative) / 1000
+        if name.strip() == "app.main":
+            total = ms
+        elif depth == 1:  # importados directamente por app.main
+            modules[name.strip()] = ms
+    return total, modules, eager
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_response(env: dict, timeout: float = 60.0):
+    """Spawn uvicorn and return (ms to first 200 on /health/live, ms to 200 on /health/ready)."""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port),
+                             "--log-level", "warning"],
+                            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    live = ready = None
+    try:
+        while time.perf_counter() - started < timeout and ready is None:
+            path = "/api/v1/health/live" if live is None else "/api/v1/health/ready"
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=1) as resp:
+                    if resp.status == 200:
+                        elapsed = (time.perf_counter() - started) * 1000
+                        if live is None:
+                            live = elapsed
+                        else:
+                            ready = elapsed
+                        continue
+            except OSError:
+                if proc.poll() is not None:
+                    raise RuntimeError("uvicorn exited before answering")
+            time.sleep(0.01)
+    finally:
+        proc.terminate()
+        proc.wait(10)
+    return live, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--import-budget-ms", type=float, default=2000)
+    parser.add_argument("--ttfr-budget-ms", type=float, default=4000)
+    args = parser.parse_args()
+
+    imports, lives, readies, eager = [], [], [], set()
+    top = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = clean_env(tmp)
+        for _ in range(args.repeat):
+            total, modules, eager_now = import_time(env)
+            imports.append(total)
+            top = modules
+            eager.update(eager_now)
+            live, ready = time_to_first_response(env)
+            lives.append(live)
+            readies.append(ready)
+
+    import_ms = statistics.median(imports)
+    live_ms = statistics.median(lives) if None not in lives else None
+    print(f"import app.main        : {import_ms:8.1f} ms (mediana de {args.repeat}, presupuesto {args.import_budget_ms:.0f})")
+    if live_ms is not None:
+        print(f"primera respuesta /live: {live_ms:8.1f} ms (presupuesto {args.ttfr_budget_ms:.0f})")
+    if None not in readies:
+        print(f"/ready (ChromaDB listo): {statistics.median(readies):8.1f} ms")
+    print("\nImports más caros de app.main:")
+    for name, ms in sorted(top.items(), key=lambda kv: -kv[1])[:10]:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    failures = []
+    if eager:
+        failures.append(f"dependencias pesadas importadas al arrancar: {', '.join(sorted(eager))}")
+    if import_ms > args.import_budget_ms:
+        failures.append(f"import time {import_ms:.0f} ms > {args.import_budget_ms:.0f} ms")
+    if live_ms is None or live_ms > args.ttfr_budget_ms:
+        failures.append(f"time-to-first-response {'timeout' if live_ms is None else f'{live_ms:.0f} ms'} "
+                        f"> {args.ttfr_budget_ms:.0f} ms")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ Dentro del presupuesto de arranque")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Benchmark — Suite offline de hot paths (búsqueda, ranking, ingesta, auth)
+Sin red: embeddings deterministas (HashEmbeddingFunction), ChromaDB y SQLite en
+directorios temporales. Corpus: los tres CSV de data/ ("base") y escalados
+sintéticos de ciudades (1k, 10k, 100k). Para cada hot path reporta p50/p95/p99
+y ops/s, y escribe un JSON comparable entre ejecuciones (--compare).
+
+Hot paths:
+  ingest_dataframe        ingesta completa del corpus (una pasada: segundos, docs/s)
+  build_documents         construcción de documentos + metadata desde el DataFrame
+  search                  ChromaManager.search, caché de embeddings caliente
+  search.filtered         idem con filtros de metadata (región + presupuesto)
+  rank_cities             ranking vectorizado de los candidatos de una búsqueda
+  rank.all                scoring de todas las ciudades del corpus
+  auth.get_current_user   JWT + principal_cache (hit) o + SELECT users (miss)
+
+Uso (desde backend/):
+    python -m benchmarks.bench_suite --scales base,1k,10k --json bench.json
+    python -m benchmarks.bench_suite --scales base,1k,10k,100k --json new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from app.utils.chroma_utils import ChromaManager
+from app.utils.document_builder import build_documents
+from app.utils.filters import compile_filters
+
+from .common import HashEmbeddingFunction, load_csvs, measure, synthetic_cities
+
+QUERIES = [
+    "sunny beach city with good nightlife",
+    "affordable city with digital nomad visa",
+    "Schengen D8 visa income requirement",
+    "low tax regime for freelancers",
+    "historic calm city with great internet",
+]
+PREFERENCES = {"budget": "Affordable", "climate": "Warm", "vibes": ["beach", "startup"], "visa": "Yes"}
+SCALES = {"base": None, "1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+
+def corpus(scale: str):
+    """{source_file: DataFrame} for a scale name."""
+    if SCALES[scale] is None:
+        return load_csvs()
+    return {f"synthetic_{scale}.csv": synthetic_cities(SCALES[scale])}
+
+
+def rotating(fn):
+    """Call fn(query) cycling through QUERIES."""
+    i = iter(range(10 ** 12))
+    return lambda: fn(QUERIES[next(i) % len(QUERIES)])
+
+
+def bench_scale(scale: str, args, results: dict):
+    frames = corpus(scale)
+    rows = sum(len(df) for df in frames.values())
+    print(f"\n── {scale}: {rows} filas ──")
+
+    first = next(iter(frames.items()))
+    results[f"build_documents@{scale}"] = measure(lambda: build_documents(first[1], first[0]),
+                                                  repeat=max(3, args.repeat // max(1, rows // 100)), warmup=1)
+
+    cm = ChromaManager(persist_directory=tempfile.mkdtemp(prefix=f"suite_{scale}_"),
+                       search_backend=args.backend, embedding_function=HashEmbeddingFunction())
+    started = time.perf_counter()
+    docs = sum(cm.ingest_dataframe(df, source_file=name) for name, df in frames.items())
+    seconds = time.perf_counter() - started
+    results[f"ingest_dataframe@{scale}"] = {"seconds": round(seconds, 3), "docs": docs,
+                                            "docs_per_s": round(docs / seconds, 1)}
+
+    for q in QUERIES:
+        cm.search(q, n_results=args.n_results)  # calentar caché de embeddings
+    where = compile_filters({"region": ["Southern Europe", "Western Europe"], "budget_eur": {"lte": 2000}})
+    results[f"search@{scale}"] = measure(rotating(lambda q: cm.search(q, n_results=args.n_results)),
+                                         repeat=args.repeat)
+    results[f"search.filtered@{scale}"] = measure(
+        rotating(lambda q: cm.search(q, n_results=args.n_results, where=where)), repeat=args.repeat)
+
+    candidates = [cm.search(q, n_results=args.n_results) for q in QUERIES]
+    i = iter(range(10 ** 12))
+    results[f"rank_cities@{scale}"] = measure(
+        lambda: cm.features.rank(candidates[next(i) % len(candidates)], PREFERENCES), repeat=args.repeat)
+    results[f"rank.all@{scale}"] = measure(lambda: cm.features.score(PREFERENCES),
+                                           repeat=max(5, args.repeat // max(1, rows // 1000)))
+    cm.close()
+
+    for key in (f"ingest_dataframe@{scale}", f"search@{scale}", f"search.filtered@{scale}",
+                f"rank_cities@{scale}", f"rank.all@{scale}", f"build_documents@{scale}"):
+        print(f"  {format_row(key, results[key])}")
+
+
+def run_coroutine(coro):
+    """Drive a coroutine that never actually suspends (no event loop overhead in the measurement)."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("coroutine suspended")
+
+
+def bench_auth(args, results: dict):
+    tmp = tempfile.mkdtemp(prefix="suite_auth_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'users.db')}"
+    from app.api.auth import create_access_token
+    from app.api.deps import get_current_user, principal_cache
+    from app.models.user import SessionLocal, User, init_db
+
+    init_db()
+    with SessionLocal() as db:
+        db.add_all([User(email=f"user{i}@nomad.io", hashed_password="x") for i in range(1000)])
+        db.commit()
+    token = create_access_token({"sub": "user500@nomad.io"})
+
+    print("\n── auth ──")
+    with SessionLocal() as db:
+        run_coroutine(get_current_user(token, db))
+        results["auth.get_current_user[hit]"] = measure(lambda: run_coroutine(get_current_user(token, db)),
+                                                        repeat=args.repeat * 10)
+
+        def miss():
+            principal_cache.clear()
+            return run_coroutine(get_current_user(token, db))
+        results["auth.get_current_user[miss]"] = measure(miss, repeat=args.repeat * 2)
+    for key in ("auth.get_current_user[hit]", "auth.get_current_user[miss]"):
+        print(f"  {format_row(key, results[key])}")
+
+
+def format_row(key: str, stats: dict) -> str:
+    if "docs_per_s" in stats:
+        return f"{key:<32} {stats['seconds']:9.2f} s   {stats['docs_per_s']:>12,.0f} docs/s"
+    return (f"{key:<32} p50 {stats['p50_ms']:9.3f} ms  p95 {stats['p95_ms']:9.3f} ms  "
+            f"p99 {stats['p99_ms']:9.3f} ms  {stats['ops_per_s']:>12,.1f} ops/s")
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(old: dict, new: dict, max_regression: float) -> bool:
+    """Print p50 (or docs/s) old → new per shared hot path; True if any regression exceeds max_regression %."""
+    print(f"\nComparación con {old['meta'].get('git_commit')} ({old['meta'].get('timestamp')}), "
+          f"% de empeoramiento (+ = peor):")
+    regressed = False
+    for key, stats in new["results"].items():
+        before = old["results"].get(key)
+        if before is None:
+            continue
+        if "docs_per_s" in stats:
+            a, b, unit = before["docs_per_s"], stats["docs_per_s"], "docs/s"
+            change = (a - b) / a * 100 if a else 0.0  # menos docs/s = peor
+        else:
+            a, b, unit = before["p50_ms"], stats["p50_ms"], "ms p50"
+            change = (b - a) / a * 100 if a else 0.0
+        flag = ""
+        if max_regression is not None and change > max_regression:
+            flag, regressed = "  ❌", True
+        print(f"  {key:<32} {a:12.3f} → {b:12.3f} {unit:<7} ({change:+7.1f}%){flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="base,1k,10k", help=f"subconjunto de {','.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=15)
+    parser.add_argument("--backend", default="chroma", choices=("chroma", "numpy"))
+    parser.add_argument("--json", help="ruta del JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="con --compare: exit 1 si algún hot path empeora más de este %%")
+    args = parser.parse_args()
+    scales = [s.strip() for s in args.scales.split(",") if s.strip()]
+    unknown = [s for s in scales if s not in SCALES]
+    if unknown:
+        parser.error(f"escalas desconocidas: {unknown}")
+
+    os.environ["ANONYMIZED_TELEMETRY"] = "False"
+    results = {}
+    for scale in scales:
+        bench_scale(scale, args, results)
+    bench_auth(args, results)
+
+    report = {"meta": {**environment(), "scales": scales, "repeat": args.repeat,
+                       "n_results": args.n_results, "backend": args.backend},
+              "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Resultados en {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            if compare(json.load(f), report, args.max_regression):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark — Escrituras concurrentes de swipes (preferencias de ciudades)
+Compara, sobre un SQLite temporal, el camino anterior (journal por defecto +
+SELECT y luego INSERT/UPDATE con el ORM) con el actual (WAL + pragmas +
+INSERT ... ON CONFLICT DO UPDATE en una sentencia). Cada swipe es una sesión
+y un commit, como una petición a /api/v1/preferences/city.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_swipe_writes --threads 8 --users 200 --swipes 4000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError, OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from app.models.user import Base, User, UserCityPreference, make_engine, upsert_city_preferences
+
+CITIES = [f"City {i}" for i in range(150)]
+
+
+def legacy_swipe(db, user_id: int, city: str, action: str):
+    existing = db.query(UserCityPreference).filter(
+        UserCityPreference.user_id == user_id,
+        UserCityPreference.city_name == city,
+    ).first()
+    if existing:
+        existing.action = action
+    else:
+        db.add(UserCityPreference(user_id=user_id, city_name=city, action=action))
+    db.commit()
+
+
+def upsert_swipe(db, user_id: int, city: str, action: str):
+    db.execute(upsert_city_preferences([{"user_id": user_id, "city_name": city, "action": action}]))
+    db.commit()
+
+
+def run(name: str, tuned: bool, swipe, args) -> None:
+    path = os.path.join(tempfile.mkdtemp(), f"{name}.db")
+    engine = make_engine(f"sqlite:///{path}", tuned=tuned)
+    Base.metadata.create_all(bind=engine)
+    if not tuned:
+        # Esquema anterior: sin índice único, la carrera SELECT/INSERT deja duplicados
+        with engine.begin() as conn:
+            conn.execute(text("DROP INDEX uq_user_city_preferences_user_city"))
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        db.add_all([User(email=f"user{i}@nomad.io", hashed_password="x") for i in range(args.users)])
+        db.commit()
+
+    per_thread = args.swipes // args.threads
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def worker(seed: int):
+        rng = random.Random(seed)
+        local, failed = [], 0
+        for _ in range(per_thread):
+            user_id = rng.randint(1, args.users)
+            city, action = rng.choice(CITIES), rng.choice(("like", "dislike"))
+            t0 = time.perf_counter()
+            db = Session()
+            try:
+                swipe(db, user_id, city, action)
+            except (OperationalError, IntegrityError):  # "database is locked" / conflicto
+                db.rollback()
+                failed += 1
+            finally:
+                db.close()
+            local.append(time.perf_counter() - t0)
+        with lock:
+            latencies.extend(local)
+            errors.append(failed)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    with Session() as db:
+        rows = db.query(UserCityPreference).count()
+        pairs = db.query(UserCityPreference.user_id, UserCityPreference.city_name).distinct().count()
+    ms = np.asarray(latencies) * 1000
+    print(f"  {name:<28} {len(latencies) / elapsed:8.0f} swipes/s   p50 {np.percentile(ms, 50):6.2f} ms   "
+          f"p95 {np.percentile(ms, 95):7.2f} ms   errores {sum(errors):4d}   filas {rows} (pares únicos {pairs})")
+    engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--swipes", type=int, default=4000)
+    args = parser.parse_args()
+
+    print(f"{args.swipes} swipes, {args.threads} hilos, {args.users} usuarios, {len(CITIES)} ciudades\n")
+    run("anterior (SELECT + write)", False, legacy_swipe, args)
+    run("WAL + ON CONFLICT upsert", True, upsert_swipe, args)
+
+
+if __name__ == "__main__":
+    main()
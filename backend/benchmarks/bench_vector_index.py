@@ -0,0 +1,65 @@
+"""
+Benchmark — Búsqueda: Chroma (HNSW + SQLite) vs índice NumPy exacto
+Carga los tres CSV de data/ con embeddings deterministas (sin red) en dos
+ChromaManager, uno por backend, y compara la latencia de search() con la
+caché de embeddings ya caliente (solo se mide la parte vectorial + metadata).
+También comprueba el solapamiento del top-k entre ambos backends.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_vector_index --repeat 500
+"""
+import argparse
+import tempfile
+
+from app.utils.chroma_utils import ChromaManager
+
+from .common import HashEmbeddingFunction, ingest_all, load_csvs, measure
+
+QUERIES = [
+    "sunny beach city with good nightlife",
+    "affordable city with digital nomad visa",
+    "Schengen D8 visa income requirement",
+    "low tax regime for freelancers",
+    "historic calm city with great internet",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=300)
+    parser.add_argument("--n-results", type=int, default=15)
+    args = parser.parse_args()
+
+    frames = load_csvs()
+    managers = {}
+    for backend in ("chroma", "numpy"):
+        cm = ChromaManager(
+            persist_directory=tempfile.mkdtemp(prefix=f"bench_{backend}_"),
+            search_backend=backend,
+            embedding_function=HashEmbeddingFunction(),
+        )
+        ingest_all(cm, frames)
+        for q in QUERIES:
+            cm.search(q, n_results=args.n_results)  # calentar caché de embeddings
+        managers[backend] = cm
+
+    print(f"\nCorpus: {managers['chroma'].collection.count()} documentos, n_results={args.n_results}")
+    for tier in (None, "premium"):
+        print(f"\ntier={tier or 'todos'}")
+        for backend, cm in managers.items():
+            i = iter(range(10 ** 9))
+            stats = measure(lambda: cm.search(QUERIES[next(i) % len(QUERIES)], n_results=args.n_results, tier=tier),
+                            repeat=args.repeat)
+            print(f"  {backend:7s} p50={stats['p50_ms']:.3f}ms p95={stats['p95_ms']:.3f}ms "
+                  f"p99={stats['p99_ms']:.3f}ms {stats['ops_per_s']:,.0f} ops/s")
+
+        overlap = []
+        for q in QUERIES:
+            a = {r["id"] for r in managers["chroma"].search(q, n_results=args.n_results, tier=tier)}
+            b = {r["id"] for r in managers["numpy"].search(q, n_results=args.n_results, tier=tier)}
+            overlap.append(len(a & b) / max(len(a), 1))
+        print(f"  solapamiento top-{args.n_results} chroma/numpy: {sum(overlap) / len(overlap):.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Utilidades compartidas por los benchmarks offline.
+Embeddings deterministas sin red y carga de los CSV de data/ en un
+ChromaManager sobre un directorio temporal.
+"""
+import hashlib
+import os
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "data"))
+CSV_FILES = ("city_general_free.csv", "city_visa_premium.csv", "city_tax_premium.csv")
+
+
+class HashEmbeddingFunction:
+    """Deterministic bag-of-words embeddings (feature hashing), no downloads or API calls."""
+
+    model_name = "bench-hash-256"
+
+    def __init__(self, dims: int = 256):
+        self.dims = dims
+        self.calls = 0
+
+    def __call__(self, input: List[str]) -> List[List[float]]:
+        self.calls += 1
+        out = np.zeros((len(input), self.dims), dtype=np.float32)
+        for row, text in enumerate(input):
+            for token in text.lower().split():
+                h = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+                out[row, h % self.dims] += 1.0 if h & (1 << 63) else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).tolist()
+
+
+def load_csvs() -> Dict[str, pd.DataFrame]:
+    return {name: pd.read_csv(os.path.join(DATA_DIR, name)) for name in CSV_FILES}
+
+
+def synthetic_cities(n: int, seed: int = 7) -> pd.DataFrame:
+    """`n` distinct synthetic cities: rows of city_general_free.csv sampled with replacement, renamed "<city> <i>"."""
+    base = pd.read_csv(os.path.join(DATA_DIR, "city_general_free.csv"))
+    rng = np.random.default_rng(seed)
+    df = base.iloc[rng.integers(0, len(base), size=n)].reset_index(drop=True)
+    df["city"] = [f"{city} {i}" for i, city in enumerate(df["city"])]
+    return df
+
+
+def ingest_all(cm, frames: Dict[str, pd.DataFrame]) -> int:
+    return sum(cm.ingest_dataframe(df, source_file=name) for name, df in frames.items())
+
+
+def measure(fn: Callable[[], object], repeat: int = 200, warmup: int = 5) -> Dict[str, float]:
+    """Run `fn` repeatedly and return latency percentiles (ms) and throughput (ops/s)."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    total = time.perf_counter() - start
+    ms = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(ms, 95)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "ops_per_s": round(repeat / total, 1),
+    }
+
+
+def serve_in_thread(app, log_level: str = "warning"):
+    """Run an ASGI app with uvicorn on a free local port in a daemon thread: (base_url, server, thread)."""
+    import socket
+    import threading
+    import uvicorn
+
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level=log_level))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}", server, thread
+
+
+def stop_server(server, thread, timeout: float = 10.0) -> None:
+    server.should_exit = True
+    thread.join(timeout)
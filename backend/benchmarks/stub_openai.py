@@ -0,0 +1,81 @@
+"""
+Stub local de la API de chat completions de OpenAI (sin red ni API key).
+Responde a POST /v1/chat/completions en modo normal y en streaming (SSE con
+chunks `chat.completion.chunk` y `data: [DONE]`), con latencia configurable
+hasta el primer token y entre tokens; `app.state.fail_status` (p. ej. 500)
+hace que responda con un error de la API. Apuntar el SDK con
+OPENAI_BASE_URL=http://127.0.0.1:<puerto>/v1 o con un transporte httpx
+(httpx.ASGITransport(app=make_stub_app())), como en tests/.
+
+Uso suelto (desde backend/):
+    python -m benchmarks.stub_openai --port 8901 --first-token-ms 400 --token-ms 15
+"""
+import argparse
+import asyncio
+import json
+import time
+
+
+def make_stub_app(first_token_ms: float = 400, token_ms: float = 15, words: int = 60,
+                  fail_status: int = None):
+    from fastapi import FastAPI, Request
+    from fastapi.responses import JSONResponse, StreamingResponse
+
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.fail_status = fail_status
+    tokens = [f"palabra{i} " for i in range(words)]
+
+    def chunk(model: str, delta: dict, finish_reason=None) -> str:
+        body = {
+            "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(body)}\n\n"
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        app.state.requests += 1
+        if app.state.fail_status:
+            return JSONResponse(status_code=app.state.fail_status, content={"error": {
+                "message": "stub failure", "type": "server_error", "param": None, "code": None}})
+        if not body.get("stream"):
+            await asyncio.sleep((first_token_ms + token_ms * (words - 1)) / 1000)
+            return {
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": words, "total_tokens": words},
+            }
+
+        async def stream():
+            await asyncio.sleep(first_token_ms / 1000)
+            yield chunk(model, {"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(token_ms / 1000)
+                yield chunk(model, {"content": token})
+            yield chunk(model, {}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--first-token-ms", type=float, default=400)
+    parser.add_argument("--token-ms", type=float, default=15)
+    parser.add_argument("--words", type=int, default=60)
+    args = parser.parse_args()
+    uvicorn.run(make_stub_app(args.first_token_ms, args.token_ms, args.words), port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Fixtures compartidas: BD SQLite y ChromaDB en un directorio temporal, con los
+CSV de data/ ingestados con embeddings deterministas (sin red ni API key).
+Ejecutar desde backend/:  python -m pytest -q
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Antes de importar app.*: la BD y la config se leen al importar
+_TMP = tempfile.mkdtemp(prefix="nomadmatch-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{os.path.join(_TMP, 'users.db')}",
+    "CHROMA_PERSIST_DIR": os.path.join(_TMP, "chroma"),
+    "AUTO_INGEST": "false",
+    "ANONYMIZED_TELEMETRY": "False",
+})
+os.environ.pop("OPENAI_API_KEY", None)
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def chroma_manager():
+    from app.utils.chroma_utils import ChromaManager
+    from benchmarks.common import HashEmbeddingFunction, ingest_all, load_csvs
+
+    cm = ChromaManager(persist_directory=os.path.join(_TMP, "chroma-fixture"),
+                       embedding_function=HashEmbeddingFunction())
+    ingest_all(cm, load_csvs())
+    yield cm
+    cm.close()
+
+
+@pytest.fixture(scope="session")
+def api(chroma_manager):
+    """The FastAPI app wired to the fixture ChromaManager (lifespan not started)."""
+    from app.main import app
+    from app.api.routes import set_chroma_manager
+
+    set_chroma_manager(chroma_manager)
+    return app
+
+
+@pytest.fixture(scope="session")
+def premium_headers(api):
+    from app.api.auth import create_access_token
+    from app.models.user import SessionLocal, User, init_db
+
+    init_db()
+    db = SessionLocal()
+    try:
+        db.add(User(email="premium@nomad.io", hashed_password="-", is_premium=True))
+        db.commit()
+    finally:
+        db.close()
+    token = create_access_token({"sub": "premium@nomad.io", "premium": True})
+    return {"Authorization": f"Bearer {token}"}
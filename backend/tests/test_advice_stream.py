@@ -0,0 +1,102 @@
+"""
+/api/v1/premium/advice/stream contra el stub local de chat completions
+(benchmarks/stub_openai.py), conectado al SDK de OpenAI por un transporte httpx.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from benchmarks.stub_openai import make_stub_app
+
+QUERY = "digital nomad visa with low taxes"
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    from openai import AsyncOpenAI
+    from app.utils import llm_utils
+
+    app = make_stub_app(first_token_ms=0, token_ms=0, words=5)
+    client = AsyncOpenAI(api_key="stub-key", base_url="http://stub/v1", max_retries=0,
+                         http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=app)))
+    monkeypatch.setattr(llm_utils, "_async_client", client)
+    return app
+
+
+@pytest.fixture(autouse=True)
+def empty_advice_cache():
+    from app.api.routes import advice_cache
+
+    advice_cache.clear()
+
+
+def stream_advice(api, headers, query=QUERY):
+    """POST the SSE endpoint and return its events as [(event, data), ...]."""
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            return await client.post("/api/v1/premium/advice/stream", headers=headers,
+                                     json={"query": query, "num_results": 5})
+
+    response = asyncio.run(post())
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def names(events):
+    return [event for event, _ in events]
+
+
+def text(events):
+    return "".join(data["delta"] for event, data in events if event == "token")
+
+
+def test_events_in_order(api, premium_headers, stub):
+    events = stream_advice(api, premium_headers)
+
+    assert names(events) == ["context"] + ["token"] * 5 + ["done"]
+    context, done = events[0][1], events[-1][1]
+    assert context["count"] > 0 and not context["cached"]
+    assert text(events) == "".join(f"palabra{i} " for i in range(5))
+    assert done["cached"] is False and done["ttft_ms"] <= done["total_ms"]
+    assert stub.state.requests == 1
+
+
+def test_cache_hit_replays_without_calling_the_llm(api, premium_headers, stub):
+    first = stream_advice(api, premium_headers)
+    replay = stream_advice(api, premium_headers, QUERY.upper() + "  ")  # misma consulta normalizada
+
+    assert stub.state.requests == 1
+    assert names(replay) == ["context", "token", "done"]
+    assert replay[0][1]["cached"] and replay[-1][1]["cached"]
+    assert text(replay) == text(first).strip()
+
+
+def test_version_bump_invalidates_cached_answer(api, premium_headers, stub, chroma_manager, monkeypatch):
+    stream_advice(api, premium_headers)
+    monkeypatch.setattr(chroma_manager, "version", chroma_manager.version + 1)
+    events = stream_advice(api, premium_headers)
+
+    assert stub.state.requests == 2
+    assert names(events)[-1] == "done" and events[-1][1]["cached"] is False
+
+
+def test_llm_error_sends_error_event_and_caches_nothing(api, premium_headers, stub):
+    from app.utils.llm_utils import ERROR_ADVICE
+
+    stub.state.fail_status = 500
+    events = stream_advice(api, premium_headers)
+
+    assert names(events) == ["context", "error"]
+    assert events[1][1]["detail"] == ERROR_ADVICE
+
+    stub.state.fail_status = None
+    retry = stream_advice(api, premium_headers)
+    assert stub.state.requests == 2
+    assert names(retry)[-1] == "done" and retry[-1][1]["cached"] is False
@@ -0,0 +1,44 @@
+"""
+Filtros de /api/v1/query sobre los CSV reales: cada campo numérico existe en la
+metadata ingestada y los ejemplos documentados devuelven resultados.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.utils.filters import NUMERIC_FIELDS
+
+
+def query(api, filters):
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            return await client.post("/api/v1/query", json={"query": "city for remote work", "filters": filters})
+    response = asyncio.run(post())
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.mark.parametrize("field", NUMERIC_FIELDS)
+def test_every_numeric_field_matches_documents(api, field):
+    assert query(api, {field: {"gt": 0}})["results"]
+
+
+@pytest.mark.parametrize("filters", [
+    {"budget_eur": {"lte": 1500}, "region": ["Southern Europe"]},
+    {"visa": "Yes", "visa_income_req": {"lte": 3000}},
+])
+def test_documented_examples_match(api, filters):
+    results = query(api, filters)["results"]
+    assert results
+    for r in results:
+        meta = r["metadata"]
+        for field, spec in filters.items():
+            if isinstance(spec, dict):
+                assert meta[field] <= spec["lte"]
+            else:
+                assert meta[field] in (spec if isinstance(spec, list) else [spec])
+
+
+def test_fields_from_different_csvs_match_nothing(api):
+    assert query(api, {"visa": "Yes", "budget_eur": {"lte": 1500}})["results"] == []
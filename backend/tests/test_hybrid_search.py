@@ -0,0 +1,27 @@
+"""
+Búsqueda híbrida: las consultas léxicas de alta confianza se resuelven con BM25
+sin llamar al modelo de embeddings; el resto comparte una única llamada.
+"""
+
+
+def cities(results):
+    return [r["metadata"]["city"] for r in results]
+
+
+def test_lexical_fast_path_does_not_embed(chroma_manager):
+    ef = chroma_manager.embedding_function
+    calls = ef.calls
+    lisbon, berlin = chroma_manager.search_many(["Lisbon", "Berlin"], n_results=3)
+    assert ef.calls == calls
+    assert cities(lisbon)[0] == "Lisbon" and cities(berlin)[0] == "Berlin"
+    assert all(0.0 < r["base_score"] <= 0.5 for r in lisbon + berlin)
+
+
+def test_only_vector_queries_are_embedded(chroma_manager):
+    ef = chroma_manager.embedding_function
+    chroma_manager.embedding_cache.clear()
+    calls = ef.calls
+    lisbon, beach = chroma_manager.search_many(["Lisbon", "quiet beach town with surf"], n_results=3)
+    assert ef.calls == calls + 1
+    assert chroma_manager.embedding_cache.get(chroma_manager.embedding_model, "Lisbon") is None
+    assert cities(lisbon)[0] == "Lisbon" and len(beach) == 3
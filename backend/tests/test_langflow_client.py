@@ -0,0 +1,122 @@
+"""
+LangflowClient contra un Langflow falso local (make_fake_langflow, en uvicorn
+dentro del proceso): reutilización de conexiones y circuit breaker.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.core.langflow_client import LangflowClient
+from app.utils.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+from benchmarks.bench_langflow_client import make_fake_langflow
+from benchmarks.common import serve_in_thread, stop_server
+
+
+@pytest.fixture(scope="module")
+def langflow():
+    app = make_fake_langflow(latency_ms=1)
+    base_url, server, thread = serve_in_thread(app)
+    yield app, base_url
+    app.state.mode = "ok"
+    stop_server(server, thread)
+
+
+@pytest.fixture
+def fake(langflow):
+    app, base_url = langflow
+    app.state.mode = "ok"
+    yield app, base_url
+    app.state.mode = "ok"
+
+
+def make_client(base_url, failure_threshold=3, reset_timeout=30.0, **kwargs):
+    breaker = CircuitBreaker("Langflow", failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+    return LangflowClient(base_url=base_url, flow_id="flow", breaker=breaker, **kwargs)
+
+
+def test_connections_are_reused(fake):
+    _, base_url = fake
+
+    async def scenario():
+        client = make_client(base_url, max_connections=4, max_concurrency=8)
+        try:
+            results = await asyncio.gather(*(client.run_flow(f"m{i}") for i in range(60)))
+            upload = await client.upload_document(b"city,country\nLisbon,Portugal\n", "cities.csv")
+            return client, results, upload
+        finally:
+            await client.aclose()
+
+    client, results, upload = asyncio.run(scenario())
+    assert all("error" not in r for r in results)
+    assert results[7]["outputs"][0]["message"] == "echo: m7"
+    assert upload["bytes"] == 29
+    assert client.requests == 61
+    assert 1 <= client.connections_opened <= client.max_connections
+    assert client.stats()["connection_reuse"] >= 0.9
+
+
+def test_breaker_opens_after_threshold_timeouts_and_fails_fast(fake):
+    app, base_url = fake
+    app.state.mode = "hang"
+
+    async def scenario():
+        client = make_client(base_url, failure_threshold=3, run_timeout=0.2)
+        try:
+            failures = [await client.run_flow("down") for _ in range(3)]
+            started = time.perf_counter()
+            rejected = await client.run_flow("down")
+            return client, failures, rejected, time.perf_counter() - started
+        finally:
+            await client.aclose()
+
+    client, failures, rejected, seconds = asyncio.run(scenario())
+    assert all("Timeout" in r["error"] for r in failures)
+    assert client.breaker.state == OPEN
+    assert rejected["retry_after"] > 0 and "circuit open" in rejected["error"]
+    assert seconds < 0.1  # sin esperar el timeout (0.2 s)
+    assert client.requests == 3  # la llamada rechazada no llega a Langflow
+    assert client.breaker.stats()["rejected"] == 1
+
+
+def test_breaker_half_open_trial_then_closes_on_recovery(fake):
+    app, base_url = fake
+    app.state.mode = "hang"
+
+    async def scenario():
+        client = make_client(base_url, failure_threshold=2, reset_timeout=0.3, run_timeout=0.2)
+        try:
+            for _ in range(2):
+                await client.run_flow("down")
+            assert client.breaker.state == OPEN
+            await asyncio.sleep(0.35)
+            trial = await client.run_flow("still down")  # half-open: una prueba, falla → open otra vez
+            assert "error" in trial and client.breaker.state == OPEN
+            app.state.mode = "ok"
+            await asyncio.sleep(0.35)
+            return client, await client.run_flow("back")
+        finally:
+            await client.aclose()
+
+    client, result = asyncio.run(scenario())
+    assert result["outputs"][0]["message"] == "echo: back"
+    stats = client.breaker.stats()
+    assert stats["state"] == CLOSED and stats["consecutive_failures"] == 0
+    assert stats["opened"] == 2
+
+
+def test_client_errors_do_not_trip_breaker(fake):
+    app, base_url = fake
+    app.state.mode = "reject"
+
+    async def scenario():
+        client = make_client(base_url, failure_threshold=2)
+        try:
+            return client, [await client.run_flow("bad") for _ in range(5)]
+        finally:
+            await client.aclose()
+
+    client, results = asyncio.run(scenario())
+    assert all(r == {"error": "HTTP error: 400"} for r in results)
+    assert client.requests == 5 and client.failures == 0
+    assert client.breaker.state == CLOSED and client.breaker.stats()["opened"] == 0
@@ -0,0 +1,48 @@
+"""
+Caché de /api/v1/query compartida con /api/v1/query/batch: una entrada escrita
+por el batch es exactamente la respuesta que daría /query con los mismos
+parámetros, incluido num_results.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+QUERY = "quiet beach town with surf"
+
+
+@pytest.fixture(autouse=True)
+def empty_result_cache():
+    from app.api.routes import result_cache
+
+    result_cache.clear()
+    yield
+    result_cache.clear()
+
+
+def post(api, path, payload):
+    async def send():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            return await client.post(path, json=payload)
+    response = asyncio.run(send())
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_batch_and_single_query_differ_in_num_results(api):
+    from app.api.routes import result_cache
+
+    batch = post(api, "/api/v1/query/batch", {"queries": [
+        {"query": QUERY, "num_results": 3},
+        {"query": "historic capital with nightlife", "num_results": 10},
+    ]})["results"]
+    assert batch[0]["total_searched"] == 3
+
+    # Mismo texto, otro num_results: no sale de la entrada del batch
+    assert post(api, "/api/v1/query", {"query": QUERY, "num_results": 10})["total_searched"] == 10
+
+    # Mismo num_results: la entrada del batch es la respuesta que calcula /query
+    cached = post(api, "/api/v1/query", {"query": QUERY, "num_results": 3})
+    result_cache.clear()
+    fresh = post(api, "/api/v1/query", {"query": QUERY, "num_results": 3})
+    assert cached == batch[0] == fresh
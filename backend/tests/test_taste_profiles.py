@@ -0,0 +1,68 @@
+"""
+TasteProfiles: la reconstrucción desde la BD es single-flight por usuario y no
+pierde los swipes escritos mientras se lee.
+"""
+import asyncio
+
+import numpy as np
+
+from app.utils.taste_profiles import CityCentroids, TasteProfiles
+
+
+def centroids():
+    embeddings = np.eye(3, dtype=np.float32)
+    return CityCentroids(embeddings, [{"city": "Lisbon"}, {"city": "Berlin"}, {"city": "Porto"}], version=1)
+
+
+def test_concurrent_misses_share_one_load():
+    profiles, cities = TasteProfiles(), centroids()
+    loads = []
+
+    async def load_actions():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"lisbon": "like"}
+
+    async def scenario():
+        return await asyncio.gather(*[profiles.get(1, cities, load_actions) for _ in range(5)])
+
+    results = asyncio.run(scenario())
+    assert len(loads) == 1
+    assert all(p is results[0] for p in results)
+    assert results[0].actions == {"lisbon": "like"}
+
+
+def test_swipe_during_load_is_kept():
+    profiles, cities = TasteProfiles(), centroids()
+
+    async def load_actions():
+        await asyncio.sleep(0.01)
+        return {"lisbon": "like"}  # lectura anterior al swipe
+
+    async def scenario():
+        pending = asyncio.ensure_future(profiles.get(1, cities, load_actions))
+        await asyncio.sleep(0)
+        profiles.apply(1, {"berlin": "dislike"})
+        await pending
+        return await profiles.get(1, cities, load_actions)
+
+    profile = asyncio.run(scenario())
+    assert profile.actions == {"lisbon": "like", "berlin": "dislike"}
+    assert profiles.stats()["size"] == 1
+
+
+def test_cancelled_caller_does_not_cancel_the_load():
+    profiles, cities = TasteProfiles(), centroids()
+
+    async def load_actions():
+        await asyncio.sleep(0.01)
+        return {"porto": "like"}
+
+    async def scenario():
+        first = asyncio.ensure_future(profiles.get(1, cities, load_actions))
+        second = asyncio.ensure_future(profiles.get(1, cities, load_actions))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(scenario()).actions == {"porto": "like"}
@@ -0,0 +1,62 @@
+"""
+/api/v1/upload/stream: una subida que falla a mitad solo deshace lo que ella
+escribió; la versión anterior del mismo fichero sigue intacta.
+"""
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from benchmarks.common import DATA_DIR, HashEmbeddingFunction
+
+SOURCE = "mine.csv"
+
+
+@pytest.fixture
+def manager(api, tmp_path):
+    """A fresh ChromaManager (small chunks) wired to the routes, restored afterwards."""
+    from app.api import routes
+    from app.utils.chroma_utils import ChromaManager
+
+    cm = ChromaManager(persist_directory=str(tmp_path / "chroma"), embedding_function=HashEmbeddingFunction(),
+                       ingest_chunk_rows=5)
+    previous = routes.chroma_manager
+    routes.set_chroma_manager(cm)
+    yield cm
+    routes.set_chroma_manager(previous)
+    cm.close()
+
+
+def free_csv(rows: int) -> bytes:
+    with open(os.path.join(DATA_DIR, "city_general_free.csv"), "rb") as f:
+        return b"".join(f.readlines()[:rows + 1])
+
+
+def upload(api, body: bytes):
+    async def post():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as client:
+            return await client.post("/api/v1/upload/stream", params={"filename": SOURCE}, content=body,
+                                     headers={"Content-Type": "text/csv"})
+    return asyncio.run(post())
+
+
+def stored(cm):
+    data = cm.collection.get(where={"source": SOURCE}, include=["documents"])
+    return dict(zip(data["ids"], data["documents"]))
+
+
+def test_failed_reupload_keeps_previous_version(api, manager):
+    first = upload(api, free_csv(8))
+    assert first.status_code == 200 and first.json()["chunks_processed"] == 8
+    before = stored(manager)
+
+    # Misma cabecera, filas reescritas y más filas que antes; la línea final rompe el parseo
+    # después de que los primeros chunks ya se hayan upsertado
+    header, *rows = free_csv(12).splitlines(keepends=True)
+    rewritten = [b"New " + row for row in rows]
+    failed = upload(api, header + b"".join(rewritten) + b"Nowhere,Atlantis" + b",x" * 200 + b"\n")
+    assert failed.status_code == 500
+
+    assert stored(manager) == before
+    assert len(manager.features) == 8